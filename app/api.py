@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool
+
+# Same import layout as the Streamlit app: services/core from app/, ingestion from the project root
+app_dir = os.path.dirname(os.path.abspath(__file__))
+for path in (app_dir, os.path.dirname(app_dir)):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from core.cache import CacheManager
+from core.config import settings
+from core.metrics import (CONTENT_TYPE_LATEST, mark_process_dead, prepare_multiprocess_dir, register_cache_manager,
+                          register_scheduler, render_latest)
+from core.tracing import enable_opentelemetry, get_stage_stats
+from services.qdrant_service import QdrantService
+from services.ollama_service import OllamaService, GenerationFailed
+from services.query_service import QueryProcessor
+from services.enhanced_search_service import EnhancedSearchService, SearchFilter
+from services.generation_scheduler import GenerationRejected, get_scheduler
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ERROR_RESPONSE = {
+    "type": "error",
+    "content": "I apologize, but I encountered an error processing your request. Please try again."
+}
+
+class QueryRequest(BaseModel):
+    query: str
+    use_cache: bool = True
+
+class SearchRequest(BaseModel):
+    query: str
+    categories: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    max_results: int = 10
+
+class Services:
+    """Backend services shared by all requests of one worker process"""
+
+    def __init__(self):
+        # Every worker process holds its share of the Ollama generation limits
+        get_scheduler(processes=api_workers())
+        self.cache_manager = CacheManager()
+        self.qdrant = QdrantService(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+        self.ollama = OllamaService(base_url=settings.OLLAMA_API_URL)
+        self.query_processor = QueryProcessor()
+        self.search = EnhancedSearchService(self.qdrant, self.ollama)
+
+services: Optional[Services] = None
+
+def api_workers() -> int:
+    return max(1, int(settings.API_WORKERS))
+
+async def run_deep_checks(interval: float):
+    """Exercise the models and the search path on a slow schedule instead of on every probe"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(services.ollama.deep_check)
+        await asyncio.to_thread(services.qdrant.deep_check)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global services
+    enable_opentelemetry(bool(settings.TRACING_OTEL))
+    # Loading spaCy and the sparse encoder blocks, keep it off the event loop
+    services = await asyncio.to_thread(Services)
+    register_cache_manager(services.cache_manager)
+    register_scheduler(services.ollama.scheduler)
+    # Load the models and their shared prompt prefix without delaying startup
+    warm_up = asyncio.create_task(asyncio.to_thread(services.ollama.warm_up, services.query_processor.system_prompt))
+    tasks = [warm_up]
+    if float(settings.HEALTH_DEEP_INTERVAL) > 0:
+        tasks.append(asyncio.create_task(run_deep_checks(float(settings.HEALTH_DEEP_INTERVAL))))
+    logger.info(f"API worker {os.getpid()} ready")
+    yield
+    for task in tasks:
+        task.cancel()
+    mark_process_dead()
+
+app = FastAPI(title="QueryGPT API", lifespan=lifespan)
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok" if services else "starting",
+        "cache": services.cache_manager.get_stats() if services else {},
+        "generation": services.ollama.scheduler.get_stats() if services else {},
+        "generation_timings": services.ollama.get_generation_stats() if services else {},
+        "stages": get_stage_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/health/live")
+async def live():
+    """Liveness of this process; does not touch Ollama or Qdrant"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/health/ready")
+async def ready():
+    """Readiness from cached Ollama and Qdrant checks; 503 until both are ready"""
+    if services is None:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    ollama, qdrant = await asyncio.gather(
+        asyncio.to_thread(services.ollama.readiness),
+        asyncio.to_thread(services.qdrant.readiness)
+    )
+    ok = ollama.get('ok') and qdrant.get('ok')
+    return JSONResponse(status_code=200 if ok else 503, content=jsonable_encoder({
+        "status": "ready" if ok else "not_ready",
+        "ollama": ollama,
+        "qdrant": qdrant,
+        "timestamp": datetime.now().isoformat()
+    }))
+
+@app.get("/health/deep")
+async def deep():
+    """Full health of both backends; the deep part reruns at most every HEALTH_DEEP_INTERVAL seconds"""
+    if services is None:
+        raise HTTPException(status_code=503, detail="Services are starting")
+    ollama, qdrant = await asyncio.gather(
+        asyncio.to_thread(services.ollama.health_check, True),
+        asyncio.to_thread(services.qdrant.health_check, True)
+    )
+    return jsonable_encoder({"ollama": ollama, "qdrant": qdrant})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint; with several workers each scrape aggregates all of them"""
+    payload = render_latest() if settings.METRICS_ENABLED else None
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=payload, media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    """Answer a question through the same pipeline as the chat interface"""
+    def compute():
+        return services.query_processor.answer_query(request.query, services.qdrant, services.ollama)
+
+    try:
+        if request.use_cache:
+            # Identical questions arriving together share one computation
+            response, source = await asyncio.to_thread(services.cache_manager.get_or_compute, request.query, compute)
+            response = {**response, "cached": source != 'computed'}
+        else:
+            response = await asyncio.to_thread(compute)
+    except GenerationFailed as e:
+        logger.error(f"Generation failed: {str(e)}")
+        return JSONResponse(status_code=503, content=ERROR_RESPONSE)
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}")
+        return JSONResponse(status_code=500, content=ERROR_RESPONSE)
+
+    # A shed generation still answers from retrieval, but the client learns the LLM was unavailable
+    return JSONResponse(status_code=503 if response.get("degraded") else 200, content=jsonable_encoder(response))
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """Filtered knowledge base search without generation"""
+    if bool(request.date_from) != bool(request.date_to):
+        raise HTTPException(status_code=422, detail="date_from and date_to must be given together")
+
+    search_filter = SearchFilter(
+        date_range=(request.date_from, request.date_to) if request.date_from else None,
+        categories=request.categories,
+        sources=request.sources,
+        max_results=request.max_results
+    )
+    results = await asyncio.to_thread(services.search.search, request.query, search_filter)
+    return jsonable_encoder({
+        "results": [asdict(result) for result in results],
+        "facets": services.search.get_facets(results)
+    })
+
+@app.post("/stream")
+async def stream(request: QueryRequest):
+    """Answer a question as newline-delimited JSON.
+
+    The first line carries the response metadata and search results, then
+    one line per generated chunk, and a final line marking completion.
+    Failures before the first line get an HTTP error status; later ones end
+    the stream with an error event carrying the status /query would return.
+    """
+    cached = services.cache_manager.get_cached_response(request.query) if request.use_cache else None
+    response, prompt = None, None
+    if not cached:
+        try:
+            response, prompt = await asyncio.to_thread(
+                services.query_processor.prepare_response, request.query, services.qdrant, services.ollama
+            )
+        except Exception as e:
+            logger.error(f"Error preparing streamed query: {str(e)}")
+            return JSONResponse(status_code=500, content=ERROR_RESPONSE)
+
+    async def events():
+        def line(event):
+            return json.dumps(jsonable_encoder(event), ensure_ascii=False) + "\n"
+
+        if cached:
+            yield line({"event": "metadata", **{k: v for k, v in cached.items() if k != "content"}, "cached": True})
+            yield line({"event": "chunk", "content": cached.get("content", "")})
+            yield line({"event": "done"})
+            return
+
+        yield line({"event": "metadata", **{k: v for k, v in response.items() if k != "content"}})
+        if prompt is None:
+            yield line({"event": "chunk", "content": response["content"]})
+        else:
+            chunks = []
+            try:
+                async for chunk in iterate_in_threadpool(services.ollama.generate_response_stream(
+                        prompt, system=services.query_processor.system_prompt)):
+                    chunks.append(chunk)
+                    yield line({"event": "chunk", "content": chunk})
+                response["content"] = "".join(chunks)
+            except GenerationRejected as e:
+                logger.warning(f"Streamed generation shed: {str(e)}")
+                services.query_processor.degrade_response(response)
+                yield line({"event": "chunk", "content": response["content"], "degraded": True, "status": 503})
+            except GenerationFailed:
+                # Nothing is cached, the next caller generates again
+                yield line({"event": "error", "status": 503, **ERROR_RESPONSE})
+                return
+            except Exception as e:
+                logger.error(f"Error streaming query: {str(e)}")
+                yield line({"event": "error", "status": 500, **ERROR_RESPONSE})
+                return
+        if request.use_cache and not response.get("degraded"):
+            services.cache_manager.cache_response(request.query, response)
+        yield line({"event": "done"})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def main():
+    import uvicorn
+
+    # Workers mostly wait on Ollama and Qdrant, a few are enough; each builds its own services on startup
+    if api_workers() > 1 and settings.METRICS_ENABLED:
+        prepare_multiprocess_dir(settings.METRICS_MULTIPROC_DIR)
+    uvicorn.run(
+        "api:app",
+        app_dir=app_dir,
+        host=settings.API_HOST,
+        port=int(settings.API_PORT),
+        workers=api_workers()
+    )
+
+if __name__ == "__main__":
+    main()
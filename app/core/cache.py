@@ -1,8 +1,13 @@
 from cachetools import TTLCache, LRUCache
+import copy
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Callable, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from core.metrics import record_cache
+from core.singleflight import SingleFlight, normalize_query
+
 logger = logging.getLogger(__name__)
 
 class CacheManager:
@@ -17,31 +22,71 @@ class CacheManager:
         self.stats = {
             'hits': 0,
             'misses': 0,
+            'coalesced': 0,
             'start_time': datetime.now()
         }
+        # cachetools caches are not thread-safe and sessions share this manager
+        self._lock = threading.RLock()
+        self._in_flight = SingleFlight()
 
     def get_cached_response(self, query: str) -> Optional[Dict[str, Any]]:
         """Get cached response for a query"""
-        cached = self.response_cache.get(query)
-        if cached:
-            self.stats['hits'] += 1
-            logger.debug(f"Cache hit for query: {query}")
-            return cached
-        self.stats['misses'] += 1
+        with self._lock:
+            cached = self.response_cache.get(normalize_query(query))
+            if cached:
+                self.stats['hits'] += 1
+                record_cache('response', 'hit')
+                logger.debug(f"Cache hit for query: {query}")
+                return copy.copy(cached)
+            self.stats['misses'] += 1
+        record_cache('response', 'miss')
         logger.debug(f"Cache miss for query: {query}")
         return None
 
     def cache_response(self, query: str, response: Dict[str, Any]):
         """Cache a query response"""
         try:
-            self.response_cache[query] = response
+            with self._lock:
+                self.response_cache[normalize_query(query)] = copy.copy(response)
             logger.debug(f"Cached response for query: {query}")
         except Exception as e:
             logger.error(f"Error caching response: {str(e)}")
 
+    def get_or_compute(self, query: str, compute: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+        """Cached response for query, computing it at most once across concurrent callers.
+
+        Returns the response and where it came from: 'cache', 'coalesced'
+        (shared with an identical query already in flight) or 'computed'.
+        Error and degraded (retrieval-only) responses are returned but not cached.
+        """
+        cached = self.get_cached_response(query)
+        if cached:
+            return cached, 'cache'
+
+        def compute_and_cache():
+            # A caller that just finished may have filled the cache meanwhile
+            with self._lock:
+                cached = self.response_cache.get(normalize_query(query))
+            if cached:
+                return cached
+            response = compute()
+            if response.get('type') != 'error' and not response.get('degraded'):
+                self.cache_response(query, response)
+            return response
+
+        response, shared = self._in_flight.do(normalize_query(query), compute_and_cache)
+        if shared:
+            with self._lock:
+                self.stats['coalesced'] += 1
+            record_cache('response', 'coalesced')
+        # Each caller gets its own copy, the UI adds per-message fields
+        return copy.copy(response), 'coalesced' if shared else 'computed'
+
     def get_cached_embedding(self, text: str) -> Optional[list]:
         """Get cached embedding for text"""
-        return self.embedding_cache.get(text)
+        embedding = self.embedding_cache.get(text)
+        record_cache('embedding', 'hit' if embedding is not None else 'miss')
+        return embedding
 
     def cache_embedding(self, text: str, embedding: list):
         """Cache an embedding"""
@@ -52,7 +97,9 @@ class CacheManager:
 
     def get_cached_summary(self) -> Optional[Dict[str, Any]]:
         """Get cached knowledge base summary"""
-        return self.summary_cache.get('summary')
+        summary = self.summary_cache.get('summary')
+        record_cache('summary', 'hit' if summary is not None else 'miss')
+        return summary
 
     def cache_summary(self, summary: Dict[str, Any]):
         """Cache knowledge base summary"""
@@ -69,13 +116,16 @@ class CacheManager:
             'embedding_cache_size': len(self.embedding_cache),
             'hits': self.stats['hits'],
             'misses': self.stats['misses'],
+            'coalesced': self.stats['coalesced'],
+            'in_flight': self._in_flight.in_flight(),
             'hit_rate': self.stats['hits'] / total if total > 0 else 0,
             'uptime': (datetime.now() - self.stats['start_time']).total_seconds()
         }
 
     def clear_caches(self):
         """Clear all caches"""
-        self.response_cache.clear()
-        self.embedding_cache.clear()
-        self.summary_cache.clear()
+        with self._lock:
+            self.response_cache.clear()
+            self.embedding_cache.clear()
+            self.summary_cache.clear()
         logger.info("All caches cleared")
\ No newline at end of file
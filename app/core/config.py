@@ -12,6 +12,30 @@ class Settings:
         self.CACHE_MAXSIZE = 1000
         self.RATE_LIMIT = 10
         self.RATE_LIMIT_DURATION = 60
+        self.API_HOST = "0.0.0.0"
+        self.API_PORT = 8000
+        self.API_WORKERS = 2  # the Ollama generation limits are split between them
+        self.OLLAMA_MAX_CONCURRENCY = 2
+        self.OLLAMA_MAX_QUEUE = 16
+        self.OLLAMA_MAX_BACKGROUND_QUEUE = 4
+        self.OLLAMA_QUEUE_TIMEOUT = 15  # seconds
+        self.CONTEXT_TOKEN_BUDGET = 1500
+        self.OLLAMA_KEEP_ALIVE = "30m"
+        self.TRACING_OTEL = False
+        self.METRICS_ENABLED = True
+        self.METRICS_PORT = 9108
+        self.METRICS_MULTIPROC_DIR = 'data/metrics'
+        self.HEALTH_READY_TTL = 15  # seconds
+        self.HEALTH_DEEP_INTERVAL = 600  # seconds
+        self.RETRIEVAL_LIMIT = 5
+        self.SEARCH_MIN_SCORE = 0.6
+        self.INTENTS_PATH = 'config/intents.yaml'
+        self.FAQ_ENABLED = True
+        self.FAQ_COLLECTION = 'faq_answers'
+        self.FAQ_MIN_SCORE = 0.92
+        self.FAQ_PATH = 'config/faq.yaml'
+        self.QDRANT_HNSW_EF = 0  # 0 = collection default
+        self.QDRANT_QUANTIZATION_RESCORE = None  # None = collection default
         
         # Load additional settings from config file
         config_path = os.path.join('config', 'config.yaml')
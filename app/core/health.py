@@ -0,0 +1,61 @@
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class CachedCheck:
+    """Runs a health check at most once per ttl seconds.
+
+    Callers within the ttl get the last result, so frequent polling by an
+    orchestrator does not turn into load on the checked service. Only one
+    caller runs an expired check, the others keep the previous result.
+    """
+
+    def __init__(self, name: str, check: Callable[[], Dict[str, Any]], ttl: float):
+        self.name = name
+        self.check = check
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+
+    def _run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            result = self.check()
+        except Exception as e:
+            logger.error(f"{self.name} check failed: {str(e)}")
+            result = {'ok': False, 'error': str(e)}
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        result['checked_at'] = datetime.now().isoformat()
+        return result
+
+    def get(self, force: bool = False) -> Dict[str, Any]:
+        """Cached result, refreshed when older than ttl (or when forced)"""
+        fresh = self._result is not None and time.monotonic() - self._checked_at < self.ttl
+        if fresh and not force:
+            return dict(self._result)
+        if not self._lock.acquire(blocking=self._result is None):
+            # Someone is refreshing it already
+            return dict(self._result)
+        try:
+            self._result = self._run()
+            self._checked_at = time.monotonic()
+            return dict(self._result)
+        finally:
+            self._lock.release()
+
+    def last(self) -> Optional[Dict[str, Any]]:
+        """Last result without running the check"""
+        return dict(self._result) if self._result is not None else None
+
+def overall_status(liveness: Dict[str, Any], readiness: Dict[str, Any], deep: Optional[Dict[str, Any]] = None) -> str:
+    """'healthy', 'partial' (up but not ready, or the last deep check failed) or 'unhealthy'"""
+    if not liveness.get('ok'):
+        return 'unhealthy'
+    if not readiness.get('ok') or (deep is not None and not deep.get('ok')):
+        return 'partial'
+    return 'healthy'
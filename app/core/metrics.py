@@ -0,0 +1,259 @@
+import os
+import glob
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from core import tracing
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (Counter, Gauge, Histogram, REGISTRY, CollectorRegistry, generate_latest,
+                                   start_http_server, multiprocess, CONTENT_TYPE_LATEST)
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Set (before this module is imported) when several worker processes serve one scrape endpoint:
+# metrics are then written to files there and every worker's scrape aggregates all of them
+MULTIPROC_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+MULTIPROCESS = bool(os.environ.get(MULTIPROC_ENV))
+
+# Seconds; pipeline stages range from sub-millisecond lookups to long generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_LATENCY = Histogram(
+        'querygpt_stage_duration_seconds',
+        'Latency of query pipeline stages (qdrant.* stages are Qdrant requests)',
+        ['stage'], buckets=LATENCY_BUCKETS
+    )
+    CACHE_REQUESTS = Counter(
+        'querygpt_cache_requests_total',
+        'Cache lookups by cache and result',
+        ['cache', 'result']
+    )
+    GENERATED_TOKENS = Counter(
+        'querygpt_ollama_generated_tokens_total',
+        'Tokens generated by Ollama'
+    )
+    PROMPT_TOKENS = Counter(
+        'querygpt_ollama_prompt_tokens_total',
+        'Prompt tokens evaluated by Ollama'
+    )
+    GENERATION_SPEED = Histogram(
+        'querygpt_ollama_tokens_per_second',
+        'Decode speed of each Ollama generation',
+        buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+    )
+    COLD_LOADS = Counter(
+        'querygpt_ollama_cold_loads_total',
+        'Generations that had to load the model first'
+    )
+
+class _StateCollector:
+    """Reads gauges (queue depths, cache sizes, DB pool) from registered objects at scrape time"""
+
+    def __init__(self):
+        self.scheduler = None
+        self.cache_manager = None
+        self.engine = None
+
+    def collect(self):
+        if self.scheduler is not None:
+            stats = self.scheduler.get_stats()
+            active = GaugeMetricFamily('querygpt_generation_active', 'Generations holding a slot')
+            active.add_metric([], stats['active'])
+            yield active
+            queued = GaugeMetricFamily('querygpt_generation_queued', 'Generations waiting for a slot', labels=['priority'])
+            queued.add_metric(['interactive'], stats['queued_interactive'])
+            queued.add_metric(['background'], stats['queued_background'])
+            yield queued
+            shed = CounterMetricFamily('querygpt_generation_shed', 'Generations rejected by the scheduler', labels=['reason'])
+            shed.add_metric(['queue_full'], stats['rejected'])
+            shed.add_metric(['timeout'], stats['timed_out'])
+            yield shed
+
+        if self.cache_manager is not None:
+            stats = self.cache_manager.get_stats()
+            size = GaugeMetricFamily('querygpt_cache_entries', 'Entries per cache', labels=['cache'])
+            size.add_metric(['response'], stats['response_cache_size'])
+            size.add_metric(['embedding'], stats['embedding_cache_size'])
+            yield size
+            in_flight = GaugeMetricFamily('querygpt_queries_in_flight', 'Distinct queries being computed')
+            in_flight.add_metric([], stats['in_flight'])
+            yield in_flight
+
+        if self.engine is not None:
+            pool = self.engine.pool
+            usage = GaugeMetricFamily('querygpt_db_pool_connections', 'Database pool connections', labels=['state'])
+            try:
+                usage.add_metric(['checked_out'], pool.checkedout())
+                usage.add_metric(['idle'], pool.checkedin())
+                usage.add_metric(['overflow'], max(pool.overflow(), 0))
+                usage.add_metric(['size'], pool.size())
+            except AttributeError:
+                # Pools without a fixed size (e.g. NullPool) report nothing
+                return
+            yield usage
+
+class _StatePublisher:
+    """Copies the state collector's readings into multiprocess metrics.
+
+    Collectors only see their own process, so in multiprocess mode each
+    worker publishes its readings every interval seconds: gauges are summed
+    over live workers, counters are incremented by what changed since the
+    last publish so they keep counting across worker restarts.
+    """
+
+    def __init__(self, collector: _StateCollector, interval: float = 5):
+        self.collector = collector
+        self.interval = interval
+        self._metrics: Dict[str, Any] = {}
+        self._last: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _metric(self, family, labels):
+        if family.name not in self._metrics:
+            if family.type == 'counter':
+                self._metrics[family.name] = Counter(family.name, family.documentation, labels, registry=None)
+            else:
+                self._metrics[family.name] = Gauge(family.name, family.documentation, labels, registry=None,
+                                                   multiprocess_mode='livesum')
+        return self._metrics[family.name]
+
+    def publish(self):
+        with self._lock:
+            for family in self.collector.collect():
+                for sample in family.samples:
+                    if sample.name.endswith('_created'):
+                        continue
+                    metric = self._metric(family, sorted(sample.labels))
+                    child = metric.labels(**sample.labels) if sample.labels else metric
+                    if family.type == 'counter':
+                        key = (sample.name, tuple(sorted(sample.labels.items())))
+                        delta = sample.value - self._last.get(key, 0)
+                        self._last[key] = sample.value
+                        if delta > 0:
+                            child.inc(delta)
+                    else:
+                        child.set(sample.value)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception as e:
+                logger.error(f"Error publishing metrics state: {str(e)}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-state", daemon=True)
+                self._thread.start()
+
+_collector = _StateCollector()
+_publisher = _StatePublisher(_collector)
+_setup_lock = threading.Lock()
+_server_started = False
+
+def _observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+if PROMETHEUS_AVAILABLE:
+    if not MULTIPROCESS:
+        REGISTRY.register(_collector)
+    tracing.add_observer(_observe_stage)
+
+def prepare_multiprocess_dir(path: str):
+    """Use path for multiprocess metrics, emptied of a previous run's files.
+
+    Call in the parent before starting worker processes, which inherit the
+    environment variable; an already configured directory is kept.
+    """
+    path = os.environ.setdefault(MULTIPROC_ENV, path)
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, '*.db')):
+        os.remove(stale)
+    logger.info(f"Multiprocess metrics in {path}")
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the aggregate, on shutdown"""
+    if PROMETHEUS_AVAILABLE and MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+def _registered():
+    if PROMETHEUS_AVAILABLE and MULTIPROCESS:
+        _publisher.start()
+
+def record_cache(cache: str, result: str):
+    """Count a cache lookup; result is 'hit', 'miss' or 'coalesced'"""
+    if PROMETHEUS_AVAILABLE:
+        CACHE_REQUESTS.labels(cache=cache, result=result).inc()
+
+def record_generation(timings: Dict[str, Any]):
+    """Count tokens and decode speed of one Ollama generation (see OllamaService._record_timings)"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    GENERATED_TOKENS.inc(timings.get('eval_tokens', 0))
+    PROMPT_TOKENS.inc(timings.get('prefill_tokens', 0))
+    if timings.get('eval_ms'):
+        GENERATION_SPEED.observe(timings['eval_tokens'] / (timings['eval_ms'] / 1000))
+    if timings.get('cold_load'):
+        COLD_LOADS.inc()
+
+def register_scheduler(scheduler):
+    _collector.scheduler = scheduler
+    _registered()
+
+def register_cache_manager(cache_manager):
+    _collector.cache_manager = cache_manager
+    _registered()
+
+def register_db_engine(engine):
+    _collector.engine = engine
+    _registered()
+
+def _scrape_registry():
+    """The default registry, or one aggregating all workers' files in multiprocess mode"""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> bool:
+    """Serve /metrics on its own port, once per process (for the Streamlit app)"""
+    global _server_started
+    if not PROMETHEUS_AVAILABLE:
+        logger.warning("prometheus_client is not installed, metrics endpoint disabled")
+        return False
+    with _setup_lock:
+        if _server_started:
+            return True
+        try:
+            start_http_server(port, addr=addr, registry=_scrape_registry())
+            _server_started = True
+            logger.info(f"Metrics available on :{port}/metrics")
+        except OSError as e:
+            logger.error(f"Could not start metrics server on port {port}: {str(e)}")
+        return _server_started
+
+def render_latest() -> Optional[bytes]:
+    """Current metrics in the Prometheus text format, for serving from an existing app.
+
+    In multiprocess mode these are the metrics of all workers, whichever
+    one serves the scrape.
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if MULTIPROCESS:
+        # The serving worker's own state is current, the others' at most one interval old
+        _publisher.publish()
+    return generate_latest(_scrape_registry())
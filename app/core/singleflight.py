@@ -0,0 +1,68 @@
+import re
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    """Key under which equivalent phrasings of a query share work and cache entries.
+
+    Only case, whitespace and trailing ?!. are normalised: symbols inside a
+    query can carry its meaning ("C++" and "C#", "CS-101").
+    """
+    query = re.sub(r'\s+', ' ', query.lower())
+    return query.strip().rstrip('?!. ')
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Runs at most one computation per key at a time.
+
+    Callers that arrive while a computation for their key is in flight
+    wait for it and receive the same result (or exception) instead of
+    starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Result of fn for key, and whether it was shared with an in-flight call"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.debug(f"Shared result for '{key}' with {call.waiters} waiting callers")
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,154 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+# Upper bounds (ms) of the per-stage latency histogram buckets
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf')]
+
+class StageHistogram:
+    """Fixed-bucket latency histogram for one pipeline stage"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5), 2),
+            'p95_ms': round(self.quantile(0.95), 2),
+            'max_ms': round(self.max_ms, 2)
+        }
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def summary(self) -> Dict[str, Any]:
+        """Total elapsed time and the time spent per stage (summed over repeated calls)"""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span['name'], {'ms': 0.0, 'calls': 0})
+            stage['ms'] = round(stage['ms'] + span['ms'], 2)
+            stage['calls'] += 1
+        return {
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 2),
+            'stages': stages
+        }
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+_histograms: Dict[str, StageHistogram] = {}
+_histograms_lock = threading.Lock()
+_observers: List[Callable[[str, float], None]] = []
+_otel_enabled = False
+
+def enable_opentelemetry(enabled: bool = True):
+    """Also emit spans through the OpenTelemetry API (requires opentelemetry-api)"""
+    global _otel_enabled
+    if enabled and not OTEL_AVAILABLE:
+        logger.warning("opentelemetry is not installed, spans stay local")
+    _otel_enabled = enabled and OTEL_AVAILABLE
+
+def add_observer(observer: Callable[[str, float], None]):
+    """Register a callback receiving (stage, seconds) for every finished span"""
+    _observers.append(observer)
+
+def _record(name: str, ms: float):
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = StageHistogram()
+        histogram.observe(ms)
+    for observer in _observers:
+        try:
+            observer(name, ms / 1000)
+        except Exception as e:
+            logger.debug(f"Span observer failed: {str(e)}")
+
+@contextmanager
+def span(name: str):
+    """Time a stage with a monotonic clock, adding it to the current trace and the histograms"""
+    with ExitStack() as stack:
+        if _otel_enabled:
+            stack.enter_context(otel_trace.get_tracer("querygpt").start_as_current_span(name))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.spans.append({'name': name, 'ms': ms})
+            _record(name, ms)
+
+@contextmanager
+def start_trace(name: str):
+    """Collect the spans of one request; joins the enclosing trace if there is one"""
+    trace = _current_trace.get()
+    if trace is not None:
+        yield trace
+        return
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+def traced(name: str):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_stage_stats() -> Dict[str, Dict[str, float]]:
+    """Latency summary per stage since startup"""
+    with _histograms_lock:
+        return {name: histogram.summary() for name, histogram in sorted(_histograms.items())}
+
+def reset_stage_stats():
+    """Forget the aggregated stage latencies (e.g. between benchmark runs)"""
+    with _histograms_lock:
+        _histograms.clear()
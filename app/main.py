@@ -2,6 +2,7 @@ import streamlit as st
 import os
 import sys
 import logging
+import threading
 from datetime import datetime
 import time
 
@@ -12,12 +13,17 @@ if app_dir not in sys.path:
 
 from auth.authenticator import setup_auth, get_username, get_user_info, logout
 from core.cache import CacheManager
+from core.config import settings
+from core.metrics import register_cache_manager, register_db_engine, register_scheduler, start_metrics_server
+from core.tracing import enable_opentelemetry
 from services.qdrant_service import QdrantService
 from services.ollama_service import OllamaService
-from services.query_service import QueryProcessor
+from services.query_service import QueryProcessor, SYSTEM_PROMPT
+from services.generation_scheduler import get_scheduler
 from services.enhanced_search_service import EnhancedSearchService, SearchFilter
 from utils.analysis import FeedbackAnalyzer
 from app.auth.authenticator import setup_auth, get_username, get_user_info, logout
+from app.database.connection import engine
 
 # Setup logging
 logging.basicConfig(
@@ -29,9 +35,32 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+enable_opentelemetry(bool(settings.TRACING_OTEL))
+
+@st.cache_resource
+def get_cache_manager() -> CacheManager:
+    """One cache shared by every session, so identical queries are coalesced across users"""
+    return CacheManager()
+
+@st.cache_resource
+def warm_up_models() -> threading.Thread:
+    """Load the models and the system prompt prefix once per server process, in the background"""
+    thread = threading.Thread(target=OllamaService().warm_up, args=(SYSTEM_PROMPT,), daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def start_metrics() -> bool:
+    """Serve Prometheus metrics for this server process on METRICS_PORT"""
+    register_cache_manager(get_cache_manager())
+    register_scheduler(get_scheduler())
+    register_db_engine(engine)
+    return start_metrics_server(int(settings.METRICS_PORT))
 
 # Initialize global services
-cache_manager = CacheManager()
+cache_manager = get_cache_manager()
+if settings.METRICS_ENABLED:
+    start_metrics()
 feedback_analyzer = FeedbackAnalyzer()
 qdrant_service = None
 enhanced_search_service = None 
@@ -336,6 +365,7 @@ def main():
         ollama_service = OllamaService()
         query_processor = QueryProcessor()
         enhanced_search_service = EnhancedSearchService(qdrant_service, ollama_service)
+        warm_up_models()
     except Exception as e:
         handle_error(e, "Service")
         return
@@ -390,28 +420,25 @@ def main():
 
         # Chat input
         if query := st.chat_input("Ask a question..."):
-            # Check cache
-            cached_response = cache_manager.get_cached_response(query)
-            
-            if cached_response:
-                response = cached_response
+            def compute_response():
+                try:
+                    return query_processor.process_query(
+                        query,
+                        qdrant_service,
+                        ollama_service
+                    )
+                except Exception as e:
+                    logger.error(f"Error processing query: {str(e)}")
+                    return {
+                        "type": "error",
+                        "content": "I apologize, but I encountered an error processing your request. Please try again."
+                    }
+
+            # Served from cache, shared with an identical in-flight query, or computed
+            with st.spinner("Processing your query..."):
+                response, source = cache_manager.get_or_compute(query, compute_response)
+            if source == 'cache':
                 st.success("Retrieved from cache")
-            else:
-                # Process new query
-                with st.spinner("Processing your query..."):
-                    try:
-                        response = query_processor.process_query(
-                            query,
-                            qdrant_service,
-                            ollama_service
-                        )
-                        cache_manager.cache_response(query, response)
-                    except Exception as e:
-                        logger.error(f"Error processing query: {str(e)}")
-                        response = {
-                            "type": "error",
-                            "content": "I apologize, but I encountered an error processing your request. Please try again."
-                        }
 
             # Add timestamp to messages
             user_message = {
@@ -0,0 +1,134 @@
+import re
+import logging
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+|\n+')
+
+class TokenCounter:
+    """Counts tokens with tiktoken when available, otherwise approximates them"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self.encoder = None
+        try:
+            import tiktoken
+            self.encoder = tiktoken.get_encoding(encoding)
+        except Exception as e:
+            logger.info(f"tiktoken unavailable ({str(e)}), approximating token counts")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoder is not None:
+            return len(self.encoder.encode(text, disallowed_special=()))
+        # Words and punctuation, with long words split as a BPE tokenizer would
+        return sum(1 + len(token) // 8 for token in _WORD_PATTERN.findall(text))
+
+class ContextBuilder:
+    """Packs retrieved passages into a prompt context under a token budget.
+
+    Long results are cut down to the window of sentences that best matches
+    the query, and windows are then picked by maximal marginal relevance so
+    the context covers different aspects instead of repeating one page.
+    """
+
+    def __init__(self, token_budget: int = 1500, window_tokens: int = 200,
+                 mmr_lambda: float = 0.7, max_passages: int = 5, max_redundancy: float = 0.9,
+                 token_counter: Optional[TokenCounter] = None):
+        self.token_budget = token_budget
+        self.window_tokens = window_tokens
+        self.mmr_lambda = mmr_lambda
+        self.max_passages = max_passages
+        # Candidates this similar to an already selected one are dropped as duplicates
+        self.max_redundancy = max_redundancy
+        self.tokens = token_counter or TokenCounter()
+
+    def build(self, query: str, results: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """Context string and a report of what went into it"""
+        candidates = []
+        for rank, result in enumerate(results):
+            window = self.best_window(query, result.get("content", ""))
+            if window:
+                candidates.append({"text": window, "score": float(result.get("score", 0.0)), "rank": rank})
+
+        selected = self.select(query, candidates)
+        context = "\n\n".join(c["text"] for c in selected)
+        report = {
+            "budget": self.token_budget,
+            "context_tokens": self.tokens.count(context),
+            "passages": len(selected),
+            "candidates": len(candidates),
+            "source_ranks": [c["rank"] for c in selected]
+        }
+        return context, report
+
+    def best_window(self, query: str, content: str) -> str:
+        """The run of consecutive sentences with the most query terms, within window_tokens"""
+        content = content.strip()
+        if self.tokens.count(content) <= self.window_tokens:
+            return content
+
+        sentences = [s.strip() for s in _SENTENCE_PATTERN.split(content) if s.strip()]
+        query_terms = {t for t in _WORD_PATTERN.findall(query.lower()) if len(t) > 2}
+        hits = [len(query_terms & set(_WORD_PATTERN.findall(s.lower()))) for s in sentences]
+        lengths = [self.tokens.count(s) for s in sentences]
+
+        best_start, best_end, best_hits = 0, 0, -1
+        start, total, window_hits = 0, 0, 0
+        for end in range(len(sentences)):
+            total += lengths[end]
+            window_hits += hits[end]
+            while total > self.window_tokens and start < end:
+                total -= lengths[start]
+                window_hits -= hits[start]
+                start += 1
+            if window_hits > best_hits:
+                best_start, best_end, best_hits = start, end, window_hits
+
+        window = " ".join(sentences[best_start:best_end + 1])
+        if self.tokens.count(window) > self.window_tokens:
+            # A single sentence longer than the window
+            words = window.split()
+            window = " ".join(words[:int(self.window_tokens * 0.75)])
+        prefix = "..." if best_start > 0 else ""
+        suffix = "..." if best_end < len(sentences) - 1 else ""
+        return f"{prefix}{window}{suffix}"
+
+    def select(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Greedy MMR selection of candidates that fit the token budget"""
+        if not candidates:
+            return []
+        try:
+            matrix = TfidfVectorizer(stop_words='english').fit_transform([query] + [c["text"] for c in candidates])
+            query_similarity = cosine_similarity(matrix[0:1], matrix[1:])[0]
+            pairwise = cosine_similarity(matrix[1:])
+        except ValueError:
+            # Only stop words; fall back to retrieval order
+            query_similarity = np.zeros(len(candidates))
+            pairwise = np.eye(len(candidates))
+
+        scores = np.array([c["score"] for c in candidates])
+        if scores.max() > 0:
+            scores = scores / scores.max()
+        relevance = 0.5 * scores + 0.5 * query_similarity
+
+        selected, remaining, used = [], list(range(len(candidates))), 0
+        while remaining and len(selected) < self.max_passages:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1) if selected else np.zeros(len(remaining))
+            mmr = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            choice = int(np.argmax(mmr))
+            best = remaining.pop(choice)
+            if redundancy[choice] > self.max_redundancy:
+                continue
+            cost = self.tokens.count(candidates[best]["text"])
+            if used + cost > self.token_budget:
+                continue
+            selected.append(best)
+            used += cost
+
+        return [candidates[i] for i in selected]
@@ -6,6 +6,9 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from qdrant_client.http import models
 
+from core.config import settings
+from core.tracing import span, traced
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -30,9 +33,9 @@ class EnhancedSearchService:
     def __init__(self, qdrant_service, ollama_service):
         self.qdrant = qdrant_service
         self.ollama = ollama_service
-        self.vectorizer = TfidfVectorizer()
-        self.min_semantic_score = 0.6
+        self.min_semantic_score = float(settings.SEARCH_MIN_SCORE)
 
+    @traced("search")
     def search(self, query: str, filters: Optional[SearchFilter] = None) -> List[SearchResult]:
         """Main search method combining semantic search with filters"""
         try:
@@ -45,9 +48,10 @@ class EnhancedSearchService:
             # Prepare filters for Qdrant
             qdrant_filter = self._convert_filters(filters)
             
-            # Perform vector search with corrected parameter name
-            raw_results = self.qdrant.search(
+            # Dense + sparse search so exact terms (course codes, names) still match
+            raw_results = self.qdrant.hybrid_search(
                 query_vector=query_vector,
+                query_text=query,
                 filters=qdrant_filter,  # Changed from query_filter to filters
                 limit=filters.max_results if filters else 10
             )
@@ -59,10 +63,11 @@ class EnhancedSearchService:
                     continue
 
                 # Generate result highlights
-                highlights = self._generate_highlights(
-                    query, 
-                    result.payload.get('original_content', '')
-                )
+                with span("search.highlights"):
+                    highlights = self._generate_highlights(
+                        query, 
+                        result.payload.get('original_content', '')
+                    )
 
                 try:
                     timestamp = datetime.fromisoformat(
@@ -158,7 +163,7 @@ class EnhancedSearchService:
                 return []
 
             # Calculate similarity scores
-            query_matrix = self.vectorizer.fit_transform([partial_query] + recent_queries)
+            query_matrix = TfidfVectorizer().fit_transform([partial_query] + recent_queries)
             similarities = cosine_similarity(query_matrix[0:1], query_matrix[1:])[0]
             
             # Get top suggestions
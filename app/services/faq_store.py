@@ -0,0 +1,167 @@
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from core.singleflight import normalize_query
+from ingestion.checkpoint import content_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAQ_COLLECTION = "faq_answers"
+
+def source_hash(payload: Dict[str, Any]) -> str:
+    """Change marker of a knowledge base point, from the content answers are generated from"""
+    return content_fingerprint(payload.get('original_content', ''))
+
+def faq_point_id(question: str) -> str:
+    """Stable id per normalised question, so rebuilding overwrites rather than duplicates"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"faq:{normalize_query(question)}"))
+
+class FAQStore:
+    """Precomputed answers to frequent questions, served by nearest-neighbour lookup.
+
+    Each entry holds the question embedding, the generated answer and the ids
+    and content hashes of the knowledge base points it was generated from.
+    Answers are built offline (vector/build_faq.py). At query time an entry
+    is only served while all of its sources still exist with the same
+    content; otherwise it is marked stale and the query takes the full
+    pipeline until the next build regenerates it.
+    """
+
+    def __init__(self, client: QdrantClient, source_collection: str,
+                 collection_name: str = DEFAULT_FAQ_COLLECTION, refresh_interval: float = 60):
+        self.client = client
+        self.source_collection = source_collection
+        self.collection_name = collection_name
+        # How long the "collection has entries" answer is trusted
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._available = False
+        self._checked_at = None
+
+    def available(self) -> bool:
+        """Whether there are answers to look up, rechecked every refresh_interval"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return self._available
+        with self._lock:
+            try:
+                self._available = (self.client.collection_exists(self.collection_name) and
+                                   self.client.count(self.collection_name, exact=False).count > 0)
+            except Exception as e:
+                logger.error(f"Error checking FAQ collection: {str(e)}")
+                self._available = False
+            self._checked_at = now
+        return self._available
+
+    def ensure_collection(self, vector_size: int):
+        """Create the FAQ collection if it does not exist"""
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE)
+            )
+            logger.info(f"Created collection {self.collection_name}")
+        self._checked_at = None
+
+    def current_hashes(self, point_ids: List[Any]) -> Dict[str, str]:
+        """Content hashes of the given knowledge base points that still exist, by str(id)"""
+        if not point_ids:
+            return {}
+        points = self.client.retrieve(
+            collection_name=self.source_collection,
+            ids=point_ids,
+            with_payload=['original_content'],
+            with_vectors=False
+        )
+        return {str(point.id): source_hash(point.payload or {}) for point in points}
+
+    def is_current(self, entry: Dict[str, Any]) -> bool:
+        """Whether every source of an entry is unchanged"""
+        sources = entry.get('sources', [])
+        if not sources:
+            return False
+        current = self.current_hashes([source['id'] for source in sources])
+        return all(current.get(str(source['id'])) == source['hash'] for source in sources)
+
+    def mark_stale(self, point_id: str):
+        try:
+            self.client.set_payload(collection_name=self.collection_name, payload={'stale': True}, points=[point_id])
+            logger.info(f"FAQ entry {point_id} marked stale, its sources changed")
+        except Exception as e:
+            logger.error(f"Error marking FAQ entry stale: {str(e)}")
+
+    def lookup(self, query_vector: List[float], min_score: float) -> Optional[Dict[str, Any]]:
+        """The closest current answer scoring at least min_score, or None"""
+        try:
+            points = self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vector,
+                query_filter=models.Filter(
+                    must_not=[models.FieldCondition(key='stale', match=models.MatchValue(value=True))]
+                ),
+                limit=1,
+                with_payload=True,
+                score_threshold=min_score
+            ).points
+            if not points:
+                return None
+            point = points[0]
+            if not self.is_current(point.payload):
+                self.mark_stale(point.id)
+                return None
+            return {**point.payload, 'id': str(point.id), 'score': point.score}
+        except Exception as e:
+            logger.error(f"Error looking up FAQ answer: {str(e)}")
+            return None
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """The stored entry for a question, if any"""
+        points = self.client.retrieve(collection_name=self.collection_name, ids=[faq_point_id(question)],
+                                      with_payload=True)
+        return {**points[0].payload, 'id': str(points[0].id)} if points else None
+
+    def upsert(self, question: str, embedding: List[float], answer: str, source_ids: List[Any],
+               search_results: List[Dict[str, Any]], model: Optional[str] = None) -> str:
+        """Store an answer with the hashes of the points its context was built from"""
+        current = self.current_hashes(source_ids)
+        point_id = faq_point_id(question)
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[models.PointStruct(
+                id=point_id,
+                vector=embedding,
+                payload={
+                    'question': question,
+                    'answer': answer,
+                    'sources': [{'id': i, 'hash': current[str(i)]} for i in source_ids if str(i) in current],
+                    'search_results': search_results,
+                    'model': model,
+                    'stale': False,
+                    'generated_at': datetime.now().isoformat()
+                }
+            )]
+        )
+        self._checked_at = None
+        return point_id
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """All stored entries (payload and id)"""
+        entries, offset = [], None
+        while True:
+            points, offset = self.client.scroll(collection_name=self.collection_name, limit=256, offset=offset,
+                                                with_payload=True, with_vectors=False)
+            entries.extend({**point.payload, 'id': str(point.id)} for point in points)
+            if offset is None:
+                return entries
+
+    def delete(self, point_ids: List[str]):
+        if point_ids:
+            self.client.delete(collection_name=self.collection_name,
+                               points_selector=models.PointIdsList(points=point_ids))
@@ -0,0 +1,129 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Dict, Optional
+
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # chat and API answers a user is waiting for
+    BACKGROUND = 1   # health checks, summaries, batch jobs
+
+class GenerationRejected(Exception):
+    """Raised when a generation is shed because the LLM host is saturated"""
+
+class GenerationScheduler:
+    """Bounds concurrent LLM generations and orders waiting ones by priority.
+
+    Callers hold one of max_concurrency slots for the duration of their
+    generation. Waiting callers are admitted in priority order (FIFO within
+    a priority). A request is rejected straight away when its queue is full,
+    and rejected after queue_timeout seconds if it still has not started,
+    so overload turns into fast, explicit rejections instead of timeouts.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 16,
+                 max_background_queue: int = 4, queue_timeout: float = 15.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_background_queue = max_background_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._active = 0
+        self.stats = {'admitted': 0, 'rejected': 0, 'timed_out': 0, 'total_wait': 0.0}
+
+    def _queued(self, priority: Priority) -> int:
+        return sum(1 for p, _ in self._waiting if p == priority)
+
+    def _acquire(self, priority: Priority, timeout: Optional[float]):
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self._condition:
+            limit = self.max_queue if priority == Priority.INTERACTIVE else self.max_background_queue
+            if self._active >= self.max_concurrency and self._queued(priority) >= limit:
+                self.stats['rejected'] += 1
+                raise GenerationRejected(f"Generation queue full ({self._queued(priority)} waiting)")
+
+            ticket = (int(priority), next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            while self._active >= self.max_concurrency or self._waiting[0] != ticket:
+                remaining = start + timeout - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.stats['timed_out'] += 1
+                    self._condition.notify_all()
+                    raise GenerationRejected(f"No generation slot within {timeout:.0f}s")
+                self._condition.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self.stats['admitted'] += 1
+            self.stats['total_wait'] += time.monotonic() - start
+            # The next ticket may be admissible too if slots remain
+            self._condition.notify_all()
+
+    def _release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None):
+        """Hold a generation slot for the duration of the block"""
+        with span("ollama.queue_wait"):
+            self._acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            admitted = self.stats['admitted']
+            return {
+                'active': self._active,
+                'max_concurrency': self.max_concurrency,
+                'queued_interactive': self._queued(Priority.INTERACTIVE),
+                'queued_background': self._queued(Priority.BACKGROUND),
+                'admitted': admitted,
+                'rejected': self.stats['rejected'],
+                'timed_out': self.stats['timed_out'],
+                'avg_wait': self.stats['total_wait'] / admitted if admitted else 0.0
+            }
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler(processes: int = 1) -> GenerationScheduler:
+    """Process-wide scheduler, since every session talks to the same Ollama host.
+
+    The limits only bind within one process. When the app runs as several
+    worker processes (the API), each gets an equal share of the concurrency
+    and queue limits so that together they stay within them. The first call
+    decides.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from core.config import settings
+            processes = max(1, int(processes))
+            max_concurrency = int(settings.OLLAMA_MAX_CONCURRENCY)
+            if processes > max_concurrency:
+                logger.warning(f"{processes} worker processes share OLLAMA_MAX_CONCURRENCY={max_concurrency}; "
+                               f"each still gets one slot, so up to {processes} generations may run at once")
+            _scheduler = GenerationScheduler(
+                max_concurrency=max(1, max_concurrency // processes),
+                max_queue=max(1, -(-int(settings.OLLAMA_MAX_QUEUE) // processes)),
+                max_background_queue=max(1, -(-int(settings.OLLAMA_MAX_BACKGROUND_QUEUE) // processes)),
+                queue_timeout=float(settings.OLLAMA_QUEUE_TIMEOUT)
+            )
+        return _scheduler
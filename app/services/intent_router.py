@@ -0,0 +1,147 @@
+import os
+import re
+import logging
+from collections import Counter
+from difflib import SequenceMatcher
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import yaml
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from core.singleflight import normalize_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTENTS_PATH = os.path.join('config', 'intents.yaml')
+
+def _normalize(text: str) -> str:
+    """Routing key: the query key without punctuation, which canned intents don't depend on ("hi :)")"""
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', normalize_query(text))).strip()
+
+@dataclass
+class IntentMatch:
+    intent: str
+    score: float
+    response: Optional[str] = None
+    action: Optional[str] = None
+
+class IntentRouter:
+    """Answers formulaic queries (greetings, thanks, navigation) before the full pipeline.
+
+    Normalised queries are looked up among the intent examples first; other
+    short queries are compared with the examples by character n-gram TF-IDF,
+    which tolerates typos and small rewordings. A fuzzy match also has to
+    cover every word of the query with a word of the matched example, so
+    "about srh fees" is a question for the knowledge base, not the about_srh
+    intent. Everything is fitted once when the intent table is loaded, so
+    routing a query costs a dictionary lookup or one small matrix-vector
+    product.
+    """
+
+    def __init__(self, path: str = DEFAULT_INTENTS_PATH):
+        self.intents: Dict[str, Dict[str, Any]] = {}
+        self.threshold = 0.8
+        self.margin = 0.15
+        self.max_words = 3
+        # Minimum similarity for two words to count as the same word (typos)
+        self.word_similarity = 0.8
+        self.exact: Dict[str, str] = {}
+        self.example_intents: List[str] = []
+        self.example_words: List[List[str]] = []
+        self.analyzer = None
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = None
+        self.matrix = None
+        # Word limit of the most permissive intent; longer queries skip scoring
+        self.longest = 0
+        self.load(path)
+
+    def load(self, path: str):
+        """Load the intent table and fit the example index"""
+        if not os.path.exists(path):
+            logger.warning(f"No intent table at {path}, intent routing disabled")
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                table = yaml.safe_load(f) or {}
+        except Exception as e:
+            logger.error(f"Error loading intents from {path}: {str(e)}")
+            return
+
+        self.threshold = float(table.get('threshold', self.threshold))
+        self.margin = float(table.get('margin', self.margin))
+        self.max_words = int(table.get('max_words', self.max_words))
+        self.word_similarity = float(table.get('word_similarity', self.word_similarity))
+        self.intents = table.get('intents', {}) or {}
+
+        examples = []
+        for name, intent in self.intents.items():
+            for example in intent.get('examples', []):
+                normalized = _normalize(str(example))
+                self.exact[normalized] = name
+                examples.append(normalized)
+                self.example_intents.append(name)
+                self.example_words.append(normalized.split())
+
+        self.longest = max((self._intent_max_words(name) for name in self.intents), default=0)
+        if examples:
+            vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), sublinear_tf=True)
+            # The example table is small, a dense matrix makes scoring one query a single indexed product
+            self.matrix = vectorizer.fit_transform(examples).toarray()
+            self.analyzer = vectorizer.build_analyzer()
+            self.vocabulary = vectorizer.vocabulary_
+            self.idf = vectorizer.idf_
+        logger.info(f"Loaded {len(self.intents)} intents with {len(examples)} examples")
+
+    def _match(self, name: str, score: float) -> IntentMatch:
+        intent = self.intents[name]
+        return IntentMatch(intent=name, score=score, response=intent.get('response'), action=intent.get('action'))
+
+    def _intent_max_words(self, name: str) -> int:
+        return int(self.intents[name].get('max_words', self.max_words))
+
+    def _same_word(self, word: str, other: str) -> bool:
+        return word == other or SequenceMatcher(None, word, other).ratio() >= self.word_similarity
+
+    def _covers(self, words: List[str], example: List[str]) -> bool:
+        """Whether every query word matches a word of the example"""
+        return all(any(self._same_word(word, other) for other in example) for word in words)
+
+    def _scores(self, text: str) -> Optional[np.ndarray]:
+        """Cosine similarity of text to every example, with the fitted TF-IDF weighting"""
+        counts = Counter(gram for gram in self.analyzer(text) if gram in self.vocabulary)
+        if not counts:
+            return None
+        indices = np.fromiter((self.vocabulary[gram] for gram in counts), dtype=np.int64, count=len(counts))
+        weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * self.idf[indices]
+        weights /= np.linalg.norm(weights)
+        # Example rows are L2-normalised already
+        return self.matrix[:, indices] @ weights
+
+    def route(self, query: str) -> Optional[IntentMatch]:
+        """The intent a query expresses, or None if it should take the full pipeline"""
+        normalized = _normalize(query)
+        if not normalized:
+            return None
+        name = self.exact.get(normalized)
+        if name is not None:
+            return self._match(name, 1.0)
+
+        words = normalized.split()
+        if self.matrix is None or len(words) > self.longest:
+            return None
+        scores = self._scores(normalized)
+        if scores is None:
+            return None
+        best = int(np.argmax(scores))
+        name, score = self.example_intents[best], float(scores[best])
+        if score < self.threshold or len(words) > self._intent_max_words(name):
+            return None
+        if not self._covers(words, self.example_words[best]):
+            return None
+        runner_up = max((s for s, n in zip(scores, self.example_intents) if n != name), default=0.0)
+        if score - runner_up < self.margin:
+            return None
+        return self._match(name, score)
@@ -4,32 +4,65 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 import json
 import time
+import threading
+
+from core.config import settings
+from core.health import CachedCheck, overall_status
+from core.metrics import record_generation
+from core.tracing import span, traced
+from services.generation_scheduler import GenerationScheduler, GenerationRejected, Priority, get_scheduler
 
 logger = logging.getLogger(__name__)
 
+class GenerationFailed(Exception):
+    """Raised when Ollama does not produce an answer, so callers never treat an error as content"""
+
+def _has_model(names: List[str], model: str) -> bool:
+    """Whether model is among names, where a model without a tag means ':latest'"""
+    wanted = model if ':' in model else f"{model}:latest"
+    return model in names or wanted in names
+
 class OllamaService:
-    def __init__(self, base_url: str = "http://localhost:11434/api"):
+    def __init__(self, base_url: str = "http://localhost:11434/api",
+                 scheduler: Optional[GenerationScheduler] = None,
+                 keep_alive: Optional[Any] = None):
         """Initialize OllamaService with API endpoint"""
         self.api_url = base_url
         self.embedding_model = "nomic-embed-text"
         self.generation_model = "llama3.2"
         self.default_timeout = 30
+        self.warm_up_timeout = 120
         self.max_retries = 3
         self.retry_delay = 1
+        # Shared by all sessions so concurrency is bounded per Ollama host
+        self.scheduler = scheduler or get_scheduler()
+        # How long Ollama keeps the models loaded after a request, e.g. "30m"; -1 pins them
+        self.keep_alive = settings.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+        # Timings of the last generation on this thread, and running totals
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._totals = {'generations': 0, 'cold_loads': 0, 'load_ms': 0.0, 'prefill_ms': 0.0,
+                        'prefill_tokens': 0, 'eval_ms': 0.0, 'eval_tokens': 0}
+        # Health probes must stay cheap; only the deep check runs the models
+        self.probe_timeout = 2
+        self._readiness = CachedCheck("Ollama readiness", self._check_readiness, float(settings.HEALTH_READY_TTL))
+        self._deep = CachedCheck("Ollama deep", self._check_deep, float(settings.HEALTH_DEEP_INTERVAL))
 
     def get_embedding(self, text: str, retry_count: int = 0) -> Optional[List[float]]:
         """Get embeddings for text with retry logic"""
         try:
-            response = requests.post(
-                f"{self.api_url}/embeddings",
-                json={
-                    "model": self.embedding_model,
-                    "prompt": text
-                },
-                timeout=self.default_timeout
-            )
-            response.raise_for_status()
-            return response.json()['embedding']
+            with span("ollama.embedding"):
+                response = requests.post(
+                    f"{self.api_url}/embeddings",
+                    json={
+                        "model": self.embedding_model,
+                        "prompt": text,
+                        "keep_alive": self.keep_alive
+                    },
+                    timeout=self.default_timeout
+                )
+                response.raise_for_status()
+                return response.json()['embedding']
         except requests.RequestException as e:
             if retry_count < self.max_retries:
                 logger.warning(f"Retry {retry_count + 1} for embedding generation")
@@ -38,46 +71,74 @@ class OllamaService:
             logger.error(f"Error getting embedding: {str(e)}")
             return None
 
-    def generate_response(self, prompt: str, temperature: float = 0.7) -> str:
-        """Generate AI response with parameters"""
+    def generate_response(self, prompt: str, temperature: float = 0.7,
+                          priority: Priority = Priority.INTERACTIVE, system: Optional[str] = None) -> str:
+        """Generate AI response with parameters.
+
+        The fixed system message goes first so Ollama can reuse its evaluated
+        prefix across requests. Raises GenerationRejected when the scheduler
+        sheds the request and GenerationFailed when Ollama fails.
+        """
+        self._reset_timings()
+        with self.scheduler.slot(priority):
+            return self._generate(prompt, temperature, system)
+
+    def _chat_payload(self, prompt: str, system: Optional[str], stream: bool, options: Dict[str, Any]) -> Dict[str, Any]:
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return {
+            "model": self.generation_model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
+
+    @traced("ollama.generate")
+    def _generate(self, prompt: str, temperature: float, system: Optional[str] = None) -> str:
         try:
             response = requests.post(
-                f"{self.api_url}/generate",
-                json={
-                    "model": self.generation_model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "max_tokens": 500,
-                        "stop": ["###"]  # Custom stop token
-                    }
-                },
+                f"{self.api_url}/chat",
+                json=self._chat_payload(prompt, system, False, {
+                    "temperature": temperature,
+                    "top_p": 0.9,
+                    "top_k": 40,
+                    "num_predict": 500,
+                    "stop": ["###"]  # Custom stop token
+                }),
                 timeout=self.default_timeout
             )
             response.raise_for_status()
-            return response.json()['response']
+            data = response.json()
+            self._record_timings(data)
+            return data['message']['content']
         except requests.RequestException as e:
             logger.error(f"Error generating response: {str(e)}")
-            return "I apologize, but I'm unable to generate a response at the moment."
+            raise GenerationFailed(str(e)) from e
+
+    def generate_response_stream(self, prompt: str, callback=None, priority: Priority = Priority.INTERACTIVE,
+                                 system: Optional[str] = None):
+        """Generate response with streaming; the slot is held until the stream ends.
+
+        Raises GenerationFailed if the stream breaks, possibly after some chunks.
+        """
+        self._reset_timings()
+        with self.scheduler.slot(priority):
+            yield from self._generate_stream(prompt, callback, system)
 
-    def generate_response_stream(self, prompt: str, callback=None):
-        """Generate response with streaming"""
+    def _generate_stream(self, prompt: str, callback=None, system: Optional[str] = None):
+        with span("ollama.generate_stream"):
+            yield from self._stream_chunks(prompt, callback, system)
+
+    def _stream_chunks(self, prompt: str, callback=None, system: Optional[str] = None):
         try:
             response = requests.post(
-                f"{self.api_url}/generate",
-                json={
-                    "model": self.generation_model,
-                    "prompt": prompt,
-                    "stream": True,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "top_k": 40
-                    }
-                },
+                f"{self.api_url}/chat",
+                json=self._chat_payload(prompt, system, True, {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "top_k": 40
+                }),
                 stream=True,
                 timeout=self.default_timeout
             )
@@ -86,45 +147,163 @@ class OllamaService:
             for line in response.iter_lines():
                 if line:
                     json_response = json.loads(line)
+                    if json_response.get('done'):
+                        self._record_timings(json_response)
+                    chunk = json_response.get('message', {}).get('content', '')
                     if callback:
-                        callback(json_response.get('response', ''))
-                    yield json_response.get('response', '')
+                        callback(chunk)
+                    yield chunk
         except Exception as e:
             logger.error(f"Error in stream generation: {str(e)}")
-            yield "Error generating response"
+            raise GenerationFailed(str(e)) from e
+
+    def _reset_timings(self):
+        # A shed or failed generation must not report the previous one's timings from this thread
+        self._local.timings = {}
+
+    def _record_timings(self, data: Dict[str, Any]):
+        """Keep Ollama's load/prefill/decode durations (reported in nanoseconds)"""
+        timings = {
+            'load_ms': data.get('load_duration', 0) / 1e6,
+            'prefill_ms': data.get('prompt_eval_duration', 0) / 1e6,
+            'prefill_tokens': data.get('prompt_eval_count', 0),
+            'eval_ms': data.get('eval_duration', 0) / 1e6,
+            'eval_tokens': data.get('eval_count', 0),
+            'total_ms': data.get('total_duration', 0) / 1e6
+        }
+        # A load of more than a second means the model had been unloaded
+        timings['cold_load'] = timings['load_ms'] > 1000
+        self._local.timings = timings
+        record_generation(timings)
+
+        with self._stats_lock:
+            self._totals['generations'] += 1
+            self._totals['cold_loads'] += int(timings['cold_load'])
+            for key in ('load_ms', 'prefill_ms', 'prefill_tokens', 'eval_ms', 'eval_tokens'):
+                self._totals[key] += timings[key]
+
+    def last_generation_stats(self) -> Dict[str, Any]:
+        """Timings of the most recent generation made by the calling thread"""
+        return dict(getattr(self._local, 'timings', {}))
+
+    def get_generation_stats(self) -> Dict[str, Any]:
+        """Averages over all generations of this service"""
+        with self._stats_lock:
+            totals = dict(self._totals)
+        count = totals['generations']
+        return {
+            'generations': count,
+            'cold_loads': totals['cold_loads'],
+            'avg_load_ms': totals['load_ms'] / count if count else 0.0,
+            'avg_prefill_ms': totals['prefill_ms'] / count if count else 0.0,
+            'prefill_tokens_per_sec': totals['prefill_tokens'] / (totals['prefill_ms'] / 1000) if totals['prefill_ms'] else 0.0,
+            'eval_tokens_per_sec': totals['eval_tokens'] / (totals['eval_ms'] / 1000) if totals['eval_ms'] else 0.0
+        }
+
+    def warm_up(self, system: Optional[str] = None) -> Dict[str, Any]:
+        """Load both models and evaluate the system prompt so the first user request starts warm"""
+        try:
+            requests.post(
+                f"{self.api_url}/embeddings",
+                json={"model": self.embedding_model, "prompt": "warm up", "keep_alive": self.keep_alive},
+                timeout=self.warm_up_timeout
+            ).raise_for_status()
+
+            with self.scheduler.slot(Priority.BACKGROUND):
+                response = requests.post(
+                    f"{self.api_url}/chat",
+                    json=self._chat_payload("Hello", system, False, {"num_predict": 1}),
+                    timeout=self.warm_up_timeout
+                )
+                response.raise_for_status()
+                self._record_timings(response.json())
+            timings = self.last_generation_stats()
+            logger.info(f"Warmed up {self.generation_model}: load {timings['load_ms']:.0f}ms, "
+                        f"prefill {timings['prefill_tokens']} tokens in {timings['prefill_ms']:.0f}ms")
+            return timings
+        except (requests.RequestException, GenerationRejected) as e:
+            logger.warning(f"Model warm-up failed: {str(e)}")
+            return {}
 
     def batch_get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
         """Get embeddings for multiple texts"""
         return [self.get_embedding(text) for text in texts]
 
-    def health_check(self) -> Dict[str, Any]:
-        """Check if Ollama service is available"""
+    def liveness(self) -> Dict[str, Any]:
+        """Fast probe: is the Ollama server answering at all"""
         try:
-            # Test embedding generation
-            test_embedding = self.get_embedding("test")
-            embedding_status = bool(test_embedding)
-
-            # Test response generation
-            test_response = self.generate_response("Hello")
-            generation_status = bool(test_response)
-
-            return {
-                'status': 'healthy' if embedding_status and generation_status else 'partial',
-                'embedding_service': 'available' if embedding_status else 'unavailable',
-                'generation_service': 'available' if generation_status else 'unavailable',
-                'models': {
-                    'embedding': self.embedding_model,
-                    'generation': self.generation_model
-                },
-                'timestamp': datetime.now().isoformat()
-            }
-        except Exception as e:
-            logger.error(f"Health check failed: {str(e)}")
-            return {
-                'status': 'unhealthy',
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
+            start = time.perf_counter()
+            requests.get(f"{self.api_url}/tags", timeout=self.probe_timeout).raise_for_status()
+            return {'ok': True, 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
+        except requests.RequestException as e:
+            return {'ok': False, 'error': str(e)}
+
+    def _check_readiness(self) -> Dict[str, Any]:
+        """Both models installed; also reports which of them are loaded in memory"""
+        installed = requests.get(f"{self.api_url}/tags", timeout=self.probe_timeout)
+        installed.raise_for_status()
+        installed_names = [m.get('name', '') for m in installed.json().get('models', [])]
+        running = requests.get(f"{self.api_url}/ps", timeout=self.probe_timeout)
+        running.raise_for_status()
+        loaded_names = [m.get('name', '') for m in running.json().get('models', [])]
+
+        models = {}
+        for role, model in (('embedding', self.embedding_model), ('generation', self.generation_model)):
+            models[role] = {
+                'name': model,
+                'installed': _has_model(installed_names, model),
+                'loaded': _has_model(loaded_names, model)
             }
+        return {'ok': all(m['installed'] for m in models.values()), 'models': models}
+
+    def readiness(self, force: bool = False) -> Dict[str, Any]:
+        """Cached readiness, refreshed at most every HEALTH_READY_TTL seconds"""
+        return self._readiness.get(force)
+
+    def _check_deep(self) -> Dict[str, Any]:
+        """Embed a word and generate a single token at background priority"""
+        embedding_ok = bool(self.get_embedding("health"))
+        try:
+            with self.scheduler.slot(Priority.BACKGROUND, timeout=self.probe_timeout):
+                response = requests.post(
+                    f"{self.api_url}/chat",
+                    json=self._chat_payload("Hello", None, False, {"num_predict": 1}),
+                    timeout=self.default_timeout
+                )
+                response.raise_for_status()
+                generation_ok = 'message' in response.json()
+        except (requests.RequestException, GenerationRejected) as e:
+            logger.warning(f"Deep generation check failed: {str(e)}")
+            generation_ok = False
+        return {
+            'ok': embedding_ok and generation_ok,
+            'embedding_service': 'available' if embedding_ok else 'unavailable',
+            'generation_service': 'available' if generation_ok else 'unavailable'
+        }
+
+    def deep_check(self, force: bool = False) -> Dict[str, Any]:
+        """End-to-end check that runs the models, at most every HEALTH_DEEP_INTERVAL seconds"""
+        return self._deep.get(force)
+
+    def health_check(self, deep: bool = False) -> Dict[str, Any]:
+        """Check if Ollama service is available.
+
+        Only the liveness probe hits Ollama on every call; readiness is cached
+        and the deep check (which runs the models) only runs when asked for and
+        its last result is older than its interval.
+        """
+        liveness = self.liveness()
+        readiness = self.readiness() if liveness['ok'] else {'ok': False, 'error': 'not alive'}
+        deep_result = self.deep_check() if deep and liveness['ok'] else self._deep.last()
+        return {
+            'status': overall_status(liveness, readiness, deep_result),
+            'liveness': liveness,
+            'readiness': readiness,
+            'deep': deep_result,
+            'scheduler': self.scheduler.get_stats(),
+            'generation_stats': self.get_generation_stats(),
+            'timestamp': datetime.now().isoformat()
+        }
 
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about available models"""
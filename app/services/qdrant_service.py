@@ -4,44 +4,141 @@ from typing import List, Optional, Dict, Any, Tuple
 from collections import Counter, defaultdict
 import logging
 from datetime import datetime
+import os
+import time
+import threading
 import numpy as np
 
+from core.config import settings
+from core.health import CachedCheck, overall_status
+from core.tracing import traced
+from services.faq_store import FAQStore
+from ingestion.sparse import SparseEncoder, DEFAULT_ENCODER_PATH
+
 logger = logging.getLogger(__name__)
 
+# Name of the sparse TF-IDF vector stored next to the unnamed dense vector
+SPARSE_VECTOR_NAME = "text-sparse"
+
 class QdrantService:
-    def __init__(self, host: str = "localhost", port: int = 6333):
-        """Initialize QdrantService with connection parameters"""
+    def __init__(self, host: str = "localhost", port: int = 6333,
+                 sparse_encoder_path: str = DEFAULT_ENCODER_PATH,
+                 client: Optional[QdrantClient] = None,
+                 sparse_encoder: Optional[SparseEncoder] = None):
+        """Initialize QdrantService with connection parameters (or an existing client, e.g. in-memory)"""
         try:
-            self.client = QdrantClient(host=host, port=port)
+            self.client = client or QdrantClient(host=host, port=port)
             self.collection_name = "knowledge_base"
-            logger.info(f"Connected to Qdrant at {host}:{port}")
+            if client is None:
+                logger.info(f"Connected to Qdrant at {host}:{port}")
         except Exception as e:
             logger.error(f"Failed to connect to Qdrant: {str(e)}")
             raise
 
-    def search(self, query_vector: List[float], filters: Optional[dict] = None, limit: int = 5) -> List[Any]:
+        # Weight of the dense ranking when fusing it with the sparse ranking
+        self.hybrid_alpha = 0.7
+        # Reciprocal rank fusion constant; larger values flatten the rank weights
+        self.hybrid_rrf_k = 60
+        # Candidates fetched per retriever, as a multiple of the result limit
+        self.hybrid_candidates = 4
+        # HNSW/quantization parameters for dense queries; None uses the collection's defaults
+        self.search_params = self._default_search_params()
+        # The ingestion scripts refit and overwrite the encoder file; it is reloaded when its mtime
+        # changes. An encoder passed in directly is used as is.
+        self.sparse_encoder = sparse_encoder
+        self.sparse_encoder_path = None if sparse_encoder is not None else sparse_encoder_path
+        self._encoder_mtime = -1
+        self._encoder_lock = threading.Lock()
+        # Seconds a hybrid support check is trusted; ingestion can add points of another encoder version
+        self.hybrid_check_interval = 300
+        self._hybrid_enabled = None
+        self._hybrid_checked_at = 0.0
+        self._refresh_sparse_encoder()
+        self._readiness = CachedCheck("Qdrant readiness", self._check_readiness, float(settings.HEALTH_READY_TTL))
+        self._deep = CachedCheck("Qdrant deep", self._check_deep, float(settings.HEALTH_DEEP_INTERVAL))
+        # Precomputed answers to frequent questions, generated from this collection
+        self.faq = FAQStore(self.client, self.collection_name, settings.FAQ_COLLECTION)
+
+    def _load_sparse_encoder(self, path: str) -> Optional[SparseEncoder]:
+        """Load the sparse encoder shared with the ingestion scripts"""
+        if not os.path.exists(path):
+            logger.info(f"No sparse encoder at {path}, hybrid search disabled")
+            return None
+        try:
+            return SparseEncoder.load(path)
+        except Exception as e:
+            logger.error(f"Failed to load sparse encoder: {str(e)}")
+            return None
+
+    def _refresh_sparse_encoder(self):
+        """Reload the sparse encoder if its file changed since it was loaded"""
+        if self.sparse_encoder_path is None:
+            return
+        try:
+            mtime = os.stat(self.sparse_encoder_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._encoder_mtime:
+            return
+        with self._encoder_lock:
+            if mtime == self._encoder_mtime:
+                return
+            self.sparse_encoder = self._load_sparse_encoder(self.sparse_encoder_path) if mtime else None
+            if self._encoder_mtime != -1:
+                logger.info(f"Sparse encoder file changed, loaded version {getattr(self.sparse_encoder, 'version', None)}")
+            self._encoder_mtime = mtime
+            # Whether the collection matches has to be checked again for the new encoder
+            self._hybrid_enabled = None
+
+    def _default_search_params(self) -> Optional[models.SearchParams]:
+        """Query-time HNSW ef and quantization rescoring from settings"""
+        hnsw_ef = int(settings.QDRANT_HNSW_EF)
+        rescore = settings.QDRANT_QUANTIZATION_RESCORE
+        if not hnsw_ef and rescore is None:
+            return None
+        return models.SearchParams(
+            hnsw_ef=hnsw_ef or None,
+            quantization=models.QuantizationSearchParams(rescore=bool(rescore)) if rescore is not None else None
+        )
+
+    def _build_filter(self, filters: Optional[dict]) -> Optional[models.Filter]:
+        """Convert a field -> condition dict into a Qdrant filter.
+
+        A condition is a value to match, a list or {'in': [...]} of accepted
+        values, or a {'gt', 'gte', 'lt', 'lte'} range; ranges with string
+        bounds compare ISO timestamps.
+        """
+        filter_conditions = []
+        for key, value in (filters or {}).items():
+            if isinstance(value, dict) and 'in' in value:
+                value = list(value['in'])
+            if isinstance(value, (list, tuple)):
+                condition = models.FieldCondition(key=key, match=models.MatchAny(any=list(value)))
+            elif isinstance(value, dict):
+                bounds = {op: value[op] for op in ('gt', 'gte', 'lt', 'lte') if value.get(op) is not None}
+                if any(isinstance(bound, str) for bound in bounds.values()):
+                    condition = models.FieldCondition(key=key, range=models.DatetimeRange(**bounds))
+                else:
+                    condition = models.FieldCondition(key=key, range=models.Range(**bounds))
+            else:
+                condition = models.FieldCondition(key=key, match=models.MatchValue(value=value))
+            filter_conditions.append(condition)
+        return models.Filter(must=filter_conditions) if filter_conditions else None
+
+    @traced("qdrant.search")
+    def search(self, query_vector: List[float], filters: Optional[dict] = None, limit: int = 5,
+               search_params: Optional[models.SearchParams] = None) -> List[Any]:
         """Perform vector search with filters"""
         try:
-            filter_conditions = []
-            if filters:
-                for key, value in filters.items():
-                    filter_conditions.append(
-                        models.FieldCondition(
-                            key=key,
-                            match=models.MatchValue(value=value)
-                        )
-                    )
-            
-            search_result = self.client.search(
+            search_result = self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
-                query_filter=models.Filter(
-                    must=filter_conditions
-                ) if filter_conditions else None,
+                query=query_vector,
+                query_filter=self._build_filter(filters),
+                search_params=search_params or self.search_params,
                 limit=limit,
                 with_payload=True,
                 score_threshold=0.0
-            )
+            ).points
             
             logger.debug(f"Search completed: {len(search_result)} results found")
             return search_result
@@ -49,6 +146,149 @@ class QdrantService:
             logger.error(f"Error during search: {str(e)}")
             return []
 
+    def hybrid_enabled(self) -> bool:
+        """Whether the collection stores sparse vectors built by the loaded encoder.
+
+        Rechecked when the encoder file changes and every hybrid_check_interval seconds.
+        """
+        self._refresh_sparse_encoder()
+        expired = time.monotonic() - self._hybrid_checked_at >= self.hybrid_check_interval
+        if self._hybrid_enabled is None or expired:
+            self._hybrid_enabled = self._check_hybrid()
+            self._hybrid_checked_at = time.monotonic()
+        return self._hybrid_enabled
+
+    def _check_hybrid(self) -> bool:
+        encoder = self.sparse_encoder
+        if encoder is None:
+            return False
+        try:
+            info = self.client.get_collection(self.collection_name)
+            if SPARSE_VECTOR_NAME not in (info.config.params.sparse_vectors or {}):
+                logger.info("Collection has no sparse vectors, hybrid search disabled")
+                return False
+
+            # Indexed sparse vectors are only comparable with the encoder that built them;
+            # points without a version have no sparse vector and do not count
+            version = getattr(encoder, 'version', None)
+            mismatched = self.client.count(
+                collection_name=self.collection_name,
+                count_filter=models.Filter(must_not=[
+                    models.FieldCondition(key='sparse_encoder_version', match=models.MatchValue(value=version)),
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key='sparse_encoder_version'))
+                ]) if version else models.Filter(must_not=[
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key='sparse_encoder_version'))
+                ]),
+                exact=True
+            ).count
+            if mismatched:
+                logger.warning(f"{mismatched} points were indexed with another sparse encoder, hybrid search disabled")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Error checking hybrid search support: {str(e)}")
+            return False
+
+    def encode_sparse(self, text: str) -> Optional[models.SparseVector]:
+        """Sparse vector for text, or None when no encoder is loaded"""
+        if self.sparse_encoder is None or not text:
+            return None
+        encoded = self.sparse_encoder.encode(text)
+        return models.SparseVector(**encoded) if encoded['indices'] else None
+
+    @traced("qdrant.hybrid_search")
+    def hybrid_search(self, query_vector: List[float], query_text: str,
+                      filters: Optional[dict] = None, limit: int = 5,
+                      search_params: Optional[models.SearchParams] = None) -> List[Any]:
+        """Dense + sparse search in one request, ranked by reciprocal rank fusion.
+
+        Points are ordered by their fused rank (kept in order_value) but
+        their score stays the dense cosine similarity, so score thresholds
+        mean the same as for dense-only search. Falls back to dense-only
+        search when the collection or the loaded encoder does not support
+        sparse retrieval. search_params apply to the dense part.
+        """
+        search_params = search_params or self.search_params
+        if not self.hybrid_enabled():
+            return self.search(query_vector, filters=filters, limit=limit, search_params=search_params)
+
+        sparse_vector = self.encode_sparse(query_text)
+        if sparse_vector is None:
+            return self.search(query_vector, filters=filters, limit=limit, search_params=search_params)
+
+        try:
+            query_filter = self._build_filter(filters)
+            candidates = limit * self.hybrid_candidates
+            dense_response, sparse_response = self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    models.QueryRequest(
+                        query=query_vector,
+                        filter=query_filter,
+                        params=search_params,
+                        limit=candidates,
+                        with_payload=True
+                    ),
+                    models.QueryRequest(
+                        query=sparse_vector,
+                        using=SPARSE_VECTOR_NAME,
+                        filter=query_filter,
+                        limit=candidates,
+                        with_payload=True,
+                        # Dense vectors let sparse-only hits get a real dense score
+                        with_vector=['']
+                    )
+                ]
+            )
+            results = self._fuse_scores(query_vector, dense_response.points, sparse_response.points, limit)
+            logger.debug(f"Hybrid search completed: {len(results)} results found")
+            return results
+        except Exception as e:
+            logger.error(f"Error during hybrid search, falling back to dense: {str(e)}")
+            return self.search(query_vector, filters=filters, limit=limit, search_params=search_params)
+
+    def _fuse_scores(self, query_vector: List[float], dense_points: List[Any],
+                     sparse_points: List[Any], limit: int) -> List[models.ScoredPoint]:
+        """Weighted reciprocal rank fusion of the dense and sparse rankings.
+
+        The fused value only orders the points (order_value); score is the
+        dense cosine similarity, computed from the stored vector for points
+        only the sparse search found.
+        """
+        dense_scores = {point.id: point.score for point in dense_points}
+        dense_ranks = {point.id: rank for rank, point in enumerate(dense_points, 1)}
+        sparse_ranks = {point.id: rank for rank, point in enumerate(sparse_points, 1)}
+
+        points = {point.id: point for point in dense_points}
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        for point in sparse_points:
+            points.setdefault(point.id, point)
+            if point.id not in dense_scores:
+                vector = point.vector.get('') if isinstance(point.vector, dict) else point.vector
+                if vector is not None:
+                    vector = np.asarray(vector, dtype=np.float32)
+                    dense_scores[point.id] = float(query @ vector / (query_norm * (np.linalg.norm(vector) or 1.0)))
+
+        fused = []
+        for point_id, point in points.items():
+            rank_score = 0.0
+            if point_id in dense_ranks:
+                rank_score += self.hybrid_alpha / (self.hybrid_rrf_k + dense_ranks[point_id])
+            if point_id in sparse_ranks:
+                rank_score += (1 - self.hybrid_alpha) / (self.hybrid_rrf_k + sparse_ranks[point_id])
+            fused.append(models.ScoredPoint(
+                id=point.id,
+                version=point.version,
+                score=dense_scores.get(point_id, 0.0),
+                payload=point.payload,
+                order_value=rank_score
+            ))
+
+        fused.sort(key=lambda point: point.order_value, reverse=True)
+        return fused[:limit]
+
+    @traced("qdrant.summary")
     def get_knowledge_base_summary(self) -> Dict[str, Any]:
         """Get comprehensive knowledge base summary"""
         try:
@@ -138,6 +378,7 @@ class QdrantService:
                 'timestamp': datetime.now().isoformat()
             }
 
+    @traced("qdrant.keywords")
     def get_keywords(self) -> List[str]:
         """Get all unique keywords from the knowledge base"""
         try:
@@ -157,6 +398,13 @@ class QdrantService:
             logger.error(f"Error getting keywords: {str(e)}")
             return []
 
+    def _point_vector(self, content: str, embedding: List[float]) -> Any:
+        """Dense vector, plus the sparse vector when the collection is hybrid"""
+        sparse_vector = self.encode_sparse(content) if self.hybrid_enabled() else None
+        if sparse_vector is None:
+            return embedding
+        return {'': embedding, SPARSE_VECTOR_NAME: sparse_vector}
+
     def add_entry(self, content: str, embedding: List[float], metadata: Dict[str, Any]) -> bool:
         """Add a new entry to the knowledge base"""
         try:
@@ -165,7 +413,7 @@ class QdrantService:
                 points=[
                     models.PointStruct(
                         id=str(int(datetime.now().timestamp() * 1000)),
-                        vector=embedding,
+                        vector=self._point_vector(content, embedding),
                         payload={
                             'original_content': content,
                             **metadata,
@@ -185,17 +433,23 @@ class QdrantService:
         try:
             entry = self.client.retrieve(
                 collection_name=self.collection_name,
-                ids=[entry_id]
+                ids=[entry_id],
+                with_vectors=True
             )
             
             if not entry:
                 return []
             
-            similar = self.client.search(
+            vector = entry[0].vector
+            # Hybrid points carry named vectors; the dense one is unnamed
+            if isinstance(vector, dict):
+                vector = vector.get('')
+            similar = self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=entry[0].vector,
-                limit=limit + 1
-            )
+                query=vector,
+                limit=limit + 1,
+                with_payload=True
+            ).points
             
             return [
                 {
@@ -233,7 +487,7 @@ class QdrantService:
                 points=[
                     models.PointStruct(
                         id=entry_id,
-                        vector=embedding,
+                        vector=self._point_vector(content, embedding),
                         payload={
                             'original_content': content,
                             **metadata,
@@ -247,30 +501,77 @@ class QdrantService:
             logger.error(f"Error updating entry: {str(e)}")
             return False
 
-    def health_check(self) -> Dict[str, Any]:
-        """Check the health of the Qdrant service"""
+    def liveness(self) -> Dict[str, Any]:
+        """Fast probe: is Qdrant answering at all"""
         try:
-            collections = self.client.get_collections()
-            kb_collection = next(
-                (c for c in collections.collections 
-                 if c.name == self.collection_name), 
-                None
-            )
-            
-            return {
-                'status': 'healthy',
-                'collection_exists': bool(kb_collection),
-                'vector_size': kb_collection.vector_size if kb_collection else None,
-                'total_entries': kb_collection.points_count if kb_collection else 0,
-                'timestamp': datetime.now().isoformat()
-            }
+            self.client.get_collections()
+            return {'ok': True}
         except Exception as e:
-            logger.error(f"Health check failed: {str(e)}")
-            return {
-                'status': 'unhealthy',
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
+            return {'ok': False, 'error': str(e)}
+
+    def _check_readiness(self) -> Dict[str, Any]:
+        """The knowledge base collection exists and is not in an error state"""
+        if not self.client.collection_exists(self.collection_name):
+            return {'ok': False, 'collection_exists': False, 'total_entries': 0}
+        info = self.client.get_collection(self.collection_name)
+        vectors = info.config.params.vectors
+        # Unnamed dense vector, or named vectors keyed by name
+        vector_size = vectors.size if hasattr(vectors, 'size') else {name: v.size for name, v in (vectors or {}).items()}
+        status = getattr(info.status, 'value', str(info.status))
+        return {
+            'ok': status != 'red',
+            'collection_exists': True,
+            'collection_status': status,
+            'vector_size': vector_size,
+            'total_entries': info.points_count or 0
+        }
+
+    def readiness(self, force: bool = False) -> Dict[str, Any]:
+        """Cached readiness, refreshed at most every HEALTH_READY_TTL seconds"""
+        return self._readiness.get(force)
+
+    def _check_deep(self) -> Dict[str, Any]:
+        """Search with a stored vector and expect its own point back"""
+        points = self.client.scroll(
+            collection_name=self.collection_name,
+            limit=1,
+            with_payload=False,
+            with_vectors=True
+        )[0]
+        if not points:
+            return {'ok': True, 'search': 'skipped, collection is empty'}
+        vector = points[0].vector
+        if isinstance(vector, dict):
+            vector = vector.get('')
+        if vector is None:
+            return {'ok': True, 'search': 'skipped, no unnamed dense vector'}
+        found = self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            limit=1,
+            with_payload=False
+        ).points
+        return {'ok': bool(found), 'search': 'available' if found else 'no results'}
+
+    def deep_check(self, force: bool = False) -> Dict[str, Any]:
+        """End-to-end search check, at most every HEALTH_DEEP_INTERVAL seconds"""
+        return self._deep.get(force)
+
+    def health_check(self, deep: bool = False) -> Dict[str, Any]:
+        """Check the health of the Qdrant service (readiness and deep results are cached)"""
+        liveness = self.liveness()
+        readiness = self.readiness() if liveness['ok'] else {'ok': False, 'error': 'not alive'}
+        deep_result = self.deep_check() if deep and liveness['ok'] else self._deep.last()
+        return {
+            'status': overall_status(liveness, readiness, deep_result),
+            'liveness': liveness,
+            'readiness': readiness,
+            'deep': deep_result,
+            'collection_exists': readiness.get('collection_exists', False),
+            'vector_size': readiness.get('vector_size'),
+            'total_entries': readiness.get('total_entries', 0),
+            'timestamp': datetime.now().isoformat()
+        }
 
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get detailed statistics about the collection"""
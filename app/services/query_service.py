@@ -1,5 +1,5 @@
 import re
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Callable, List, Tuple, Dict, Any, Optional
 import logging
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -11,17 +11,47 @@ try:
 except ImportError:
     NLP_AVAILABLE = False
 
+from core.config import settings
+from core.tracing import span, start_trace
+from services.context_builder import ContextBuilder
+from services.generation_scheduler import GenerationRejected
+from services.intent_router import IntentRouter
+
 logger = logging.getLogger(__name__)
 
+# Identical for every request so Ollama can reuse the evaluated prefix between requests;
+# everything that varies goes into the user message built by generate_enhanced_prompt
+SYSTEM_PROMPT = """You are an AI assistant for SRH Hochschule Heidelberg.
+
+Each message states a Mode, a Query Type and a Question.
+
+In KNOWLEDGE BASE mode the message also contains Context from the knowledge base. Provide a detailed answer to the question based on that context. If the context doesn't fully address the question, supplement with relevant general knowledge. Please provide:
+1. A direct answer to the question
+2. Any relevant additional information
+3. Related topics or suggestions
+4. Sources of information when available
+
+In GENERAL mode the question was not found in the knowledge base. Provide a general answer while noting that for specific, up-to-date details, the user should consult official sources. Please provide:
+1. A general answer based on available information
+2. A note about consulting official sources for specific details
+3. Any relevant suggestions or related topics"""
+
 class QueryProcessor:
     def __init__(self):
-        self.vectorizer = TfidfVectorizer()
         self.common_keywords = {
             'srh', 'university', 'course', 'program', 'study', 
             'admission', 'faculty', 'research', 'campus', 'heidelberg',
             'computer', 'science', 'artificial', 'intelligence', 'data',
             'bachelor', 'master', 'degree', 'professor', 'student'
         }
+        self.system_prompt = SYSTEM_PROMPT
+        self.context_builder = ContextBuilder(token_budget=int(settings.CONTEXT_TOKEN_BUDGET))
+        # Results fetched per expanded query
+        self.retrieval_limit = int(settings.RETRIEVAL_LIMIT)
+        self.intent_router = IntentRouter(settings.INTENTS_PATH)
+        # Precomputed answers (vector/build_faq.py) served above this question similarity
+        self.faq_enabled = bool(settings.FAQ_ENABLED)
+        self.faq_min_score = float(settings.FAQ_MIN_SCORE)
         # Initialize spaCy if available
         if NLP_AVAILABLE:
             try:
@@ -35,117 +65,224 @@ class QueryProcessor:
     def process_query(self, query: str, qdrant_service, ollama_service) -> Dict[str, Any]:
         """Main query processing method"""
         try:
-            # Handle greetings
-            if query.lower() in ["hi", "hello", "hey"]:
-                return {
-                    "type": "ai",
-                    "content": "Hello! How can I assist you with information about SRH Hochschule Heidelberg today?",
-                    "is_from_knowledge_base": False,
-                    "relevance_score": 0.0,
-                    "search_results": []
+            return self.answer_query(query, qdrant_service, ollama_service)
+        except Exception as e:
+            logger.error(f"Error processing query: {str(e)}")
+            return {
+                "type": "error",
+                "content": "An error occurred while processing your request. Please try again."
+            }
+
+    def answer_query(self, query: str, qdrant_service, ollama_service) -> Dict[str, Any]:
+        """process_query without the error response: failures raise (GenerationFailed when Ollama fails).
+
+        A shed generation still answers, from retrieval only, marked degraded.
+        """
+        with start_trace("query") as trace:
+            response, prompt = self.prepare_response(query, qdrant_service, ollama_service)
+            if prompt is not None:
+                try:
+                    with span("generation"):
+                        response["content"] = ollama_service.generate_response(prompt, system=self.system_prompt)
+                    response.setdefault("metadata", {})["generation"] = ollama_service.last_generation_stats()
+                except GenerationRejected as e:
+                    logger.warning(f"Generation shed, answering from retrieval only: {str(e)}")
+                    self.degrade_response(response)
+            response.setdefault("metadata", {})["timings"] = trace.summary()
+        return response
+
+    def prepare_response(self, query: str, qdrant_service, ollama_service) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Everything up to generation: the response without its content and the prompt to generate it.
+
+        The prompt is None when the response is already complete (canned
+        intents, knowledge base summary, precomputed FAQ answers), so callers can generate in one go or stream.
+        Stage timings up to this point are in metadata['timings'].
+        """
+        with start_trace("query") as trace:
+            response, prompt = self._build_response(query, qdrant_service, ollama_service)
+            response.setdefault("metadata", {})["timings"] = trace.summary()
+        return response, prompt
+
+    def _build_response(self, query: str, qdrant_service, ollama_service) -> Tuple[Dict[str, Any], Optional[str]]:
+        # Canned intents (greetings, thanks, navigation) skip retrieval and generation
+        with span("query.intent"):
+            intent = self.intent_router.route(query)
+        if intent is not None and intent.response:
+            return {
+                "type": "ai",
+                "content": intent.response.strip(),
+                "is_from_knowledge_base": False,
+                "relevance_score": 0.0,
+                "search_results": [],
+                "metadata": {
+                    "type": "intent",
+                    "intent": intent.intent,
+                    "intent_score": round(intent.score, 3),
+                    "timestamp": datetime.now().isoformat()
                 }
+            }, None
 
-            # Handle knowledge base inquiries
-            if query.lower() in ["what is in your knowledge base?", "what do you know?", "what information do you have?"]:
-                summary = qdrant_service.get_knowledge_base_summary()
-                return {
-                    "type": "ai",
-                    "content": summary['text'] if isinstance(summary, dict) else summary,
-                    "is_from_knowledge_base": True,
-                    "relevance_score": 1.0,
-                    "search_results": [],
-                    "metadata": {
-                        "type": "summary",
-                        "timestamp": datetime.now().isoformat(),
-                        "summary_data": summary.get('data', {}) if isinstance(summary, dict) else {}
-                    }
+        # Handle knowledge base inquiries
+        if intent is not None and intent.action == 'knowledge_base_summary':
+            summary = qdrant_service.get_knowledge_base_summary()
+            return {
+                "type": "ai",
+                "content": summary['text'] if isinstance(summary, dict) else summary,
+                "is_from_knowledge_base": True,
+                "relevance_score": 1.0,
+                "search_results": [],
+                "metadata": {
+                    "type": "summary",
+                    "timestamp": datetime.now().isoformat(),
+                    "summary_data": summary.get('data', {}) if isinstance(summary, dict) else {}
                 }
+            }, None
+
+        # The query is embedded at most once, for the FAQ lookup and the search of the unexpanded query
+        embeddings = {}
+        def embed(text: str) -> Optional[List[float]]:
+            if text not in embeddings:
+                embeddings[text] = ollama_service.get_embedding(text)
+            return embeddings[text]
 
-            # Process regular queries
+        # Serve a precomputed answer to a frequent question
+        faq_response = self.lookup_faq(query, qdrant_service, embed)
+        if faq_response is not None:
+            return faq_response, None
+
+        # Process regular queries
+        with span("query.analyze"):
             query_analysis = self.analyze_query_complexity(query)
             preprocessed_query = self.preprocess_query(query)
             expanded_queries = self.expand_query(preprocessed_query)
-            
-            # Check relevance
-            is_relevant, relevance_score = self.is_query_relevant(
-                preprocessed_query, 
-                qdrant_service.get_keywords()
-            )
+        
+        # Check relevance
+        keywords = qdrant_service.get_keywords()
+        with span("query.relevance"):
+            is_relevant, relevance_score = self.is_query_relevant(preprocessed_query, keywords)
 
-            if is_relevant:
-                # Search across expanded queries
-                all_results = []
+        if is_relevant:
+            # Search across expanded queries
+            all_results = []
+            with span("query.retrieve"):
                 for expanded_query in expanded_queries:
-                    query_vector = ollama_service.get_embedding(expanded_query)
+                    query_vector = embed(query if expanded_query == preprocessed_query else expanded_query)
                     if query_vector:
-                        search_results = qdrant_service.search(
+                        # Sparse terms come from the query as typed, preprocessing strips
+                        # the punctuation of exact tokens such as "CS-101"
+                        search_results = qdrant_service.hybrid_search(
                             query_vector,
-                            limit=5
+                            query,
+                            limit=self.retrieval_limit
                         )
                         all_results.extend(search_results)
 
-                # Process and deduplicate results
-                results = []
-                seen_contents = set()
-                for result in all_results:
-                    content = result.payload.get('original_content', '')
-                    if content and content not in seen_contents:
-                        seen_contents.add(content)
-                        results.append({
-                            "content": content,
-                            "score": result.score,
-                            "category": result.payload.get('category'),
-                            "source": result.payload.get('source'),
-                            "metadata": result.payload.get('metadata', {}),
-                            "timestamp": result.payload.get('timestamp')
-                        })
-
-                # Sort by relevance and limit
-                results.sort(key=lambda x: x['score'], reverse=True)
+            # Best first across expanded queries (hybrid results are ranked by their fused rank),
+            # so deduplication keeps the best copy of each passage
+            all_results.sort(
+                key=lambda r: r.order_value if r.order_value is not None else r.score, reverse=True
+            )
+            results = []
+            seen_contents = set()
+            for result in all_results:
+                content = result.payload.get('original_content', '')
+                if content and content not in seen_contents:
+                    seen_contents.add(content)
+                    results.append({
+                        "id": result.id,
+                        "content": content,
+                        "score": result.score,
+                        "category": result.payload.get('category'),
+                        "source": result.payload.get('source'),
+                        "metadata": result.payload.get('metadata', {}),
+                        "timestamp": result.payload.get('timestamp')
+                    })
+
+            # The context is packed from all candidates, only the top 5 are shown
+            with span("query.context"):
+                context, context_info = self.context_builder.build(query, results)
+                context_info["source_ids"] = [results[rank]["id"] for rank in context_info["source_ranks"]]
                 results = results[:5]
 
-                # Generate response
-                context = "\n\n".join([r["content"] for r in results])
                 prompt = self.generate_enhanced_prompt(query, context, True, query_analysis)
-                ai_response = ollama_service.generate_response(prompt)
-
-                return {
-                    "type": "ai",
-                    "content": ai_response,
-                    "is_from_knowledge_base": True,
-                    "relevance_score": relevance_score,
-                    "search_results": results,
-                    "search_info": f"Found {len(results)} relevant results",
-                    "metadata": {
-                        "query_expansion": expanded_queries,
-                        "query_analysis": query_analysis,
-                        "timestamp": datetime.now().isoformat()
-                    }
+                context_info["prompt_tokens"] = self.context_builder.tokens.count(prompt)
+                context_info["system_tokens"] = self.context_builder.tokens.count(self.system_prompt)
+
+            return {
+                "type": "ai",
+                "content": "",
+                "is_from_knowledge_base": True,
+                "relevance_score": relevance_score,
+                "search_results": results,
+                "search_info": f"Found {len(results)} relevant results",
+                "metadata": {
+                    "query_expansion": expanded_queries,
+                    "query_analysis": query_analysis,
+                    "context": context_info,
+                    "timestamp": datetime.now().isoformat()
                 }
-            else:
-                # Handle non-relevant queries
-                prompt = self.generate_enhanced_prompt(query, "", False, query_analysis)
-                ai_response = ollama_service.generate_response(prompt)
-                
-                return {
-                    "type": "ai",
-                    "content": ai_response,
-                    "is_from_knowledge_base": False,
-                    "relevance_score": relevance_score,
-                    "search_results": [],
-                    "search_info": "No relevant results found in knowledge base",
-                    "metadata": {
-                        "query_analysis": query_analysis,
-                        "timestamp": datetime.now().isoformat()
-                    }
+            }, prompt
+        else:
+            # Handle non-relevant queries
+            prompt = self.generate_enhanced_prompt(query, "", False, query_analysis)
+            
+            return {
+                "type": "ai",
+                "content": "",
+                "is_from_knowledge_base": False,
+                "relevance_score": relevance_score,
+                "search_results": [],
+                "search_info": "No relevant results found in knowledge base",
+                "metadata": {
+                    "query_analysis": query_analysis,
+                    "context": {"prompt_tokens": self.context_builder.tokens.count(prompt)},
+                    "timestamp": datetime.now().isoformat()
                 }
+            }, prompt
 
-        except Exception as e:
-            logger.error(f"Error processing query: {str(e)}")
-            return {
-                "type": "error",
-                "content": "An error occurred while processing your request. Please try again."
+    def lookup_faq(self, query: str, qdrant_service,
+                   embed: Callable[[str], Optional[List[float]]]) -> Optional[Dict[str, Any]]:
+        """A complete response from the FAQ store if a current answer is close enough to the query"""
+        faq = getattr(qdrant_service, 'faq', None)
+        if not self.faq_enabled or faq is None or not faq.available():
+            return None
+        with span("query.faq"):
+            query_vector = embed(query)
+            entry = faq.lookup(query_vector, self.faq_min_score) if query_vector else None
+        if entry is None:
+            return None
+        return {
+            "type": "ai",
+            "content": entry['answer'],
+            "is_from_knowledge_base": True,
+            "relevance_score": entry['score'],
+            "search_results": entry.get('search_results', []),
+            "search_info": f"Precomputed answer to: {entry['question']}",
+            "metadata": {
+                "type": "faq",
+                "faq_id": entry['id'],
+                "faq_question": entry['question'],
+                "faq_score": round(entry['score'], 3),
+                "generated_at": entry.get('generated_at'),
+                "timestamp": datetime.now().isoformat()
             }
+        }
+
+    def degrade_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill in a retrieval-only answer when the LLM is too busy to generate one"""
+        results = response.get("search_results", [])
+        if results:
+            passages = "\n\n".join(
+                f"- {r['content'][:300]}{'...' if len(r['content']) > 300 else ''}" for r in results[:3]
+            )
+            response["content"] = (
+                "I'm handling a lot of questions right now, so here are the most relevant "
+                f"passages from the knowledge base:\n\n{passages}"
+            )
+        else:
+            response["content"] = "I'm handling a lot of questions right now. Please try again in a moment."
+        response["degraded"] = True
+        return response
 
     def is_query_relevant(self, query: str, keywords: List[str], threshold: float = 0.05) -> Tuple[bool, float]:
         """Check if query is relevant to knowledge base"""
@@ -154,7 +291,8 @@ class QueryProcessor:
                 return False, 0.0
 
             texts = keywords + [query]
-            tfidf_matrix = self.vectorizer.fit_transform(texts)
+            # Fitted per call: a shared vectorizer is refitted concurrently by parallel queries
+            tfidf_matrix = TfidfVectorizer().fit_transform(texts)
             
             query_vec = tfidf_matrix[-1]
             keyword_vecs = tfidf_matrix[:-1]
@@ -289,41 +427,23 @@ class QueryProcessor:
             return 'general'
 
     def generate_enhanced_prompt(self, query: str, context: str, is_relevant: bool, query_analysis: Dict[str, Any]) -> str:
-        """Generate enhanced prompt based on query analysis"""
+        """Generate the variable user message; the fixed instructions live in SYSTEM_PROMPT"""
         try:
+            query_type = query_analysis.get('query_type', 'general')
             if is_relevant:
-                prompt = f"""Based on the following context from the knowledge base, provide a detailed answer to the question.
-If the context doesn't fully address the question, supplement with relevant general knowledge.
+                prompt = f"""Mode: KNOWLEDGE BASE
+Query Type: {query_type}
 
 Context:
 {context}
 
-Question: {query}
-
-Query Type: {query_analysis.get('query_type', 'general')}
-
-Please provide:
-1. A direct answer to the question
-2. Any relevant additional information
-3. Related topics or suggestions
-4. Sources of information when available
-
-Answer:"""
+Question: {query}"""
             else:
-                prompt = f"""You are an AI assistant for SRH Hochschule Heidelberg. The following question was not found in our knowledge base.
-Please provide a general answer while noting that for specific, up-to-date details, the user should consult official sources.
-
-Question: {query}
-
-Query Type: {query_analysis.get('query_type', 'general')}
-
-Please provide:
-1. A general answer based on available information
-2. A note about consulting official sources for specific details
-3. Any relevant suggestions or related topics
+                prompt = f"""Mode: GENERAL
+Query Type: {query_type}
 
-Answer:"""
+Question: {query}"""
             return prompt
         except Exception as e:
             logger.error(f"Error generating prompt: {str(e)}")
-            return f"Question: {query}\n\nPlease provide a helpful response."
\ No newline at end of file
+            return f"Question: {query}\n\nPlease provide a helpful response."
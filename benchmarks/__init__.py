@@ -0,0 +1,9 @@
+import sys
+import os
+
+def path():
+    # Repo root for the ingestion package, app/ for the services (imported the way the app does)
+    parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    for directory in (os.path.join(parent_dir, 'app'), parent_dir):
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
@@ -0,0 +1,211 @@
+"""Offline benchmark of the ingestion pipeline.
+
+Generates synthetic raw page records (as the crawler writes them) and times
+each ingestion stage on its own, reporting docs/sec and memory per stage:
+
+- write_raw: compress and write the raw records (crawler output path)
+- parse: load the records and extract their text
+- nlp: the processor's local analysis (NER, sentiment, summary, keywords), if
+  the NLP dependencies are installed; --nlp-sample limits it to a sample
+- embed: embedding requests to the stub Ollama server, --embed-concurrency at a time
+- serialize: write the processed records as the processors do
+- sparse: fit the sparse encoder and encode the corpus (vector/multiple.py)
+- upsert: upsert to a local Qdrant one point per request, as vector/multiple.py
+  does, and in batches of --upsert-batch for comparison
+
+With --end-to-end the real process_directory of an Ollama processor is run
+over the same records, with the ollama client pointed at the stub server.
+
+    python benchmarks/bench_ingest.py --docs 2000 --words 400 --embed-concurrency 8
+"""
+from __init__ import path
+path()
+
+import os
+import sys
+import json
+import uuid
+import argparse
+import logging
+import tempfile
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+import requests
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from ingestion.sparse import SparseEncoder
+from ingestion.storage import is_record_file, load_record, processed_filename, write_record
+
+from corpus import generate_corpus
+from harness import SPARSE_VECTOR_NAME, create_collection, measure, print_table, write_report
+from stub_ollama import StubOllama
+
+logger = logging.getLogger(__name__)
+
+PROCESSORS = {
+    'ollama_cpu': ('openmodel_embedding', 'ollama_embedding_cpu'),
+    'ollama_gpu': ('openmodel_embedding', 'ollama_embedding_gpu'),
+}
+
+def load_processor_class(name: str):
+    """NLPProcessor of one of the Ollama processors, or None when its dependencies are missing"""
+    package, module_name = PROCESSORS[name]
+    module_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), package)
+    if module_dir not in sys.path:
+        sys.path.append(module_dir)
+    try:
+        return importlib.import_module(module_name).NLPProcessor
+    except ImportError as e:
+        logger.warning(f"Cannot import {module_name}: {str(e)}")
+        return None
+
+def run_stage(results: Dict[str, Any], name: str, count: int, fn):
+    """Time fn() as one stage over count documents"""
+    with measure(results, name):
+        fn()
+    results[name]['docs'] = count
+    results[name]['docs_per_sec'] = round(count / results[name]['seconds'], 1) if results[name]['seconds'] else 0.0
+
+def upsert(client: QdrantClient, records: List[Dict[str, Any]], encoder: SparseEncoder,
+           sparse_vectors: List[Dict[str, list]], batch_size: int, collection_name: str):
+    """Upsert processed records laid out like vector/multiple.py, batch_size points per request"""
+    points = []
+    for record, sparse_vector in zip(records, sparse_vectors):
+        vector = {'': record['embedding']}
+        payload = {key: record[key] for key in ('original_content', 'entities', 'sentiment', 'summary', 'keywords')}
+        if sparse_vector['indices']:
+            vector[SPARSE_VECTOR_NAME] = models.SparseVector(**sparse_vector)
+            payload['sparse_encoder_version'] = encoder.version
+        points.append(models.PointStruct(id=str(uuid.uuid5(uuid.NAMESPACE_URL, record['filename'])),
+                                         vector=vector, payload=payload))
+        if len(points) >= batch_size:
+            client.upsert(collection_name=collection_name, points=points)
+            points = []
+    if points:
+        client.upsert(collection_name=collection_name, points=points)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion stages on synthetic pages")
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--words', type=int, default=400, help="words per synthetic page")
+    parser.add_argument('--embed-latency-ms', type=float, default=20)
+    parser.add_argument('--embed-concurrency', type=int, default=4)
+    parser.add_argument('--upsert-batch', type=int, default=256)
+    parser.add_argument('--processor', choices=sorted(PROCESSORS), default='ollama_cpu',
+                        help="processor whose NLP stage is timed")
+    parser.add_argument('--nlp-sample', type=int, default=50, help="documents for the NLP stage (0 = all)")
+    parser.add_argument('--end-to-end', action='store_true', help="also run the processor's process_directory")
+    parser.add_argument('--workers', type=int, default=2, help="NLP worker processes for --end-to-end")
+    parser.add_argument('--work-dir', help="keep the generated files here instead of a temporary directory")
+    parser.add_argument('--output', help="write the full report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_ingest_')
+    raw_dir = os.path.join(work_dir, 'raw')
+    processed_dir = os.path.join(work_dir, 'processed')
+    os.makedirs(processed_dir, exist_ok=True)
+    stages: Dict[str, Any] = {}
+    documents = generate_corpus(args.docs, words_per_doc=args.words)
+
+    with StubOllama(embed_latency=args.embed_latency_ms / 1000) as stub:
+        def write_raw():
+            for document in documents:
+                write_record(os.path.join(raw_dir, f"page_{document['id']}.json.gz"), {
+                    'url': document['source'],
+                    'title': document['category'],
+                    'cleaned_html': document['content'],
+                    'crawled_at': datetime.now().isoformat()
+                })
+        run_stage(stages, 'write_raw', len(documents), write_raw)
+
+        texts: Dict[str, str] = {}
+        def parse():
+            for filename in sorted(os.listdir(raw_dir)):
+                if is_record_file(filename):
+                    texts[filename] = load_record(os.path.join(raw_dir, filename))['cleaned_html']
+        run_stage(stages, 'parse', len(documents), parse)
+
+        analyses: Dict[str, Dict[str, Any]] = {}
+        processor_class = load_processor_class(args.processor)
+        if processor_class is not None:
+            processor = processor_class()
+            sample = list(texts.items())[:args.nlp_sample or None]
+            def nlp():
+                for filename, text in sample:
+                    analyses[filename] = processor.analyze_text(text)
+            run_stage(stages, 'nlp', len(sample), nlp)
+        else:
+            print("NLP stage skipped: the processor's dependencies are not installed")
+
+        embeddings: Dict[str, List[float]] = {}
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.embed_concurrency))
+        def embed_one(item):
+            response = session.post(f"{stub.url}/embeddings",
+                                    json={"model": "nomic-embed-text", "prompt": item[1]}, timeout=30)
+            response.raise_for_status()
+            return item[0], response.json()['embedding']
+        def embed():
+            with ThreadPoolExecutor(max_workers=args.embed_concurrency) as executor:
+                embeddings.update(executor.map(embed_one, texts.items()))
+        run_stage(stages, 'embed', len(texts), embed)
+
+        # Documents outside the NLP sample get placeholder analysis fields
+        empty_analysis = {'entities': [], 'sentiment': {}, 'summary': '', 'keywords': []}
+        records = [{
+            'filename': filename,
+            'original_content': text[:1000],
+            'embedding': embeddings[filename],
+            **analyses.get(filename, empty_analysis)
+        } for filename, text in texts.items()]
+        def serialize():
+            for record in records:
+                with open(os.path.join(processed_dir, processed_filename(record['filename'])), 'w', encoding='utf-8') as f:
+                    json.dump({k: v for k, v in record.items() if k != 'filename'}, f, ensure_ascii=False, indent=4)
+        run_stage(stages, 'serialize', len(records), serialize)
+
+        sparse_vectors: List[Dict[str, list]] = []
+        encoder = SparseEncoder()
+        def sparse():
+            encoder.fit(r['original_content'] for r in records)
+            sparse_vectors.extend(encoder.encode_batch([r['original_content'] for r in records]))
+        run_stage(stages, 'sparse', len(records), sparse)
+
+        client = QdrantClient(path=os.path.join(work_dir, 'qdrant'))
+        dim = len(records[0]['embedding']) if records else stub.dim
+        for batch_size in sorted({1, args.upsert_batch}):
+            collection_name = f"bench_batch_{batch_size}"
+            create_collection(client, collection_name, dim)
+            run_stage(stages, f"upsert_batch_{batch_size}", len(records),
+                      lambda: upsert(client, records, encoder, sparse_vectors, batch_size, collection_name))
+        client.close()
+
+        if args.end_to_end and processor_class is not None:
+            # The ollama client reads OLLAMA_HOST when it is created
+            os.environ['OLLAMA_HOST'] = stub.url[:-len('/api')]
+            importlib.reload(importlib.import_module('ollama'))
+            end_to_end_dir = os.path.join(work_dir, 'processed_end_to_end')
+            run_stage(stages, 'process_directory', len(documents),
+                      lambda: processor_class().process_directory(raw_dir, end_to_end_dir, workers=args.workers,
+                                                                  embedding_concurrency=args.embed_concurrency))
+
+    print(f"\n{args.docs} documents of {args.words} words, files in {work_dir}")
+    print_table([{'stage': name, **result} for name, result in stages.items()],
+                ['stage', 'docs', 'seconds', 'docs_per_sec', 'rss_delta_mb', 'peak_rss_mb'])
+
+    if args.output:
+        write_report(args.output, {
+            'benchmark': 'ingest',
+            'timestamp': datetime.now().isoformat(),
+            'settings': vars(args),
+            'stages': stages
+        })
+
+if __name__ == "__main__":
+    main()
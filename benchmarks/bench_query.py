@@ -0,0 +1,141 @@
+"""Offline benchmark of the query pipeline.
+
+Runs QueryProcessor.process_query and EnhancedSearchService.search against
+a stub Ollama server and an in-memory (or local on-disk) Qdrant filled with
+synthetic corpora of increasing size, and reports latency percentiles,
+throughput and memory, overall and per traced stage.
+
+    python benchmarks/bench_query.py --sizes 100,1000,10000 --queries 200 --concurrency 4
+"""
+from __init__ import path
+path()
+
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from qdrant_client import QdrantClient
+
+from core.tracing import start_trace
+from services.ollama_service import OllamaService
+from services.qdrant_service import QdrantService
+from services.query_service import QueryProcessor
+from services.enhanced_search_service import EnhancedSearchService
+
+from corpus import generate_corpus, generate_queries
+from harness import index_documents, latency_summary, measure, print_table, stage_summary, write_report
+from stub_ollama import StubOllama, stub_embedding
+
+logger = logging.getLogger(__name__)
+
+def run_queries(call: Callable[[str], Dict[str, Any]], queries: List[str],
+                concurrency: int) -> Tuple[List[float], List[Dict[str, Any]], float]:
+    """Latency and stage timings of every call, and the wall time of the whole run"""
+    def timed(query):
+        start = time.perf_counter()
+        timings = call(query)
+        return time.perf_counter() - start, timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, queries))
+    wall = time.perf_counter() - start
+    return [latency for latency, _ in results], [timings for _, timings in results], wall
+
+def bench_size(size: int, args, stub: StubOllama) -> Dict[str, Any]:
+    """Index a corpus of the given size and run both pipelines over it"""
+    report: Dict[str, Any] = {'size': size, 'memory': {}}
+    documents = generate_corpus(size, words_per_doc=args.words, seed=size)
+    queries = [q['query'] for q in generate_queries(documents, args.queries, seed=size + 1)]
+
+    client = QdrantClient(path=f"{args.qdrant_path}/{size}") if args.qdrant_path else QdrantClient(":memory:")
+    with measure(report['memory'], 'index'):
+        encoder = index_documents(client, documents, lambda text: stub_embedding(text, stub.dim),
+                                  hybrid=not args.no_hybrid)
+
+    qdrant = QdrantService(client=client, sparse_encoder=encoder)
+    ollama = OllamaService(base_url=stub.url)
+    processor = QueryProcessor()
+    search_service = EnhancedSearchService(qdrant, ollama)
+
+    def answer(query):
+        response = processor.process_query(query, qdrant, ollama)
+        return response.get('metadata', {}).get('timings', {})
+
+    def search(query):
+        with start_trace("search") as trace:
+            search_service.search(query)
+        return trace.summary()
+
+    for name, call in (('process_query', answer), ('search', search)):
+        with measure(report['memory'], name):
+            latencies, traces, wall = run_queries(call, queries, args.concurrency)
+        report[name] = {
+            'latency': latency_summary(latencies),
+            'throughput_qps': round(len(queries) / wall, 2),
+            'stages': stage_summary(traces)
+        }
+
+    client.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the query pipeline against local stand-ins")
+    parser.add_argument('--sizes', default='100,1000,5000', help="comma-separated corpus sizes")
+    parser.add_argument('--queries', type=int, default=100, help="queries per corpus size and pipeline")
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--words', type=int, default=150, help="words per synthetic document")
+    parser.add_argument('--embed-latency-ms', type=float, default=10)
+    parser.add_argument('--prefill-latency-ms', type=float, default=100)
+    parser.add_argument('--token-latency-ms', type=float, default=5)
+    parser.add_argument('--tokens', type=int, default=60, help="tokens per stub answer")
+    parser.add_argument('--no-hybrid', action='store_true', help="dense vectors only")
+    parser.add_argument('--qdrant-path', help="use local on-disk Qdrant under this directory instead of memory")
+    parser.add_argument('--output', help="write the full report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    stub = StubOllama(embed_latency=args.embed_latency_ms / 1000, prefill_latency=args.prefill_latency_ms / 1000,
+                      token_latency=args.token_latency_ms / 1000, tokens=args.tokens)
+    reports = []
+    with stub:
+        for size in (int(s) for s in args.sizes.split(',')):
+            print(f"Corpus of {size} documents...")
+            reports.append(bench_size(size, args, stub))
+
+    rows = []
+    for report in reports:
+        for name in ('process_query', 'search'):
+            rows.append({
+                'docs': report['size'],
+                'pipeline': name,
+                **{k: report[name]['latency'][k] for k in ('p50_ms', 'p95_ms', 'p99_ms')},
+                'qps': report[name]['throughput_qps'],
+                'index_s': report['memory']['index']['seconds'],
+                'rss_delta_mb': report['memory'][name]['rss_delta_mb'],
+                'peak_rss_mb': report['memory'][name]['peak_rss_mb']
+            })
+    print()
+    print_table(rows, ['docs', 'pipeline', 'p50_ms', 'p95_ms', 'p99_ms', 'qps', 'index_s', 'rss_delta_mb', 'peak_rss_mb'])
+
+    for report in reports:
+        for name in ('process_query', 'search'):
+            print(f"\nStages, {name}, {report['size']} documents")
+            print_table([{'stage': stage, **summary} for stage, summary in report[name]['stages'].items()],
+                        ['stage', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+
+    if args.output:
+        write_report(args.output, {
+            'benchmark': 'query',
+            'timestamp': datetime.now().isoformat(),
+            'settings': vars(args),
+            'stub_requests': dict(stub.requests),
+            'results': reports
+        })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import random
+from typing import Any, Dict, List
+
+# Topic vocabularies in the domain of the real knowledge base
+TOPICS = {
+    'admissions': ['admission', 'application', 'deadline', 'requirements', 'enrollment', 'documents',
+                   'transcript', 'visa', 'semester', 'intake', 'portal', 'certificate'],
+    'computer_science': ['computer', 'science', 'programming', 'algorithms', 'software', 'data',
+                         'artificial', 'intelligence', 'machine', 'learning', 'systems', 'networks'],
+    'business': ['business', 'management', 'marketing', 'finance', 'economics', 'accounting',
+                 'leadership', 'strategy', 'entrepreneurship', 'international', 'controlling', 'sales'],
+    'campus': ['campus', 'library', 'housing', 'cafeteria', 'sports', 'heidelberg', 'building',
+               'accommodation', 'transport', 'events', 'clubs', 'facilities'],
+    'fees': ['tuition', 'fees', 'scholarship', 'payment', 'funding', 'grant', 'costs', 'loan',
+             'installment', 'discount', 'stipend', 'budget'],
+    'research': ['research', 'faculty', 'professor', 'publication', 'project', 'laboratory',
+                 'thesis', 'doctoral', 'institute', 'cooperation', 'innovation', 'conference'],
+    'programs': ['bachelor', 'master', 'degree', 'course', 'program', 'modules', 'credits', 'ects',
+                 'curriculum', 'internship', 'exam', 'lecture'],
+    'health': ['health', 'therapy', 'psychology', 'nursing', 'medicine', 'rehabilitation',
+               'physiotherapy', 'care', 'clinic', 'wellbeing', 'counselling', 'prevention'],
+}
+
+FILLER = ['the', 'students', 'can', 'find', 'information', 'about', 'this', 'at', 'srh', 'university',
+          'and', 'more', 'details', 'are', 'available', 'for', 'each', 'with', 'our', 'team', 'offers',
+          'support', 'during', 'their', 'studies', 'in', 'a', 'new', 'of', 'to']
+
+_SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'vo', 'zi', 'be', 'do', 'fu', 'ga', 'hi', 'ju', 'pe', 'so']
+
+def _pseudo_word(rng: random.Random) -> str:
+    return ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(3, 4)))
+
+def generate_corpus(size: int, words_per_doc: int = 150, anchors_per_doc: int = 3,
+                    seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic knowledge base pages.
+
+    Each page belongs to a topic and carries a few distinctive 'anchor' words
+    (pseudo course codes, names) so queries can target exactly one page.
+    """
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    documents = []
+    for doc_id in range(size):
+        topic = topics[doc_id % len(topics)]
+        vocabulary = TOPICS[topic]
+        anchors = [_pseudo_word(rng) for _ in range(anchors_per_doc)]
+        words = []
+        while len(words) < words_per_doc:
+            sentence = rng.sample(vocabulary, 4) + rng.sample(FILLER, 5)
+            if rng.random() < 0.3:
+                sentence.append(rng.choice(anchors))
+            rng.shuffle(sentence)
+            words.extend(sentence)
+        # Anchors always appear, near the start as in a page title
+        content = f"{' '.join(anchors)} {topic.replace('_', ' ')}. " + '. '.join(
+            ' '.join(words[i:i + 10]).capitalize() for i in range(0, len(words), 10)
+        ) + '.'
+        documents.append({
+            'id': doc_id,
+            'content': content,
+            'category': topic,
+            'source': f"https://synthetic.example/{topic}/{doc_id}",
+            'keywords': anchors + rng.sample(vocabulary, 4),
+            'anchors': anchors
+        })
+    return documents
+
+def generate_queries(documents: List[Dict[str, Any]], count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Questions about single pages, labeled with the id of the page that answers them"""
+    rng = random.Random(seed)
+    templates = [
+        "what is {anchor} about {topic}",
+        "tell me about {anchor} and {word}",
+        "how does {word} work for {anchor}",
+        "{anchor} {word} {topic} requirements",
+        "where can i find {word} information for {anchor}",
+    ]
+    queries = []
+    for _ in range(count):
+        document = rng.choice(documents)
+        topic_words = TOPICS[document['category']]
+        query = rng.choice(templates).format(
+            anchor=rng.choice(document['anchors']),
+            word=rng.choice(topic_words),
+            topic=rng.choice(topic_words)
+        )
+        queries.append({'query': query, 'relevant': [document['id']], 'category': document['category']})
+    return queries
@@ -0,0 +1,193 @@
+"""Retrieval quality vs speed evaluation.
+
+Runs a grid of retrieval settings (dense or hybrid, limit, score floor,
+HNSW ef, exact search, quantization, fusion weight) through QdrantService
+over a labeled query -> relevant points set, and reports recall@k, MRR and
+latency side by side. The fastest setting that meets --min-recall is
+printed at the end.
+
+By default a synthetic corpus is indexed into an in-memory Qdrant. Local
+mode searches exhaustively, so HNSW ef and quantization only change
+latency against a server (--qdrant-url). To evaluate the real knowledge
+base, pass --dataset with lines like {"query": "...", "relevant": ["<point id>"]}
+together with --qdrant-url and --collection; queries are then embedded
+through Ollama.
+
+    python benchmarks/eval_retrieval.py --docs 5000 --queries 300 --min-recall 0.9
+    python benchmarks/eval_retrieval.py --grid grid.yaml --qdrant-url http://localhost:6333
+"""
+from __init__ import path
+path()
+
+import json
+import time
+import argparse
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from core.config import settings
+from services.ollama_service import OllamaService
+from services.qdrant_service import QdrantService
+
+from corpus import generate_corpus, generate_queries
+from harness import index_documents, latency_summary, print_table, write_report
+from stub_ollama import stub_embedding
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRID = [
+    {'name': 'dense_k5', 'mode': 'dense', 'limit': 5},
+    {'name': 'dense_k10', 'mode': 'dense', 'limit': 10},
+    {'name': 'dense_k5_min0.6', 'mode': 'dense', 'limit': 5, 'min_score': 0.6},
+    {'name': 'dense_k5_ef32', 'mode': 'dense', 'limit': 5, 'hnsw_ef': 32},
+    {'name': 'dense_k5_ef128', 'mode': 'dense', 'limit': 5, 'hnsw_ef': 128},
+    {'name': 'dense_k5_exact', 'mode': 'dense', 'limit': 5, 'exact': True},
+    {'name': 'dense_k5_scalar', 'mode': 'dense', 'limit': 5, 'quantization': 'scalar', 'rescore': True},
+    {'name': 'dense_k5_binary', 'mode': 'dense', 'limit': 5, 'quantization': 'binary', 'rescore': True},
+    {'name': 'hybrid_k5', 'mode': 'hybrid', 'limit': 5},
+    {'name': 'hybrid_k5_alpha0.5', 'mode': 'hybrid', 'limit': 5, 'hybrid_alpha': 0.5},
+]
+
+QUANTIZATION = {
+    None: None,
+    'scalar': models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8,
+                                                                              always_ram=True)),
+    'binary': models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True)),
+}
+
+def search_params(config: Dict[str, Any]) -> Optional[models.SearchParams]:
+    if not any(key in config for key in ('hnsw_ef', 'exact', 'rescore')):
+        return None
+    return models.SearchParams(
+        hnsw_ef=config.get('hnsw_ef'),
+        exact=config.get('exact', False),
+        quantization=models.QuantizationSearchParams(rescore=config['rescore']) if 'rescore' in config else None
+    )
+
+def evaluate(service: QdrantService, config: Dict[str, Any], queries: List[Dict[str, Any]],
+             vectors: List[List[float]], warmup: int = 5) -> Dict[str, Any]:
+    """recall@k, MRR and per-query latency of one configuration"""
+    limit = config.get('limit', 5)
+    min_score = config.get('min_score', 0.0)
+    params = search_params(config)
+    service.hybrid_alpha = config.get('hybrid_alpha', 0.7)
+    service.hybrid_candidates = config.get('hybrid_candidates', 4)
+
+    def run(query, vector):
+        if config.get('mode', 'dense') == 'hybrid':
+            return service.hybrid_search(vector, query['query'], limit=limit, search_params=params)
+        return service.search(vector, limit=limit, search_params=params)
+
+    for query, vector in list(zip(queries, vectors))[:warmup]:
+        run(query, vector)
+
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for query, vector in zip(queries, vectors):
+        start = time.perf_counter()
+        points = run(query, vector)
+        latencies.append(time.perf_counter() - start)
+
+        ranked = [str(point.id) for point in points if point.score >= min_score]
+        relevant = {str(r) for r in query['relevant']}
+        recalls.append(len(relevant & set(ranked)) / len(relevant) if relevant else 0.0)
+        rank = next((i for i, point_id in enumerate(ranked, 1) if point_id in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    latency = latency_summary(latencies)
+    return {
+        'name': config['name'],
+        'k': limit,
+        'recall_at_k': round(sum(recalls) / len(recalls), 4) if recalls else 0.0,
+        'mrr': round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4) if reciprocal_ranks else 0.0,
+        'p50_ms': latency['p50_ms'],
+        'p95_ms': latency['p95_ms'],
+        'qps': round(len(latencies) / sum(latencies), 1) if latencies else 0.0,
+        'config': config
+    }
+
+def load_grid(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return DEFAULT_GRID
+    with open(path) as f:
+        grid = yaml.safe_load(f)
+    return grid.get('configs', grid) if isinstance(grid, dict) else grid
+
+def load_dataset(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare retrieval settings on recall@k, MRR and latency")
+    parser.add_argument('--grid', help="YAML/JSON list of configurations (default: built-in grid)")
+    parser.add_argument('--docs', type=int, default=2000, help="synthetic corpus size")
+    parser.add_argument('--queries', type=int, default=200, help="synthetic queries")
+    parser.add_argument('--dataset', help="labeled JSONL queries against an existing collection")
+    parser.add_argument('--collection', default='knowledge_base', help="existing collection for --dataset")
+    parser.add_argument('--qdrant-url', help="Qdrant server (default: in-memory local mode)")
+    parser.add_argument('--min-recall', type=float, default=0.9, help="quality floor for picking a configuration")
+    parser.add_argument('--output', help="write the full report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    grid = load_grid(args.grid)
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:")
+
+    services: Dict[Any, QdrantService] = {}
+    if args.dataset:
+        if not args.qdrant_url:
+            parser.error("--dataset evaluates an existing collection and needs --qdrant-url")
+        queries = load_dataset(args.dataset)
+        ollama = OllamaService(base_url=settings.OLLAMA_API_URL)
+        embed: Callable[[str], List[float]] = ollama.get_embedding
+        service = QdrantService(client=client)
+        service.collection_name = args.collection
+        # Quantization is a property of the collection, only the existing one can be evaluated
+        for quantization in {c.get('quantization') for c in grid}:
+            services[quantization] = service
+    else:
+        documents = generate_corpus(args.docs)
+        queries = generate_queries(documents, args.queries)
+        embed = stub_embedding
+        for quantization in sorted({c.get('quantization') for c in grid}, key=str):
+            collection_name = f"eval_{quantization or 'plain'}"
+            print(f"Indexing {len(documents)} documents into {collection_name}...")
+            encoder = index_documents(client, documents, embed, collection_name=collection_name,
+                                      quantization_config=QUANTIZATION[quantization])
+            service = QdrantService(client=client, sparse_encoder=encoder)
+            service.collection_name = collection_name
+            services[quantization] = service
+
+    vectors = [embed(query['query']) for query in queries]
+    results = []
+    for config in grid:
+        print(f"Evaluating {config['name']}...")
+        results.append(evaluate(services[config.get('quantization')], config, queries, vectors))
+
+    print()
+    print_table(results, ['name', 'k', 'recall_at_k', 'mrr', 'p50_ms', 'p95_ms', 'qps'])
+    eligible = [r for r in results if r['recall_at_k'] >= args.min_recall]
+    best = min(eligible, key=lambda r: r['p95_ms']) if eligible else None
+    if best:
+        print(f"\nFastest configuration with recall@k >= {args.min_recall}: {best['name']} ({best['p95_ms']} ms p95)")
+    else:
+        print(f"\nNo configuration reaches recall@k >= {args.min_recall}")
+    if not args.qdrant_url:
+        print("Local mode searches exhaustively; HNSW ef and quantization only affect latency on a Qdrant server.")
+
+    if args.output:
+        write_report(args.output, {
+            'benchmark': 'retrieval',
+            'timestamp': datetime.now().isoformat(),
+            'settings': vars(args),
+            'queries': len(queries),
+            'results': results,
+            'best': best['name'] if best else None
+        })
+
+if __name__ == "__main__":
+    main()
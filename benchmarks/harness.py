@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from ingestion.sparse import SparseEncoder
+
+logger = logging.getLogger(__name__)
+
+SPARSE_VECTOR_NAME = "text-sparse"
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of a list of durations, in milliseconds"""
+    if not seconds:
+        return {'count': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'mean_ms': 0.0, 'max_ms': 0.0}
+    values = np.asarray(seconds) * 1000
+    return {
+        'count': len(values),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'mean_ms': round(float(values.mean()), 2),
+        'max_ms': round(float(values.max()), 2)
+    }
+
+def stage_summary(traces: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-stage latency percentiles from Trace.summary() results"""
+    per_stage: Dict[str, List[float]] = {}
+    for trace in traces:
+        for stage, timing in trace.get('stages', {}).items():
+            per_stage.setdefault(stage, []).append(timing['ms'] / 1000)
+    return {stage: latency_summary(values) for stage, values in sorted(per_stage.items())}
+
+def rss_mb() -> float:
+    """Current resident memory of this process (peak RSS when psutil is missing)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+@contextmanager
+def measure(results: Dict[str, Any], name: str):
+    """Record wall time and resident memory growth of a block under results[name]"""
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    yield
+    results[name] = {
+        'seconds': round(time.perf_counter() - start, 3),
+        'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+def create_collection(client: QdrantClient, collection_name: str, dim: int, hybrid: bool = True,
+                      hnsw_config: Optional[models.HnswConfigDiff] = None,
+                      quantization_config: Optional[Any] = None):
+    """(Re)create a collection laid out like the one vector/multiple.py builds"""
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams()} if hybrid else None,
+        hnsw_config=hnsw_config,
+        quantization_config=quantization_config
+    )
+
+def index_documents(client: QdrantClient, documents: List[Dict[str, Any]],
+                    embed: Callable[[str], List[float]], collection_name: str = "knowledge_base",
+                    hybrid: bool = True, batch_size: int = 256, **collection_options) -> Optional[SparseEncoder]:
+    """Embed and upsert synthetic documents; returns the fitted sparse encoder (None without hybrid)"""
+    dim = len(embed("dimension probe"))
+    create_collection(client, collection_name, dim, hybrid=hybrid, **collection_options)
+    encoder = SparseEncoder().fit(d['content'] for d in documents) if hybrid else None
+
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        sparse_vectors = encoder.encode_batch([d['content'] for d in batch]) if encoder else [None] * len(batch)
+        points = []
+        for document, sparse_vector in zip(batch, sparse_vectors):
+            vector = {'': embed(document['content'])}
+            payload = {
+                'original_content': document['content'],
+                'keywords': document['keywords'],
+                'category': document['category'],
+                'source': document['source'],
+                'metadata': {'doc_id': document['id']},
+                'timestamp': datetime.now().isoformat()
+            }
+            if sparse_vector and sparse_vector['indices']:
+                vector[SPARSE_VECTOR_NAME] = models.SparseVector(**sparse_vector)
+                payload['sparse_encoder_version'] = encoder.version
+            points.append(models.PointStruct(id=document['id'], vector=vector, payload=payload))
+        client.upsert(collection_name=collection_name, points=points)
+    return encoder
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]):
+    """Plain-text table of the given columns"""
+    widths = {c: max([len(c)] + [len(_format(r.get(c))) for r in rows]) for c in columns}
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    print('  '.join('-' * widths[c] for c in columns))
+    for row in rows:
+        print('  '.join(_format(row.get(c)).ljust(widths[c]) for c in columns))
+
+def _format(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return '' if value is None else str(value)
+
+def write_report(path: str, report: Dict[str, Any]):
+    """Write a benchmark report as JSON"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(f"Report written to {path}")
@@ -0,0 +1,205 @@
+"""Load test for concurrent chat sessions.
+
+Simulates N concurrent sessions that each ask a question, wait for the
+answer, think, and ask again, for a fixed duration. Questions follow a
+Zipf popularity distribution over a pool, and some are paraphrased: either
+trivially (case, punctuation, spacing, which normalise to the same cache
+key) or by rewording (which does not). Every request goes through the same
+path as the chat interface: CacheManager.get_or_compute around
+QueryProcessor.process_query, with generation bounded by the scheduler.
+
+Ollama is the stub server with configurable latency and Qdrant runs in
+memory. The session count is stepped up to find the saturation point:
+where throughput stops growing, answers start being shed, or p95 exceeds
+--slo-ms.
+
+    python benchmarks/load_test.py --sessions 1,2,4,8,16,32 --duration 30
+"""
+from __init__ import path
+path()
+
+import time
+import random
+import argparse
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from core.cache import CacheManager
+from core.config import settings
+from services.generation_scheduler import GenerationScheduler
+from services.ollama_service import OllamaService
+from services.qdrant_service import QdrantService
+from services.query_service import QueryProcessor
+
+from corpus import generate_corpus, generate_queries
+from harness import index_documents, latency_summary, print_table, write_report
+from stub_ollama import StubOllama, stub_embedding
+
+logger = logging.getLogger(__name__)
+
+REWORDINGS = [("what is", "tell me about"), ("tell me about", "explain"), ("where can i find", "how do i get"),
+              ("how does", "in what way does")]
+
+class QueryMix:
+    """Zipf-distributed questions with trivial and real paraphrases"""
+
+    def __init__(self, pool: List[str], zipf_s: float, trivial_rate: float, reword_rate: float, seed: int):
+        self.pool = pool
+        ranks = np.arange(1, len(pool) + 1)
+        weights = 1 / ranks ** zipf_s
+        self.cumulative = np.cumsum(weights / weights.sum())
+        self.trivial_rate = trivial_rate
+        self.reword_rate = reword_rate
+        self.seed = seed
+
+    def session_rng(self, session: int) -> random.Random:
+        return random.Random(self.seed * 1000 + session)
+
+    def next(self, rng: random.Random) -> str:
+        query = self.pool[min(int(np.searchsorted(self.cumulative, rng.random())), len(self.pool) - 1)]
+        draw = rng.random()
+        if draw < self.trivial_rate:
+            variants = [query.capitalize() + "?", query.upper(), f"  {query}  ", query.replace(" ", ", ", 1)]
+            return rng.choice(variants)
+        if draw < self.trivial_rate + self.reword_rate:
+            for old, new in REWORDINGS:
+                if old in query:
+                    return query.replace(old, new, 1)
+            return f"please {query}"
+        return query
+
+def run_level(sessions: int, args, mix: QueryMix, qdrant: QdrantService, stub: StubOllama) -> Dict[str, Any]:
+    """Run the given number of sessions for args.duration seconds against a cold cache"""
+    scheduler = GenerationScheduler(
+        max_concurrency=int(settings.OLLAMA_MAX_CONCURRENCY),
+        max_queue=int(settings.OLLAMA_MAX_QUEUE),
+        max_background_queue=int(settings.OLLAMA_MAX_BACKGROUND_QUEUE),
+        queue_timeout=float(settings.OLLAMA_QUEUE_TIMEOUT)
+    )
+    ollama = OllamaService(base_url=stub.url, scheduler=scheduler)
+    processor = QueryProcessor()
+    cache_manager = CacheManager()
+
+    lock = threading.Lock()
+    latencies: List[float] = []
+    sources: Counter = Counter()
+    outcomes: Counter = Counter()
+    deadline = time.perf_counter() + args.duration
+
+    def session(index: int):
+        rng = mix.session_rng(index)
+        while time.perf_counter() < deadline:
+            query = mix.next(rng)
+            start = time.perf_counter()
+            response, source = cache_manager.get_or_compute(
+                query, lambda: processor.process_query(query, qdrant, ollama)
+            )
+            elapsed = time.perf_counter() - start
+            outcome = 'error' if response.get('type') == 'error' else 'degraded' if response.get('degraded') else 'ok'
+            with lock:
+                latencies.append(elapsed)
+                sources[source] += 1
+                outcomes[outcome] += 1
+            time.sleep(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    total = sum(sources.values()) or 1
+    latency = latency_summary(latencies)
+    generation = scheduler.get_stats()
+    return {
+        'sessions': sessions,
+        'requests': len(latencies),
+        'qps': round(len(latencies) / wall, 2),
+        'p50_ms': latency['p50_ms'],
+        'p95_ms': latency['p95_ms'],
+        'p99_ms': latency['p99_ms'],
+        'cache_pct': round(100 * sources['cache'] / total, 1),
+        'coalesced_pct': round(100 * sources['coalesced'] / total, 1),
+        'computed_pct': round(100 * sources['computed'] / total, 1),
+        'degraded': outcomes['degraded'],
+        'errors': outcomes['error'],
+        'avg_queue_wait_ms': round(generation['avg_wait'] * 1000, 1),
+        'shed': generation['rejected'] + generation['timed_out']
+    }
+
+def find_saturation(levels: List[Dict[str, Any]], slo_ms: float) -> Dict[str, Any]:
+    """First level where throughput stops growing, answers are shed, or p95 breaks the SLO"""
+    for previous, level in zip([None] + levels[:-1], levels):
+        if level['degraded'] or level['errors']:
+            return {'sessions': level['sessions'], 'reason': 'answers shed or failed'}
+        if level['p95_ms'] > slo_ms:
+            return {'sessions': level['sessions'], 'reason': f"p95 above {slo_ms:.0f} ms"}
+        if previous and level['qps'] < previous['qps'] * 1.1:
+            return {'sessions': level['sessions'], 'reason': 'throughput stopped growing'}
+    return {}
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the query backend with concurrent chat sessions")
+    parser.add_argument('--sessions', default='1,2,4,8,16', help="comma-separated session counts to step through")
+    parser.add_argument('--duration', type=float, default=20, help="seconds per session count")
+    parser.add_argument('--think-time', type=float, default=1.0, help="mean seconds between a session's questions")
+    parser.add_argument('--docs', type=int, default=1000, help="synthetic knowledge base size")
+    parser.add_argument('--distinct-queries', type=int, default=300, help="size of the question pool")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of question popularity")
+    parser.add_argument('--trivial-paraphrase-rate', type=float, default=0.2)
+    parser.add_argument('--reword-rate', type=float, default=0.1)
+    parser.add_argument('--embed-latency-ms', type=float, default=15)
+    parser.add_argument('--prefill-latency-ms', type=float, default=300)
+    parser.add_argument('--token-latency-ms', type=float, default=25)
+    parser.add_argument('--tokens', type=int, default=120, help="tokens per stub answer")
+    parser.add_argument('--slo-ms', type=float, default=10000, help="p95 latency objective")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="write the full report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    documents = generate_corpus(args.docs)
+    pool = list(dict.fromkeys(q['query'] for q in generate_queries(documents, args.distinct_queries * 2, seed=args.seed)))
+    mix = QueryMix(pool[:args.distinct_queries], args.zipf, args.trivial_paraphrase_rate, args.reword_rate, args.seed)
+
+    client = QdrantClient(":memory:")
+    encoder = index_documents(client, documents, stub_embedding)
+    qdrant = QdrantService(client=client, sparse_encoder=encoder)
+
+    levels = []
+    with StubOllama(embed_latency=args.embed_latency_ms / 1000, prefill_latency=args.prefill_latency_ms / 1000,
+                    token_latency=args.token_latency_ms / 1000, tokens=args.tokens) as stub:
+        for sessions in (int(s) for s in args.sessions.split(',')):
+            print(f"{sessions} sessions for {args.duration:.0f}s...")
+            levels.append(run_level(sessions, args, mix, qdrant, stub))
+
+    print(f"\nOLLAMA_MAX_CONCURRENCY={settings.OLLAMA_MAX_CONCURRENCY}, "
+          f"{len(mix.pool)} distinct questions, Zipf s={args.zipf}, think time {args.think_time}s")
+    print_table(levels, ['sessions', 'requests', 'qps', 'p50_ms', 'p95_ms', 'p99_ms', 'cache_pct',
+                         'coalesced_pct', 'computed_pct', 'avg_queue_wait_ms', 'degraded', 'errors'])
+    saturation = find_saturation(levels, args.slo_ms)
+    if saturation:
+        print(f"\nSaturation at {saturation['sessions']} sessions: {saturation['reason']}")
+    else:
+        print("\nNo saturation within the tested session counts")
+
+    if args.output:
+        write_report(args.output, {
+            'benchmark': 'load',
+            'timestamp': datetime.now().isoformat(),
+            'settings': vars(args),
+            'levels': levels,
+            'saturation': saturation
+        })
+
+if __name__ == "__main__":
+    main()
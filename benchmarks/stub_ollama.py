@@ -0,0 +1,172 @@
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 256
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def _hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def stub_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Deterministic embedding: signed feature hashing of the words, L2-normalised.
+
+    Texts sharing words get similar vectors, so retrieval over a synthetic
+    corpus behaves like retrieval rather than like noise.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, count in Counter(_TOKEN_PATTERN.findall(text.lower())).items():
+        h = _hash(token)
+        vector[h % dim] += (1.0 if (h >> 32) & 1 else -1.0) * (1 + np.log(count))
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+class StubOllama:
+    """Local stand-in for the Ollama HTTP API with deterministic output and configurable latency.
+
+    Serves /api/embeddings, /api/chat (streaming or not), /api/tags and
+    /api/ps. Latencies are in seconds: embed_latency per embedding,
+    prefill_latency before the first token and token_latency per token.
+    """
+
+    def __init__(self, embed_latency: float = 0.01, prefill_latency: float = 0.1,
+                 token_latency: float = 0.02, tokens: int = 60, dim: int = EMBEDDING_DIM,
+                 models: tuple = ("nomic-embed-text:latest", "llama3.2:latest")):
+        self.embed_latency = embed_latency
+        self.prefill_latency = prefill_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.dim = dim
+        self.models = list(models)
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass to OllamaService"""
+        return f"http://127.0.0.1:{self._server.server_port}/api"
+
+    def start(self) -> 'StubOllama':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; Nagle would add ~40ms per keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, payload, content_type="application/json"):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stub._count(self.path)
+                if self.path.endswith("/tags") or self.path.endswith("/ps"):
+                    self._send({"models": [{"name": name} for name in stub.models]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                stub._count(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/embeddings"):
+                    time.sleep(stub.embed_latency)
+                    self._send({"embedding": stub_embedding(body.get("prompt", ""), stub.dim)})
+                elif self.path.endswith("/chat"):
+                    self._chat(body)
+                else:
+                    self.send_error(404)
+
+            def _chat(self, body):
+                messages = body.get("messages", [])
+                prompt = messages[-1]["content"] if messages else ""
+                limit = body.get("options", {}).get("num_predict") or stub.tokens
+                words = stub.answer_words(prompt, min(limit, stub.tokens))
+                started = time.perf_counter()
+                time.sleep(stub.prefill_latency)
+                prefilled = time.perf_counter()
+
+                if not body.get("stream"):
+                    time.sleep(stub.token_latency * len(words))
+                    self._send({"message": {"role": "assistant", "content": " ".join(words)},
+                                **stub.final_stats(prompt, len(words), started, prefilled)})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, word in enumerate(words):
+                    time.sleep(stub.token_latency)
+                    self._chunk({"message": {"role": "assistant", "content": (" " if i else "") + word},
+                                 "done": False})
+                self._chunk({"message": {"role": "assistant", "content": ""},
+                             **stub.final_stats(prompt, len(words), started, prefilled)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, payload):
+                data = json.dumps(payload).encode('utf-8') + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Stub Ollama listening on {self.url}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'StubOllama':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, path: str):
+        with self._lock:
+            self.requests[path] += 1
+
+    def answer_words(self, prompt: str, count: int) -> List[str]:
+        """Deterministic answer drawn from the prompt's own words"""
+        words = _TOKEN_PATTERN.findall(prompt) or ["answer"]
+        seed = _hash(prompt)
+        return [words[(seed + i * 7919) % len(words)] for i in range(count)]
+
+    def final_stats(self, prompt: str, eval_count: int, started: float, prefilled: float) -> dict:
+        """The timing fields Ollama reports with its final message, in nanoseconds"""
+        now = time.perf_counter()
+        return {
+            "done": True,
+            "load_duration": 0,
+            "prompt_eval_count": len(_TOKEN_PATTERN.findall(prompt)),
+            "prompt_eval_duration": int((prefilled - started) * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int((now - prefilled) * 1e9),
+            "total_duration": int((now - started) * 1e9)
+        }
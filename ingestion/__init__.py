@@ -0,0 +1,9 @@
+from .topics import CorpusTopicModel, write_topic_fields
+from .sparse import SparseEncoder, DEFAULT_ENCODER_PATH
+from .executor import PipelineExecutor
+from .checkpoint import CheckpointJournal, file_fingerprint, content_fingerprint
+from .storage import is_record_file, processed_filename, load_record, write_record
+
+__all__ = ['CorpusTopicModel', 'write_topic_fields', 'SparseEncoder', 'DEFAULT_ENCODER_PATH',
+           'PipelineExecutor', 'CheckpointJournal', 'file_fingerprint', 'content_fingerprint',
+           'is_record_file', 'processed_filename', 'load_record', 'write_record']
@@ -0,0 +1,84 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def file_fingerprint(path: str) -> str:
+    """Cheap change marker for an input file (size and mtime)"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def content_fingerprint(data: Any) -> str:
+    """Stable hash of JSON-serialisable data"""
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+class CheckpointJournal:
+    """Append-only journal of completed items per stage.
+
+    Every completion is written as one JSON line and fsynced, so a run that
+    is killed midway can be restarted and skip whatever already finished.
+    An item is only considered done if its fingerprint still matches, so
+    changed inputs are processed again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: Dict[Tuple[str, str], Optional[str]] = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # Terminate a torn last line so the next entry starts cleanly
+            self._file.write('\n')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                    self.completed[(entry['stage'], entry['id'])] = entry.get('fingerprint')
+                except (json.JSONDecodeError, KeyError):
+                    # A crash can leave a partially written last line
+                    logger.warning(f"Ignoring malformed line {line_number} in {self.path}")
+        logger.info(f"Loaded {len(self.completed)} completed items from {self.path}")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def is_done(self, stage: str, item_id: str, fingerprint: Optional[str] = None) -> bool:
+        key = (stage, str(item_id))
+        return key in self.completed and self.completed[key] == fingerprint
+
+    def mark_done(self, stage: str, item_id: str, fingerprint: Optional[str] = None):
+        entry = {
+            'stage': stage,
+            'id': str(item_id),
+            'fingerprint': fingerprint,
+            'timestamp': datetime.now().isoformat()
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.completed[(stage, str(item_id))] = fingerprint
+
+    def count(self, stage: str) -> int:
+        return sum(1 for s, _ in self.completed if s == stage)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,105 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Worker object built once per pool process by _init_worker
+_worker = None
+
+def _init_worker(factory: Callable[[], Any]):
+    global _worker
+    _worker = factory()
+
+def _call_worker(method: str, payload: Any) -> Any:
+    return getattr(_worker, method)(payload)
+
+class PipelineExecutor:
+    """Overlaps the CPU-bound and I/O-bound stages of a per-item pipeline.
+
+    The CPU stage is a method of a worker object that each pool process
+    builds once with worker_factory, so heavy models are loaded per
+    process rather than per item. The I/O stage (e.g. Ollama calls) runs
+    on a bounded thread pool at the same time. At most max_pending items
+    are in flight, which keeps input reading from running ahead of the
+    workers.
+
+    With process_workers=0 the CPU stage runs on a single thread of this
+    process using local_worker, for models that must not be duplicated
+    (e.g. on a GPU).
+    """
+
+    def __init__(self, worker_factory: Callable[[], Any], process_workers: Optional[int] = None,
+                 thread_workers: int = 4, max_pending: Optional[int] = None,
+                 local_worker: Any = None):
+        self.worker_factory = worker_factory
+        self.process_workers = (os.cpu_count() or 1) if process_workers is None else process_workers
+        self.thread_workers = thread_workers
+        self.max_pending = max_pending or 2 * max(self.process_workers, 1) + thread_workers
+        self.local_worker = local_worker
+
+    def _cpu_pool(self):
+        if self.process_workers == 0:
+            return ThreadPoolExecutor(max_workers=1)
+        # spawn avoids forking a parent that already holds torch/OpenMP threads
+        return ProcessPoolExecutor(
+            max_workers=self.process_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.worker_factory,)
+        )
+
+    def run(self, items: Iterable[Tuple[str, Any]], cpu_method: str,
+            io_task: Optional[Callable[[Any], Any]] = None,
+            on_result: Optional[Callable[[str, Any, Any], None]] = None,
+            on_error: Optional[Callable[[str, Exception], None]] = None) -> int:
+        """Run (key, payload) items through both stages, returning the number completed.
+
+        on_result(key, cpu_result, io_result) and on_error(key, error) are
+        called on the calling thread as items finish, in completion order.
+        """
+        if self.process_workers == 0 and self.local_worker is None:
+            self.local_worker = self.worker_factory()
+
+        pending: Dict[str, list] = {}
+        completed = 0
+
+        def drain(block: bool):
+            nonlocal completed
+            futures = [f for stage in pending.values() for f in stage if f is not None]
+            if block and futures:
+                wait(futures, return_when=FIRST_COMPLETED)
+            for key in [k for k, stage in pending.items() if all(f is None or f.done() for f in stage)]:
+                cpu_future, io_future = pending.pop(key)
+                try:
+                    cpu_result = cpu_future.result()
+                    io_result = io_future.result() if io_future is not None else None
+                except Exception as e:
+                    if on_error:
+                        on_error(key, e)
+                    else:
+                        logger.error(f"Error processing {key}: {str(e)}")
+                    continue
+                if on_result:
+                    on_result(key, cpu_result, io_result)
+                completed += 1
+
+        with self._cpu_pool() as cpu_pool, ThreadPoolExecutor(max_workers=self.thread_workers) as io_pool:
+            for key, payload in items:
+                if self.process_workers == 0:
+                    cpu_future = cpu_pool.submit(getattr(self.local_worker, cpu_method), payload)
+                else:
+                    cpu_future = cpu_pool.submit(_call_worker, cpu_method, payload)
+                io_future = io_pool.submit(io_task, payload) if io_task else None
+                pending[key] = [cpu_future, io_future]
+
+                drain(block=False)
+                while len(pending) >= self.max_pending:
+                    drain(block=True)
+
+            while pending:
+                drain(block=True)
+
+        return completed
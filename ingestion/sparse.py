@@ -0,0 +1,113 @@
+import os
+import pickle
+import uuid
+import logging
+from typing import List, Dict, Iterable, Optional
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODER_PATH = os.path.join('data', 'models', 'sparse_encoder.pkl')
+
+class SparseEncoder:
+    """TF-IDF encoder fitted once over the corpus.
+
+    Vocabulary mode fits a TfidfVectorizer over all texts. Hashing mode
+    streams texts through a stateless HashingVectorizer and only keeps
+    document frequencies, so the corpus never has to fit in memory.
+    """
+
+    def __init__(self, max_features: Optional[int] = 50000, use_hashing: bool = False,
+                 n_features: int = 2 ** 20, batch_size: int = 256):
+        self.max_features = max_features
+        self.use_hashing = use_hashing
+        self.n_features = n_features
+        self.batch_size = batch_size
+        self.vectorizer = None
+        self.idf = None
+        self.n_documents = 0
+        # Changes on every fit; stored with indexed points to detect stale vectors
+        self.version = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.vectorizer is not None
+
+    def fit(self, texts: Iterable[str]) -> 'SparseEncoder':
+        """Fit vocabulary and IDF weights in a single pass over the corpus"""
+        if self.use_hashing:
+            self.vectorizer = HashingVectorizer(n_features=self.n_features, stop_words='english',
+                                                alternate_sign=False, norm=None)
+            document_frequency = np.zeros(self.n_features, dtype=np.int64)
+            self.n_documents = 0
+            for batch in self._batches(texts):
+                counts = self.vectorizer.transform(batch)
+                document_frequency += np.bincount(counts.indices, minlength=self.n_features)
+                self.n_documents += counts.shape[0]
+            # Smoothed IDF, matching TfidfTransformer(smooth_idf=True)
+            self.idf = np.log((1 + self.n_documents) / (1 + document_frequency)) + 1
+        else:
+            texts = list(texts)
+            self.vectorizer = TfidfVectorizer(max_features=self.max_features, stop_words='english',
+                                              sublinear_tf=True)
+            self.vectorizer.fit(texts)
+            self.n_documents = len(texts)
+
+        self.version = uuid.uuid4().hex[:12]
+        logger.info(f"Fitted sparse encoder over {self.n_documents} documents")
+        return self
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        """L2-normalised sparse TF-IDF rows for the given texts"""
+        if not self.is_fitted:
+            raise RuntimeError("Sparse encoder has not been fitted")
+        if self.use_hashing:
+            counts = self.vectorizer.transform(texts)
+            counts.data = 1 + np.log(counts.data)
+            return normalize(counts @ sparse.diags(self.idf), norm='l2', copy=False).tocsr()
+        return self.vectorizer.transform(texts).tocsr()
+
+    def encode_batch(self, texts: List[str]) -> List[Dict[str, list]]:
+        """Compact {'indices', 'values'} form of each row"""
+        matrix = self.transform(texts)
+        matrix.sort_indices()
+        encoded = []
+        for row in range(matrix.shape[0]):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            encoded.append({
+                'indices': matrix.indices[start:end].tolist(),
+                'values': [round(float(v), 6) for v in matrix.data[start:end]]
+            })
+        return encoded
+
+    def encode(self, text: str) -> Dict[str, list]:
+        return self.encode_batch([text])[0]
+
+    def save(self, path: str = DEFAULT_ENCODER_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved sparse encoder to {path}")
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_ENCODER_PATH) -> 'SparseEncoder':
+        with open(path, 'rb') as f:
+            encoder = pickle.load(f)
+        if not isinstance(encoder, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}")
+        return encoder
+
+    def _batches(self, texts: Iterable[str]):
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,39 @@
+import os
+import gzip
+import json
+from typing import Any
+
+# Raw page records, compressed (crawler) or plain (LLM extraction)
+RECORD_SUFFIXES = ('.json.gz', '.json')
+INDEX_FILENAME = 'index.jsonl'
+
+def is_record_file(filename: str) -> bool:
+    """True for raw page records; skips hidden state files such as the crawl state"""
+    return not filename.startswith('.') and filename.endswith(RECORD_SUFFIXES)
+
+def record_stem(filename: str) -> str:
+    for suffix in RECORD_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def processed_filename(filename: str) -> str:
+    """Name of the processed output for a raw record; outputs are always plain JSON"""
+    return f"processed_{record_stem(filename)}.json"
+
+def load_record(path: str) -> Any:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_record(path: str, data: Any):
+    """Atomically write a record, gzip-compressed if path ends with .gz"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if path.endswith('.gz'):
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'), default=str)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4, default=str)
+    os.replace(tmp_path, path)
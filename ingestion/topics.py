@@ -0,0 +1,111 @@
+import json
+import logging
+from typing import List, Dict, Any, Optional, Sequence
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.decomposition import LatentDirichletAllocation, MiniBatchNMF
+
+logger = logging.getLogger(__name__)
+
+class CorpusTopicModel:
+    """Topic model fitted once over every chunk in the corpus.
+
+    The document-term matrix stays sparse and the model is trained with
+    partial_fit over mini-batches, so the fit cost is paid once per run
+    instead of once per file.
+    """
+
+    def __init__(self, num_topics: int = 10, num_words: int = 10, method: str = 'lda',
+                 max_features: int = 5000, batch_size: int = 128, passes: int = 5,
+                 min_weight: float = 0.1):
+        if method not in ('lda', 'nmf'):
+            raise ValueError(f"Unsupported topic modeling method: {method}")
+        self.num_topics = num_topics
+        self.num_words = num_words
+        self.method = method
+        self.max_features = max_features
+        self.batch_size = batch_size
+        self.passes = passes
+        self.min_weight = min_weight
+        self.vectorizer = None
+        self.model = None
+        self.labels: List[str] = []
+
+    def fit(self, texts: Sequence[str]) -> 'CorpusTopicModel':
+        """Fit vocabulary and topics over the whole corpus"""
+        if self.method == 'nmf':
+            self.vectorizer = TfidfVectorizer(max_df=0.95, min_df=1, stop_words='english',
+                                              max_features=self.max_features)
+        else:
+            self.vectorizer = CountVectorizer(max_df=0.95, min_df=1, stop_words='english',
+                                              max_features=self.max_features)
+        doc_term_matrix = self.vectorizer.fit_transform(texts)
+
+        n_docs, n_features = doc_term_matrix.shape
+        num_topics = max(1, min(self.num_topics, n_docs, n_features))
+        if self.method == 'nmf':
+            self.model = MiniBatchNMF(n_components=num_topics, batch_size=self.batch_size,
+                                      random_state=42)
+        else:
+            # total_samples scales the online updates to the corpus; its default assumes 1e6 documents
+            self.model = LatentDirichletAllocation(n_components=num_topics, learning_method='online',
+                                                   batch_size=self.batch_size, total_samples=n_docs,
+                                                   random_state=42)
+
+        for _ in range(self.passes):
+            for start in range(0, n_docs, self.batch_size):
+                self.model.partial_fit(doc_term_matrix[start:start + self.batch_size])
+
+        words = self.vectorizer.get_feature_names_out()
+        self.labels = []
+        for topic_idx, topic in enumerate(self.model.components_):
+            top_words = [words[i] for i in topic.argsort()[:-self.num_words - 1:-1]]
+            self.labels.append(f"Topic {topic_idx + 1}: {', '.join(top_words)}")
+
+        logger.info(f"Fitted {num_topics} {self.method.upper()} topics over {n_docs} chunks")
+        return self
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """Topic distribution for each text, rows summing to 1"""
+        if self.model is None:
+            raise RuntimeError("Topic model has not been fitted")
+        weights = self.model.transform(self.vectorizer.transform(texts))
+        totals = weights.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        return weights / totals
+
+    def payload_fields(self, distribution: np.ndarray) -> Dict[str, Any]:
+        """Payload fields describing one chunk's topic distribution"""
+        ranked = [int(i) for i in distribution.argsort()[::-1]]
+        dominant = ranked[0]
+        topics = [self.labels[i] for i in ranked if distribution[i] >= self.min_weight]
+        return {
+            'topics': topics or [self.labels[dominant]],
+            'dominant_topic': dominant,
+            'topic_distribution': [round(float(w), 4) for w in distribution]
+        }
+
+    def fit_assign(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """Fit over the corpus and return payload fields for every text"""
+        if len(texts) < 2:
+            return [{'topics': ["Not enough documents for topic modeling"]} for _ in texts]
+        try:
+            self.fit(texts)
+        except ValueError as e:
+            logger.warning(f"Topic modeling skipped: {str(e)}")
+            return [{'topics': ["Unable to perform topic modeling due to document similarity"]}
+                    for _ in texts]
+        return [self.payload_fields(row) for row in self.transform(texts)]
+
+def write_topic_fields(output_path: str, fields: Dict[str, Any], key: Optional[str] = None):
+    """Merge topic fields into a processed JSON file, under key if given"""
+    with open(output_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    target = data.get(key, {}) if key else data
+    target.update(fields)
+    if key:
+        data[key] = target
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
@@ -3,8 +3,6 @@ import os
 import numpy as np
 from typing import List, Dict, Any
 import spacy
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
 from textblob import TextBlob
 from transformers import pipeline
 import warnings
@@ -12,6 +10,11 @@ import warnings
 from __init__ import path
 path()
 
+from ingestion.topics import CorpusTopicModel, write_topic_fields
+from ingestion.executor import PipelineExecutor
+from ingestion.checkpoint import CheckpointJournal, file_fingerprint
+from ingestion.storage import is_record_file, processed_filename, load_record
+
 # Suppress warnings
 warnings.filterwarnings('ignore')
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -33,6 +36,7 @@ class NLPProcessor:
         except Exception as e:
             print(f"Error loading summarization model: {e}")
             self.summarizer = None
+        self.topic_model = CorpusTopicModel()
         print("NLP Processor initialized successfully")
 
     def generate_embedding(self, text: str, model: str = "nomic-embed-text") -> List[float]:
@@ -50,25 +54,6 @@ class NLPProcessor:
         doc = self.nlp(text)
         return [(ent.text, ent.label_) for ent in doc.ents]
 
-    def topic_modeling(self, texts: List[str], num_topics: int = 2, num_words: int = 5) -> List[str]:
-        if len(texts) < 2:
-            return ["Not enough documents for topic modeling"]
-        
-        vectorizer = CountVectorizer(max_df=1.0, min_df=1, stop_words='english')
-        try:
-            doc_term_matrix = vectorizer.fit_transform(texts)
-        except ValueError:
-            return ["Unable to perform topic modeling due to document similarity"]
-        
-        lda = LatentDirichletAllocation(n_components=num_topics, random_state=42)
-        lda.fit(doc_term_matrix)
-        words = vectorizer.get_feature_names_out()
-        topics = []
-        for topic_idx, topic in enumerate(lda.components_):
-            top_words = [words[i] for i in topic.argsort()[:-num_words - 1:-1]]
-            topics.append(f"Topic {topic_idx + 1}: {', '.join(top_words)}")
-        return topics
-
     def perform_sentiment_analysis(self, text: str) -> Dict[str, float]:
         blob = TextBlob(text)
         sentiment = blob.sentiment
@@ -127,52 +112,124 @@ class NLPProcessor:
         else:
             return str(data)
 
+    def load_text(self, file_path: str) -> str:
+        data = load_record(file_path)
+
+        text = self.extract_text_from_json(data)
+        if not text.strip():
+            raise ValueError("Empty or invalid text content in file")
+        return text
+
+    def analyze_text(self, text: str) -> Dict[str, Any]:
+        # Local model stages; topics are assigned afterwards by the corpus-level topic stage
+        return {
+            'entities': self.perform_ner(text),
+            'sentiment': self.perform_sentiment_analysis(text),
+            'summary': self.summarize_text(text, max_length=150, min_length=50),  # Customized values
+            'keywords': self.extract_keywords(text)
+        }
+
+    def build_record(self, text: str, analysis: Dict[str, Any], embedding: List[float]) -> Dict[str, Any]:
+        return {
+            'original_content': text[:1000],  # Truncate for brevity
+            'embedding': embedding,
+            **analysis
+        }
+
+    def process_text(self, text: str) -> Dict[str, Any]:
+        return self.build_record(text, self.analyze_text(text), self.generate_embedding(text))
+
     def process_file(self, file_path: str) -> Dict[str, Any]:
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-            
-            text = self.extract_text_from_json(data)
-            if not text.strip():
-                raise ValueError("Empty or invalid text content in file")
-            
-            return {
-                'original_content': text[:1000],  # Truncate for brevity
-                'entities': self.perform_ner(text),
-                'topics': self.topic_modeling([text]),
-                'embedding': self.generate_embedding(text),
-                'sentiment': self.perform_sentiment_analysis(text),
-                'summary': self.summarize_text(text, max_length=150, min_length=50),  # Customized values
-                'keywords': self.extract_keywords(text)
-            }
+            return self.process_text(self.load_text(file_path))
         except Exception as e:
             print(f"Error processing file {file_path}: {e}")
             return {'error': str(e)}
 
-    def process_directory(self, input_dir: str, output_dir: str):
+    def assign_corpus_topics(self, corpus: List[tuple]):
+        """Fit topics once over all processed texts and write them into the outputs"""
+        if not corpus:
+            return
+        output_paths, texts = zip(*corpus)
+        for output_path, fields in zip(output_paths, self.topic_model.fit_assign(texts)):
+            try:
+                write_topic_fields(output_path, fields)
+            except Exception as e:
+                print(f"Error writing topics to {output_path}: {e}")
+        print(f"Assigned corpus topics to {len(corpus)} documents")
+
+    def process_directory(self, input_dir: str, output_dir: str, workers: int = 2,
+                          embedding_concurrency: int = 4):
+        """Process all JSON files, overlapping local analysis with Ollama embedding calls.
+
+        Analysis runs in `workers` processes (0 keeps it on one thread of this
+        process) while up to `embedding_concurrency` embedding requests are in flight.
+        Finished files are recorded in a checkpoint journal in output_dir, so an
+        interrupted run resumes with the files that are still missing.
+        """
         os.makedirs(output_dir, exist_ok=True)
-
-        for filename in os.listdir(input_dir):
-            if filename.endswith('.json'):
-                input_path = os.path.join(input_dir, filename)
-                output_path = os.path.join(output_dir, f"processed_{filename}")
-
-                try:
-                    processed_data = self.process_file(input_path)
-
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        json.dump(processed_data, f, ensure_ascii=False, indent=4)
-
-                    print(f"Processed data saved to {output_path}")
-                except Exception as e:
-                    print(f"Error processing {filename}: {str(e)}")
+        journal = CheckpointJournal(os.path.join(output_dir, '.checkpoint.jsonl'))
+        corpus = []
+        texts = {}
+        fingerprints = {}
+
+        def read_inputs():
+            for filename in os.listdir(input_dir):
+                if is_record_file(filename):
+                    input_path = os.path.join(input_dir, filename)
+                    output_path = os.path.join(output_dir, processed_filename(filename))
+                    try:
+                        fingerprints[filename] = file_fingerprint(input_path)
+                        if journal.is_done('nlp', filename, fingerprints[filename]) and os.path.exists(output_path):
+                            # Already processed in an earlier run; still part of the topic corpus
+                            corpus.append((output_path, self.load_text(input_path)))
+                            print(f"Skipping {filename}, already processed")
+                            continue
+
+                        texts[filename] = self.load_text(input_path)
+                        yield filename, texts[filename]
+                    except Exception as e:
+                        print(f"Error processing {filename}: {str(e)}")
+
+        def on_result(filename, analysis, embedding):
+            text = texts.pop(filename)
+            output_path = os.path.join(output_dir, processed_filename(filename))
+            try:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.build_record(text, analysis, embedding), f, ensure_ascii=False, indent=4)
+
+                if embedding:
+                    journal.mark_done('nlp', filename, fingerprints[filename])
+                else:
+                    print(f"No embedding for {filename}, it will be retried on the next run")
+                corpus.append((output_path, text))
+                print(f"Processed data saved to {output_path}")
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+
+        def on_error(filename, error):
+            texts.pop(filename, None)
+            print(f"Error processing {filename}: {str(error)}")
+
+        executor = PipelineExecutor(NLPProcessor, process_workers=workers,
+                                    thread_workers=embedding_concurrency, local_worker=self)
+        with journal:
+            executor.run(read_inputs(), 'analyze_text', self.generate_embedding,
+                         on_result=on_result, on_error=on_error)
+
+        self.assign_corpus_topics(corpus)
 
 def main():
     input_dir = os.path.join('data', 'raw', 'llama')  # Directory containing your JSON files
     output_dir = os.path.join('data', 'processed')  # Directory to save processed data
 
     processor = NLPProcessor()
-    processor.process_directory(input_dir, output_dir)
+    processor.process_directory(
+        input_dir,
+        output_dir,
+        workers=int(os.getenv('NLP_WORKERS', '2')),
+        embedding_concurrency=int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
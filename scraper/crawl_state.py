@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+def _validators(headers: Optional[Mapping[str, str]]) -> Dict[str, str]:
+    """ETag and Last-Modified from response headers, whatever their casing"""
+    if not headers:
+        return {}
+    lowered = {str(k).lower(): v for k, v in headers.items()}
+    validators = {}
+    if lowered.get('etag'):
+        validators['etag'] = lowered['etag']
+    if lowered.get('last-modified'):
+        validators['last_modified'] = lowered['last-modified']
+    return validators
+
+class CrawlState:
+    """Per-URL record of cache validators and content hash from the last crawl.
+
+    Used to send conditional requests on re-crawls and to skip pages whose
+    content has not changed, so unchanged raw files are left untouched and
+    downstream stages do not pick them up again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            logger.info(f"Loaded crawl state for {len(self.entries)} URLs from {self.path}")
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable crawl state {self.path}: {e}")
+            self.entries = {}
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return dict(self.entries.get(url, {}))
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for a re-crawl of url"""
+        entry = self.get(url)
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url: str, digest: str) -> bool:
+        return self.get(url).get('content_hash') == digest
+
+    def update(self, url: str, digest: Optional[str] = None, headers: Optional[Mapping[str, str]] = None,
+               links: Optional[List[str]] = None):
+        """Record a fetch of url; digest is None when the server answered 304"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            entry.update(_validators(headers))
+            if links is not None:
+                # Kept so an unchanged page still contributes its links to a frontier crawl
+                entry['links'] = links
+            if digest is not None and entry.get('content_hash') != digest:
+                entry['content_hash'] = digest
+                entry['changed_at'] = now
+            entry['checked_at'] = now
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False, indent=4)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
@@ -1,37 +1,341 @@
 import asyncio
+import hashlib
 import json
 import os
+import random
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
 from urllib.parse import urlparse
+import aiohttp
 from crawl4ai import AsyncWebCrawler
 from dotenv import load_dotenv
 
 from __init__ import path
 path()
 
+from crawl_state import CrawlState, content_hash
+from frontier import Frontier, parse_sitemap, normalize_url, is_crawlable
+from ingestion.storage import write_record, INDEX_FILENAME
+
 # Load environment variables from .env file in the project root
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+logger = logging.getLogger(__name__)
+
+VERBOSE = os.getenv('VERBOSE', 'True').lower() == 'true'
+# Pages crawled at the same time through the shared browser
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '4'))
+# Minimum seconds between two requests to the same host
+CRAWL_HOST_DELAY = float(os.getenv('CRAWL_HOST_DELAY', '1.0'))
+CRAWL_MAX_RETRIES = int(os.getenv('CRAWL_MAX_RETRIES', '3'))
+CRAWL_BACKOFF = float(os.getenv('CRAWL_BACKOFF', '2.0'))
+# Ignore the crawl state and rewrite every page
+CRAWL_FORCE = os.getenv('CRAWL_FORCE', 'False').lower() == 'true'
+
+OUTPUT_DIR = os.path.join('data', 'raw', 'async')
+CRAWL_STATE_PATH = os.getenv('CRAWL_STATE_PATH', os.path.join(OUTPUT_DIR, '.crawl_state.json'))
+FRONTIER_PATH = os.getenv('CRAWL_FRONTIER_PATH', os.path.join(OUTPUT_DIR, '.frontier.json'))
+CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', '500'))
+CRAWL_MAX_DEPTH = int(os.getenv('CRAWL_MAX_DEPTH', '3'))
+# Also keep the complete crawl4ai result of every page
+CRAWL_ARCHIVE = os.getenv('CRAWL_ARCHIVE', 'False').lower() == 'true'
+ARCHIVE_DIR = os.path.join('data', 'raw', 'archive', 'async')
+
+_index_lock = threading.Lock()
+
 def get_filename_from_url(url):
     parsed_url = urlparse(url)
     filename = parsed_url.path.strip("/").split("/")[-1]
     return filename
 
-async def crawl_and_save(url):
-    async with AsyncWebCrawler(verbose=os.getenv('VERBOSE', 'True').lower() == 'true') as crawler:
-        result = await crawler.arun(url=url)
+class HostRateLimiter:
+    """Spaces out requests to the same host by a minimum delay"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._next_allowed = {}
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def wait(self, url: str):
+        host = urlparse(url).netloc
+        async with self._locks[host]:
+            loop = asyncio.get_running_loop()
+            wait_time = self._next_allowed.get(host, 0.0) - loop.time()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            self._next_allowed[host] = loop.time() + self.delay
+
+def get_unique_filename(url):
+    # Last path segments repeat across a whole domain, so add a URL hash
+    name = get_filename_from_url(url) or 'index'
+    return f"{name}-{hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()[:8]}"
+
+def get_output_path(url, filename=None):
+    filename = filename or get_filename_from_url(url)
+    return os.path.join(OUTPUT_DIR, f'{filename}.json.gz')
+
+def build_record(result, url, digest=None):
+    """Only the fields the ingestion pipeline reads from a crawled page"""
+    metadata = getattr(result, 'metadata', None) or {}
+    return {
+        'url': url,
+        'title': metadata.get('title') if isinstance(metadata, dict) else None,
+        'cleaned_html': result.cleaned_html,
+        'content_hash': digest or content_hash(result.markdown),
+        'crawled_at': datetime.now().isoformat()
+    }
+
+def append_index(record, output_path):
+    # Latest line per URL wins; read by tools that need url -> file without opening blobs
+    entry = {
+        'url': record['url'],
+        'file': os.path.basename(output_path),
+        'content_hash': record['content_hash'],
+        'crawled_at': record['crawled_at']
+    }
+    with _index_lock, open(os.path.join(OUTPUT_DIR, INDEX_FILENAME), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+def save_result(result, url, filename=None, digest=None):
+    output_path = get_output_path(url, filename)
+    record = build_record(result, url, digest)
+    write_record(output_path, record)
+    append_index(record, output_path)
+
+    # Files of the old format would otherwise be ingested next to the new record
+    stem = output_path[:-len('.json.gz')]
+    for legacy_path in (f'{stem}.json', f'{stem}.txt'):
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    if CRAWL_ARCHIVE:
+        write_record(os.path.join(ARCHIVE_DIR, os.path.basename(output_path)), result.__dict__)
+
+async def crawl_with_retry(crawler, url, limiter, max_retries=CRAWL_MAX_RETRIES, backoff=CRAWL_BACKOFF):
+    """Crawl one URL, retrying failures with exponential backoff and jitter"""
+    for attempt in range(max_retries + 1):
+        await limiter.wait(url)
+        try:
+            result = await crawler.arun(url=url)
+            if result.success:
+                return result
+            error = result.error_message
+        except Exception as e:
+            error = str(e)
+
+        if attempt < max_retries:
+            delay = backoff * (2 ** attempt) * (1 + random.random() / 2)
+            logger.warning(f"Crawl of {url} failed ({error}), retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    raise RuntimeError(f"Giving up on {url} after {max_retries + 1} attempts: {error}")
+
+async def is_not_modified(session, url, state, limiter):
+    """Conditional GET with the stored validators; True if the server answers 304"""
+    headers = state.conditional_headers(url)
+    if not headers:
+        return False
+    await limiter.wait(url)
+    try:
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                state.update(url, headers=response.headers)
+                return True
+    except Exception as e:
+        logger.warning(f"Conditional request for {url} failed: {str(e)}")
+    return False
+
+def has_output(url, filename=None):
+    return os.path.exists(get_output_path(url, filename))
+
+def get_internal_links(result):
+    links = []
+    for link in (getattr(result, 'links', None) or {}).get('internal', []):
+        href = link.get('href') if isinstance(link, dict) else link
+        if href:
+            links.append(href)
+    return links
+
+async def crawl_page(crawler, session, url, state, limiter, force=False, filename=None):
+    """Crawl one page unless it is unchanged, returning its status and internal links.
+
+    The status is 'not_modified' when the server answered the conditional
+    request with 304, 'unchanged' when the crawled content hash matches the
+    previous run and 'saved' when the page was written to disk.
+    """
+    if not force and has_output(url, filename) and await is_not_modified(session, url, state, limiter):
+        return 'not_modified', state.get(url).get('links', [])
+
+    result = await crawl_with_retry(crawler, url, limiter)
+    digest = content_hash(result.markdown)
+    headers = getattr(result, 'response_headers', None)
+    links = get_internal_links(result)
+    if not force and has_output(url, filename) and state.is_unchanged(url, digest):
+        state.update(url, digest, headers, links)
+        return 'unchanged', links
+
+    await asyncio.to_thread(save_result, result, url, filename, digest)
+    state.update(url, digest, headers, links)
+    return 'saved', links
+
+async def run_crawler(urls, concurrency=CRAWL_CONCURRENCY, host_delay=CRAWL_HOST_DELAY,
+                      state_path=CRAWL_STATE_PATH, force=CRAWL_FORCE):
+    """Crawl URLs through one shared browser with a bounded pool of workers.
+
+    Pages are first checked with a conditional request against the stored
+    ETag/Last-Modified, and after crawling their content hash is compared
+    with the previous run; unchanged pages are not rewritten. Each changed
+    result is written to disk as soon as it completes. Returns the number
+    of pages saved, the number found unchanged and the URLs that failed.
+    """
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    limiter = HostRateLimiter(host_delay)
+    state = CrawlState(state_path)
+    saved = 0
+    unchanged = 0
+    failed = []
+
+    async with AsyncWebCrawler(verbose=VERBOSE) as crawler, \
+            aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+        async def worker():
+            nonlocal saved, unchanged
+            while True:
+                url = await queue.get()
+                try:
+                    status, _ = await crawl_page(crawler, session, url, state, limiter, force)
+                    if status == 'saved':
+                        saved += 1
+                    else:
+                        unchanged += 1
+                    print(f"{status.replace('_', ' ').capitalize()} {url}")
+                except Exception as e:
+                    failed.append(url)
+                    print(f"Error crawling {url}: {str(e)}")
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(urls))))]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            state.save()
+
+    return saved, unchanged, failed
+
+async def seed_from_sitemaps(session, sitemaps, frontier, allowed_domains, limiter):
+    """Add every page listed in the sitemaps (following sitemap indexes) to the frontier"""
+    pending = list(sitemaps)
+    visited = set()
+    while pending:
+        sitemap_url = pending.pop()
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        await limiter.wait(sitemap_url)
+        try:
+            async with session.get(sitemap_url) as response:
+                response.raise_for_status()
+                content = await response.read()
+            pages, children = parse_sitemap(content)
+        except Exception as e:
+            print(f"Error reading sitemap {sitemap_url}: {str(e)}")
+            continue
+        pending.extend(children)
+        for loc, lastmod in pages:
+            if is_crawlable(loc, allowed_domains):
+                frontier.add(loc, depth=0, lastmod=lastmod)
+
+async def run_frontier_crawler(start_urls=(), sitemaps=(), allowed_domains=None,
+                               max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH,
+                               concurrency=CRAWL_CONCURRENCY, host_delay=CRAWL_HOST_DELAY,
+                               state_path=CRAWL_STATE_PATH, frontier_path=FRONTIER_PATH,
+                               force=CRAWL_FORCE):
+    """Discover and crawl a whole site starting from start URLs and sitemaps.
+
+    Internal links of each crawled page are added to a persisted frontier,
+    limited to allowed_domains (by default the domains of the seeds) and
+    max_depth links from a seed. At most max_pages pages are crawled per
+    run; whatever is left in the frontier is picked up by the next run.
+    Returns the same (saved, unchanged, failed) summary as run_crawler.
+    """
+    if allowed_domains is None:
+        allowed_domains = {urlparse(u).hostname for u in list(start_urls) + list(sitemaps)}
+    allowed_domains = {d.lower() for d in allowed_domains if d}
+
+    limiter = HostRateLimiter(host_delay)
+    state = CrawlState(state_path)
+    frontier = Frontier.load(frontier_path)
+    saved = 0
+    unchanged = 0
+    failed = []
+    started = 0
+    active = 0
+    condition = asyncio.Condition()
+
+    async with AsyncWebCrawler(verbose=VERBOSE) as crawler, \
+            aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+        # Seeds are no-ops when resuming, they are already in the seen-set
+        for url in start_urls:
+            frontier.add(url, depth=0)
+        await seed_from_sitemaps(session, sitemaps, frontier, allowed_domains, limiter)
+        print(f"Frontier has {len(frontier)} URLs queued")
+
+        async def worker():
+            nonlocal saved, unchanged, started, active
+            while True:
+                async with condition:
+                    while not len(frontier) and active > 0:
+                        await condition.wait()
+                    if not len(frontier) or started >= max_pages:
+                        return
+                    url, depth = frontier.pop()
+                    started += 1
+                    active += 1
+                try:
+                    status, links = await crawl_page(crawler, session, url, state, limiter, force,
+                                                     filename=get_unique_filename(url))
+                    if status == 'saved':
+                        saved += 1
+                    else:
+                        unchanged += 1
+                    print(f"{status.replace('_', ' ').capitalize()} {url} (depth {depth})")
+                    if depth < max_depth:
+                        for link in links:
+                            if is_crawlable(link, allowed_domains):
+                                frontier.add(link, depth=depth + 1)
+                except Exception as e:
+                    failed.append(url)
+                    print(f"Error crawling {url}: {str(e)}")
+                finally:
+                    frontier.done(url)
+                    async with condition:
+                        active -= 1
+                        condition.notify_all()
+                    if started % 50 == 0:
+                        frontier.save()
+                        state.save()
 
-        filename = get_filename_from_url(url)
-        
-        output_dir = os.path.join('data', 'raw', 'async')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        txt_file = os.path.join(output_dir, f'{filename}.txt')
-        with open(txt_file, 'w', encoding='utf-8') as f:
-            f.write(result.markdown)
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            frontier.save()
+            state.save()
 
-        json_file = os.path.join(output_dir, f'{filename}.json')
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(result.__dict__, f, ensure_ascii=False, indent=4)
+    if len(frontier):
+        print(f"Stopped after {max_pages} pages, {len(frontier)} URLs left for the next run")
+    return saved, unchanged, failed
 
 async def main():
     config_path = os.path.join('scraper', 'config.json')
@@ -46,12 +350,25 @@ async def main():
         print(f"Error decoding JSON from {config_path}")
         return
 
-    if not urls:
+    start_urls = config.get('start_urls', [])
+    sitemaps = config.get('sitemaps', [])
+    if start_urls or sitemaps:
+        saved, unchanged, failed = await run_frontier_crawler(
+            start_urls, sitemaps,
+            allowed_domains=config.get('allowed_domains'),
+            max_pages=config.get('max_pages', CRAWL_MAX_PAGES),
+            max_depth=config.get('max_depth', CRAWL_MAX_DEPTH)
+        )
+        print(f"Saved {saved} URLs, {unchanged} unchanged")
+    elif urls:
+        saved, unchanged, failed = await run_crawler(urls)
+        print(f"Saved {saved} of {len(urls)} URLs, {unchanged} unchanged")
+    else:
         print("No URLs found in the config file.")
         return
 
-    tasks = [crawl_and_save(url) for url in urls]
-    await asyncio.gather(*tasks)
+    if failed:
+        print(f"Failed URLs: {', '.join(failed)}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
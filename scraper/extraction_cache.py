@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def cache_key(model: str, prompt: str, digest: str) -> str:
+    return hashlib.sha256('\0'.join((model, prompt, digest)).encode('utf-8')).hexdigest()
+
+class ExtractionCache:
+    """On-disk cache of raw LLM extraction output keyed by (model, prompt, content hash).
+
+    Each entry is its own JSON file, so concurrent workers never rewrite a
+    shared file. Entries also keep the token counts Ollama reported, which
+    is what a hit saves.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.stats = {'hits': 0, 'misses': 0, 'saved_prompt_tokens': 0, 'saved_completion_tokens': 0}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, model: str, prompt: str, digest: str) -> Optional[str]:
+        path = self._path(cache_key(model, prompt, digest))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            entry = None
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            usage = entry.get('usage', {})
+            self.stats['hits'] += 1
+            self.stats['saved_prompt_tokens'] += usage.get('prompt_eval_count', 0)
+            self.stats['saved_completion_tokens'] += usage.get('eval_count', 0)
+        return entry['response']
+
+    def put(self, model: str, prompt: str, digest: str, response: str, usage: Optional[Dict[str, Any]] = None):
+        key = cache_key(model, prompt, digest)
+        path = self._path(key)
+        entry = {
+            'model': model,
+            'content_hash': digest,
+            'response': response,
+            'usage': usage or {},
+            'created_at': datetime.now().isoformat()
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def summary(self) -> str:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / lookups if lookups else 0.0
+        return (f"{stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0%} hit rate), "
+                f"saved {stats['saved_prompt_tokens']} prompt and "
+                f"{stats['saved_completion_tokens']} completion tokens")
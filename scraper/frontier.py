@@ -0,0 +1,198 @@
+import os
+import gzip
+import json
+import math
+import heapq
+import base64
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid'}
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.zip',
+    '.mp4', '.mp3', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.css', '.js'
+)
+
+def normalize_url(url: str) -> str:
+    """Canonical form used for deduplication.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+def is_crawlable(url: str, allowed_domains) -> bool:
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        return False
+    if allowed_domains and (parts.hostname or '').lower() not in allowed_domains:
+        return False
+    return not parts.path.lower().endswith(SKIPPED_EXTENSIONS)
+
+def parse_sitemap(content: bytes) -> Tuple[List[Tuple[str, Optional[str]]], List[str]]:
+    """Page (loc, lastmod) pairs and child sitemap URLs from a sitemap or sitemap index"""
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    root = ET.fromstring(content)
+
+    def text(element, name):
+        for child in element:
+            if child.tag.rsplit('}', 1)[-1] == name and child.text:
+                return child.text.strip()
+        return None
+
+    pages, sitemaps = [], []
+    kind = root.tag.rsplit('}', 1)[-1]
+    for entry in root:
+        loc = text(entry, 'loc')
+        if not loc:
+            continue
+        if kind == 'sitemapindex':
+            sitemaps.append(loc)
+        else:
+            pages.append((loc, text(entry, 'lastmod')))
+    return pages, sitemaps
+
+def _lastmod_timestamp(lastmod: Optional[str]) -> float:
+    if not lastmod:
+        return 0.0
+    try:
+        return datetime.fromisoformat(lastmod.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+
+class BloomFilter:
+    """Fixed-size probabilistic set of strings (no false negatives)"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item: str) -> bool:
+        """Add item, returning False if it was (probably) already present"""
+        added = False
+        for p in self._positions(item):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def to_dict(self) -> dict:
+        return {
+            'size': self.size,
+            'hashes': self.hashes,
+            'count': self.count,
+            'bits': base64.b64encode(gzip.compress(bytes(self.bits))).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BloomFilter':
+        bloom = cls.__new__(cls)
+        bloom.size = data['size']
+        bloom.hashes = data['hashes']
+        bloom.count = data['count']
+        bloom.bits = bytearray(gzip.decompress(base64.b64decode(data['bits'])))
+        return bloom
+
+class Frontier:
+    """Priority queue of URLs to crawl with a Bloom filter of seen URLs.
+
+    Shallower pages come first, and among pages at the same depth the most
+    recently modified (per sitemap lastmod) come first. URLs handed out by
+    pop() but not yet marked done are put back when the frontier is saved,
+    so a resumed crawl does not lose them.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 100000, error_rate: float = 0.001):
+        self.path = path
+        self.seen = BloomFilter(capacity, error_rate)
+        self.heap: List[Tuple[int, float, int, str]] = []
+        self.in_progress = {}
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def add(self, url: str, depth: int = 0, lastmod: Optional[str] = None) -> bool:
+        url = normalize_url(url)
+        if not self.seen.add(url):
+            return False
+        self._push(url, depth, -_lastmod_timestamp(lastmod))
+        return True
+
+    def _push(self, url: str, depth: int, freshness: float):
+        heapq.heappush(self.heap, (depth, freshness, self._counter, url))
+        self._counter += 1
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        if not self.heap:
+            return None
+        depth, freshness, _, url = heapq.heappop(self.heap)
+        self.in_progress[url] = (depth, freshness)
+        return url, depth
+
+    def done(self, url: str):
+        self.in_progress.pop(url, None)
+
+    def save(self):
+        if not self.path:
+            return
+        queue = list(self.heap) + [(d, f, 0, u) for u, (d, f) in self.in_progress.items()]
+        data = {
+            'queue': [[depth, freshness, url] for depth, freshness, _, url in sorted(queue)],
+            'seen': self.seen.to_dict()
+        }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path: str, capacity: int = 100000, error_rate: float = 0.001) -> 'Frontier':
+        """Resume the frontier saved at path, or start a new one if there is nothing left"""
+        frontier = cls(path, capacity, error_rate)
+        if not os.path.exists(path):
+            return frontier
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable frontier {path}: {e}")
+            return frontier
+        if not data.get('queue'):
+            return frontier
+
+        frontier.seen = BloomFilter.from_dict(data['seen'])
+        for depth, freshness, url in data['queue']:
+            frontier._push(url, depth, freshness)
+        logger.info(f"Resumed frontier with {len(frontier)} queued URLs from {path}")
+        return frontier
@@ -1,18 +1,25 @@
 import json
 import re
+import logging
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from scrapegraphai.graphs import SmartScraperGraph
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 from __init__ import path
 path()
 
+from crawl_state import CrawlState, content_hash
+from extraction_cache import ExtractionCache
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Define the configuration for the scraping pipeline
 graph_config = {
     "llm": {
@@ -21,82 +28,113 @@ graph_config = {
     },
     "verbose": os.getenv("VERBOSE", "True").lower() == "true",
     "headless": os.getenv("HEADLESS", "True").lower() == "true",
+    # Concurrent extractions; match the Ollama server's OLLAMA_NUM_PARALLEL
+    "workers": int(os.getenv("LLM_WORKERS", "1")),
+    "timeout": float(os.getenv("LLM_TIMEOUT", "300")),
+    # Ignore the crawl state and extract every page again
+    "force": os.getenv("CRAWL_FORCE", "False").lower() == "true",
 }
 
+OUTPUT_DIR = os.path.join('data', 'raw', 'llama')
+CRAWL_STATE_PATH = os.getenv("LLAMA_CRAWL_STATE_PATH", os.path.join(OUTPUT_DIR, '.crawl_state.json'))
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE", "True").lower() == "true"
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join('data', 'cache', 'extraction'))
+
 FORMAT_INSTRUCTIONS = """
-Please format your response as a JSON object with 'topic' and 'key_points' fields. 
-The 'topic' field should be an object with 'name' and 'description' fields. 
+Please format your response as a JSON object with 'topic' and 'key_points' fields.
+The 'topic' field should be an object with 'name' and 'description' fields.
 The 'key_points' should be an array of strings.
 """
 
-def query_llm(prompt: str, model: str, url: str) -> str:
-    print("Sending prompt to LLM:", prompt)
-    response = requests.post(
+def create_session(pool_size: int, hosts: int = 4) -> requests.Session:
+    """HTTP session whose connection pools are shared by all extraction workers.
+
+    The session both fetches pages and calls Ollama, so it keeps one pool per
+    host for up to `hosts` hosts; fewer would make the hosts evict each
+    other's pools and lose the kept-alive connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(hosts, 2), pool_maxsize=max(pool_size, 1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def query_llm_with_usage(prompt: str, model: str, url: str, session: Optional[requests.Session] = None,
+                         timeout: Optional[float] = None) -> Tuple[str, Dict[str, int]]:
+    """LLM response text and the token counts reported in Ollama's final chunk"""
+    logger.debug(f"Sending prompt to LLM ({len(prompt)} chars)")
+    response = (session or requests).post(
         url,
         json={
             "model": model.split('/')[1],
             "prompt": prompt
         },
-        stream=True
+        stream=True,
+        timeout=timeout
     )
+    response.raise_for_status()
 
-    full_response = ""
+    chunks = []
+    usage = {}
     for line in response.iter_lines():
         if line:
             decoded_line = line.decode('utf-8')
             try:
                 json_data = json.loads(decoded_line)
-                chunk = json_data.get("response", "")
-                full_response += chunk
-                print("Received chunk:", chunk)
+                chunks.append(json_data.get("response", ""))
+                if json_data.get("done"):
+                    usage = {key: json_data[key] for key in ("prompt_eval_count", "eval_count") if key in json_data}
             except json.JSONDecodeError:
-                print(f"Failed to decode line: {decoded_line}")
+                logger.warning(f"Failed to decode line: {decoded_line}")
+
+    full_response = "".join(chunks)
+    logger.debug(f"Full LLM response: {full_response}")
+    return full_response, usage
 
-    print("Full LLM response:")
-    print(full_response)
-    return full_response
+def query_llm(prompt: str, model: str, url: str, session: Optional[requests.Session] = None,
+              timeout: Optional[float] = None) -> str:
+    return query_llm_with_usage(prompt, model, url, session=session, timeout=timeout)[0]
 
 def parse_llm_output(output: str) -> Dict[str, Any]:
-    print("Parsing LLM output:")
-    print(output)
-    
+    logger.debug(f"Parsing LLM output: {output}")
+
     json_match = re.search(r'```\s*(.*?)\s*```', output, re.DOTALL)
     if json_match:
         json_str = json_match.group(1)
         try:
             parsed_json = json.loads(json_str)
-            print("Extracted JSON:", json.dumps(parsed_json, indent=2))
-            
+            logger.debug(f"Extracted JSON: {json.dumps(parsed_json)}")
+
             if isinstance(parsed_json.get('topic'), dict):
                 topic = parsed_json['topic'].get('name', '') + ': ' + parsed_json['topic'].get('description', '')
             else:
                 topic = str(parsed_json.get('topic', 'Topic not found'))
-            
+
             key_points = parsed_json.get('key_points', [])
-            
+
             return {
                 "topic": topic,
                 "key_points": key_points
             }
         except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON: {e}")
+            logger.debug(f"Failed to parse JSON: {e}")
     else:
-        print("No JSON found in the output")
-    
+        logger.debug("No JSON found in the output")
+
     key_points_match = re.search(r'\[(.*?)\]', output, re.DOTALL)
     if key_points_match:
         key_points_str = key_points_match.group(1)
         key_points = [point.strip().strip('"') for point in key_points_str.split(',')]
-        print("Extracted key points:", key_points)
+        logger.debug(f"Extracted key points: {key_points}")
     else:
         key_points = []
-        print("No key points found in the output")
+        logger.debug("No key points found in the output")
 
     topic = "Topic not found"
     if key_points:
         topic = key_points[0]
 
-    print("Extracted topic:", topic)
+    logger.debug(f"Extracted topic: {topic}")
 
     return {
         "topic": topic,
@@ -118,71 +156,127 @@ def get_filename_from_url(url: str) -> str:
     last_part = path.strip('/').split('/')[-1]
     return f"{last_part}.json" if last_part else "index.json"
 
-def process_url(url: str, config: Dict[str, Any]) -> Dict[str, Any]:
+def process_url(url: str, config: Dict[str, Any], session: Optional[requests.Session] = None,
+                cache: Optional[ExtractionCache] = None, digest: Optional[str] = None) -> Dict[str, Any]:
     content_prompt = get_prompt_for_url(url)
     full_prompt = f"{content_prompt}\n\n{FORMAT_INSTRUCTIONS}"
+    model = config["llm"]["model"]
 
-    smart_scraper_graph = SmartScraperGraph(
-        prompt=full_prompt,
-        source=url,
-        config=config
-    )
-
-    llm_result = query_llm(smart_scraper_graph.prompt, config["llm"]["model"], config["llm"]["url"])
+    llm_result = cache.get(model, full_prompt, digest) if cache and digest else None
+    if llm_result is not None:
+        logger.info(f"Using cached extraction for {url}")
+    else:
+        llm_result, usage = query_llm_with_usage(full_prompt, model, config["llm"]["url"],
+                                                 session=session, timeout=config.get("timeout"))
+        if cache and digest:
+            cache.put(model, full_prompt, digest, llm_result, usage)
 
     try:
-        parsed_result = parse_llm_output(llm_result)
-        smart_scraper_graph.llm_response = parsed_result
+        llm_response = parse_llm_output(llm_result)
     except Exception as e:
-        print(f"Error parsing LLM output: {e}")
-        print("Raw LLM output:")
-        print(llm_result)
-        smart_scraper_graph.llm_response = {"error": "Failed to parse LLM output"}
-
-    def patched_run(self):
-        self.final_state = {"llm_response": self.llm_response}
-        return self.final_state
+        logger.error(f"Error parsing LLM output for {url}: {e}")
+        logger.debug(f"Raw LLM output: {llm_result}")
+        llm_response = {"error": "Failed to parse LLM output"}
 
-    SmartScraperGraph.run = patched_run
-
-    return smart_scraper_graph.run()
+    return {"llm_response": llm_response}
 
 def save_result_to_file(result: Dict[str, Any], url: str):
-    output_dir = os.path.join('data', 'raw', 'llama')
-    os.makedirs(output_dir, exist_ok=True)
-    
-    filename = get_filename_from_url(url)
-    filepath = os.path.join(output_dir, filename)
-    
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    filepath = os.path.join(OUTPUT_DIR, get_filename_from_url(url))
+
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(result, f, ensure_ascii=False, indent=4)
-    
-    print(f"Result saved to {filepath}")
+
+    logger.info(f"Result for {url} saved to {filepath}")
+
+def fetch_if_changed(url: str, state: CrawlState, session: requests.Session,
+                     force: bool = False) -> Optional[requests.Response]:
+    """Page response if it changed since the last extraction, otherwise None"""
+    output_exists = os.path.exists(os.path.join(OUTPUT_DIR, get_filename_from_url(url)))
+    headers = state.conditional_headers(url) if output_exists and not force else {}
+
+    response = session.get(url, headers=headers, timeout=30)
+    if response.status_code == 304:
+        state.update(url, headers=response.headers)
+        return None
+    response.raise_for_status()
+
+    digest = content_hash(response.text)
+    if output_exists and not force and state.is_unchanged(url, digest):
+        state.update(url, digest, response.headers)
+        return None
+    return response
+
+def extract_and_save(url: str, config: Dict[str, Any], session: requests.Session,
+                     state: CrawlState, cache: Optional[ExtractionCache] = None) -> Optional[Dict[str, Any]]:
+    """Extract and save one page; None if the page is unchanged since the last run"""
+    page = fetch_if_changed(url, state, session, force=config.get("force", False))
+    if page is None:
+        logger.info(f"Skipping unchanged page {url}")
+        return None
+
+    digest = content_hash(page.text)
+    result = process_url(url, config, session=session, cache=cache, digest=digest)
+    save_result_to_file(result, url)
+    state.update(url, digest, page.headers)
+    return result
+
+def run_extraction(urls, config: Dict[str, Any], state_path: str = CRAWL_STATE_PATH,
+                   use_cache: bool = EXTRACTION_CACHE_ENABLED, cache_dir: str = EXTRACTION_CACHE_DIR) -> Dict[str, int]:
+    """Extract all changed URLs with config['workers'] concurrent LLM requests"""
+    workers = max(1, config.get("workers", 1))
+    stats = {"succeeded": 0, "unchanged": 0, "failed": 0}
+    state = CrawlState(state_path)
+    cache = ExtractionCache(cache_dir) if use_cache else None
+
+    with create_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(extract_and_save, url, config, session, state, cache): url for url in urls}
+        try:
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    result = future.result()
+                    if result is None:
+                        stats["unchanged"] += 1
+                        continue
+                    stats["succeeded"] += 1
+                    logger.debug(f"Final result for {url}: {json.dumps(result)}")
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.error(f"Error processing {url}: {e}")
+        finally:
+            state.save()
+
+    if cache:
+        stats.update(cache.stats)
+        logger.info(f"Extraction cache: {cache.summary()}")
+    return stats
 
 def main():
+    logging.basicConfig(
+        level=logging.DEBUG if graph_config["verbose"] else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
     config_path = os.path.join('scraper', 'config.json')
     try:
         with open(config_path, 'r') as config_file:
             config = json.load(config_file)
             urls = config.get('urls', [])
     except FileNotFoundError:
-        print(f"Config file not found at {config_path}")
+        logger.error(f"Config file not found at {config_path}")
         return
     except json.JSONDecodeError:
-        print(f"Error decoding JSON from {config_path}")
+        logger.error(f"Error decoding JSON from {config_path}")
         return
 
     if not urls:
-        print("No URLs found in the config file.")
+        logger.error("No URLs found in the config file.")
         return
 
-    for url in urls:
-        print(f"\nProcessing URL: {url}")
-        result = process_url(url, graph_config)
-        print("Final result:")
-        print(json.dumps(result, indent=4))
-        save_result_to_file(result, url)
-        print("\n" + "="*50)
+    stats = run_extraction(urls, graph_config)
+    logger.info(f"Extraction finished: {stats['succeeded']} succeeded, "
+                f"{stats['unchanged']} unchanged, {stats['failed']} failed")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
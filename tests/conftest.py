@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Repo root for the ingestion package, app/ for the services (imported the way the app does)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in (os.path.join(project_root, 'app'), project_root):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Settings and config files are resolved relative to the repo root"""
+    monkeypatch.chdir(project_root)
+    return project_root
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from ingestion.sparse import SparseEncoder
+from services.query_service import QueryProcessor
+
+CORPUS = [
+    "CS-101 Introduction to Programming is taught by Prof. Weber.",
+    "The master's program in applied computer science is taught in English.",
+    "Tuition fees are due at the start of each semester.",
+]
+
+class RecordingQdrant:
+    def __init__(self):
+        self.query_texts = []
+
+    def get_keywords(self):
+        return ['cs101', 'programming', 'computer science']
+
+    def hybrid_search(self, query_vector, query_text, filters=None, limit=5):
+        self.query_texts.append(query_text)
+        return [SimpleNamespace(id=1, score=0.9, order_value=None,
+                                payload={'original_content': CORPUS[0]})]
+
+class FakeOllama:
+    def get_embedding(self, text):
+        return [0.1, 0.2]
+
+    def generate_response(self, prompt, **kwargs):
+        return "answer"
+
+def test_hyphenated_code_keeps_sparse_terms():
+    encoder = SparseEncoder().fit(CORPUS)
+    qdrant = RecordingQdrant()
+
+    QueryProcessor().process_query("Who teaches CS-101?", qdrant, FakeOllama())
+
+    assert qdrant.query_texts
+    for query_text in qdrant.query_texts:
+        assert encoder.encode(query_text)['indices']
@@ -0,0 +1,10 @@
+from core.singleflight import normalize_query
+from services.faq_store import faq_point_id
+
+def test_symbols_keep_queries_apart():
+    assert normalize_query("c++") != normalize_query("c#")
+    assert normalize_query("What is CS-101?") != normalize_query("what is cs 101")
+    assert faq_point_id("Is C++ taught?") != faq_point_id("Is C# taught?")
+
+def test_case_whitespace_and_trailing_punctuation_share_a_key():
+    assert normalize_query("  What is  CS-101?! ") == normalize_query("what is cs-101")
@@ -1,8 +1,6 @@
 import json
 import os
 import spacy
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import torch
@@ -10,6 +8,11 @@ import torch
 from __init__ import path
 path()
 
+from ingestion.topics import CorpusTopicModel, write_topic_fields
+from ingestion.executor import PipelineExecutor
+from ingestion.checkpoint import CheckpointJournal, file_fingerprint
+from ingestion.storage import is_record_file, processed_filename, load_record
+
 class NLPProcessor:
     def __init__(self):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -17,33 +20,13 @@ class NLPProcessor:
         
         self.nlp = spacy.load("en_core_web_sm")
         self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2', device=self.device)
+        self.topic_model = CorpusTopicModel()
 
     def perform_ner(self, text):
         doc = self.nlp(text)
         entities = [(ent.text, ent.label_) for ent in doc.ents]
         return entities
 
-    def topic_modeling(self, texts, num_topics=5, num_words=10):
-        vectorizer = CountVectorizer(max_df=1.0, min_df=1, stop_words='english')
-        try:
-            doc_term_matrix = vectorizer.fit_transform(texts)
-        except ValueError:
-            vectorizer = CountVectorizer(max_df=1.0, min_df=1, stop_words='english', max_features=1000)
-            doc_term_matrix = vectorizer.fit_transform(texts)
-        
-        n_features = doc_term_matrix.shape[1]
-        num_topics = min(num_topics, n_features)
-        
-        lda = LatentDirichletAllocation(n_components=num_topics, random_state=42)
-        lda.fit(doc_term_matrix)
-        
-        words = vectorizer.get_feature_names_out()
-        topics = []
-        for topic_idx, topic in enumerate(lda.components_):
-            top_words = [words[i] for i in topic.argsort()[:-num_words - 1:-1]]
-            topics.append(f"Topic {topic_idx + 1}: {', '.join(top_words)}")
-        return topics
-
     def generate_embeddings(self, texts):
         return self.sentence_model.encode(texts, device=self.device).tolist()
 
@@ -64,8 +47,7 @@ class NLPProcessor:
 
     def process_file(self, file_path):
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            data = load_record(file_path)
             
             text = self.extract_text_from_json(data)
             
@@ -73,12 +55,10 @@ class NLPProcessor:
                 raise ValueError("Empty or invalid text content in file")
             
             entities = self.perform_ner(text)
-            topics = self.topic_modeling([text])
             embedding = self.generate_embeddings([text])[0]
             
             data['nlp_processed'] = {
                 'entities': entities,
-                'topics': topics,
                 'embedding': embedding
             }
             
@@ -87,33 +67,81 @@ class NLPProcessor:
             print(f"Error processing file {file_path}: {e}")
             return {'error': str(e)}
 
-    def process_directory(self, input_dir, output_dir):
+    def assign_corpus_topics(self, corpus):
+        """Fit topics once over all processed texts and write them into the outputs"""
+        if not corpus:
+            return
+        output_paths, texts = zip(*corpus)
+        for output_path, fields in zip(output_paths, self.topic_model.fit_assign(texts)):
+            try:
+                write_topic_fields(output_path, fields, key='nlp_processed')
+            except Exception as e:
+                print(f"Error writing topics to {output_path}: {e}")
+        print(f"Assigned corpus topics to {len(corpus)} documents")
+
+    def process_directory(self, input_dir, output_dir, workers=0):
+        """Process all JSON files, writing each result while the next file is processed.
+
+        The models here may live on the GPU, so by default processing stays on
+        one thread of this process; workers > 0 uses a process pool instead.
+        Finished files are recorded in a checkpoint journal in output_dir, so an
+        interrupted run resumes with the files that are still missing.
+        """
         os.makedirs(output_dir, exist_ok=True)
+        journal = CheckpointJournal(os.path.join(output_dir, '.checkpoint.jsonl'))
+        corpus = []
+        fingerprints = {}
+
+        def list_inputs():
+            for filename in os.listdir(input_dir):
+                if is_record_file(filename):
+                    input_path = os.path.join(input_dir, filename)
+                    output_path = os.path.join(output_dir, processed_filename(filename))
+                    fingerprints[filename] = file_fingerprint(input_path)
+                    if journal.is_done('nlp', filename, fingerprints[filename]) and os.path.exists(output_path):
+                        # Already processed in an earlier run; still part of the topic corpus
+                        try:
+                            with open(output_path, 'r', encoding='utf-8') as f:
+                                processed_data = json.load(f)
+                            corpus.append((output_path, self.extract_text_from_json(processed_data)))
+                            print(f"Skipping {filename}, already processed")
+                            continue
+                        except Exception as e:
+                            print(f"Reprocessing {filename}: {str(e)}")
+                    yield filename, input_path
+
+        def on_result(filename, processed_data, _):
+            output_path = os.path.join(output_dir, processed_filename(filename))
+            try:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    json.dump(processed_data, f, ensure_ascii=False, indent=4)
+
+                if 'nlp_processed' in processed_data:
+                    journal.mark_done('nlp', filename, fingerprints[filename])
+                    corpus.append((output_path, self.extract_text_from_json(processed_data)))
+                print(f"Processed data saved to {output_path}")
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
 
-        for filename in os.listdir(input_dir):
-            if filename.endswith('.json'):
-                input_path = os.path.join(input_dir, filename)
-                output_path = os.path.join(output_dir, f"processed_{filename}")
-
-                try:
-                    processed_data = self.process_file(input_path)
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
 
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        json.dump(processed_data, f, ensure_ascii=False, indent=4)
+        def on_error(filename, error):
+            print(f"Error processing {filename}: {str(error)}")
 
-                    print(f"Processed data saved to {output_path}")
-                except Exception as e:
-                    print(f"Error processing {filename}: {str(e)}")
+        executor = PipelineExecutor(NLPProcessor, process_workers=workers, thread_workers=1,
+                                    max_pending=2, local_worker=self)
+        with journal:
+            executor.run(list_inputs(), 'process_file', on_result=on_result, on_error=on_error)
 
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
+        self.assign_corpus_topics(corpus)
 
 def main():
     input_dir = os.path.join('data', 'raw', 'async')  # Directory containing your JSON files
     output_dir = os.path.join('data', 'processed')  # Directory to save processed data
 
     processor = NLPProcessor()
-    processor.process_directory(input_dir, output_dir)
+    processor.process_directory(input_dir, output_dir, workers=int(os.getenv('NLP_WORKERS', '0')))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
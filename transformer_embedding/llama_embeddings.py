@@ -1,60 +1,39 @@
 import json
 import os
 import spacy
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
 import numpy as np
 
 from __init__ import path
 path()
 
+from ingestion.topics import CorpusTopicModel
+from ingestion.sparse import SparseEncoder, DEFAULT_ENCODER_PATH
+from ingestion.storage import is_record_file, processed_filename, load_record
+
 # Load spaCy model
 nlp = spacy.load("en_core_web_sm")
 
-# Initialize TF-IDF vectorizer
-tfidf_vectorizer = TfidfVectorizer(max_features=300)
+# Sparse TF-IDF settings: the encoder is fitted once over the corpus and persisted.
+# The API serves the same file, and a refit gives it a new version that every stored
+# point has to be re-upserted with (vector/multiple.py) before hybrid search resumes,
+# so the saved encoder is reused unless TFIDF_REFIT=true
+SPARSE_ENCODER_PATH = os.getenv('SPARSE_ENCODER_PATH', DEFAULT_ENCODER_PATH)
+USE_HASHING = os.getenv('TFIDF_HASHING', 'False').lower() == 'true'
+REFIT_ENCODER = os.getenv('TFIDF_REFIT', 'False').lower() == 'true'
 
 def perform_ner(text):
     doc = nlp(text)
     entities = [(ent.text, ent.label_) for ent in doc.ents]
     return entities
 
-def topic_modeling(texts, num_topics=2, num_words=5):
-    if len(texts) < 2:
-        return ["Not enough documents for topic modeling"]
-    
-    vectorizer = CountVectorizer(max_df=1.0, min_df=1, stop_words='english')
-    try:
-        doc_term_matrix = vectorizer.fit_transform(texts)
-    except ValueError:
-        return ["Unable to perform topic modeling due to document similarity"]
-    
-    n_features = doc_term_matrix.shape[1]
-    num_topics = min(num_topics, n_features - 1)  # Ensure num_topics is less than n_features
-    
-    lda = LatentDirichletAllocation(n_components=num_topics, random_state=42)
-    lda.fit(doc_term_matrix)
-    
-    words = vectorizer.get_feature_names_out()
-    topics = []
-    for topic_idx, topic in enumerate(lda.components_):
-        top_words = [words[i] for i in topic.argsort()[:-num_words - 1:-1]]
-        topics.append(f"Topic {topic_idx + 1}: {', '.join(top_words)}")
-    
-    return topics
-
-def generate_embeddings(texts):
-    # Using TF-IDF for simple embeddings
-    tfidf_matrix = tfidf_vectorizer.fit_transform(texts)
-    return tfidf_matrix.toarray().tolist()
+def generate_embeddings(texts, encoder):
+    # Sparse TF-IDF vectors in the corpus-wide space of the shared encoder
+    return encoder.encode_batch(texts)
 
-def process_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+def extract_texts(file_path):
+    data = load_record(file_path)
     
-    all_texts = []
-    processed_data = []
-
+    texts = []
     items = data if isinstance(data, list) else [data]
     
     for item in items:
@@ -67,45 +46,77 @@ def process_file(file_path):
                 text = item.get('content', '') or item.get('text', '') or str(item)
         else:
             text = str(item)
-        
-        all_texts.append(text)
-        processed_item = {'original_content': text}
-        processed_data.append(processed_item)
+        texts.append(text)
     
-    try:
-        topics = topic_modeling(all_texts)
-    except Exception as e:
-        topics = [f"Topic modeling failed: {str(e)}"]
+    return texts
+
+def iter_corpus_texts(input_dir):
+    for filename in sorted(os.listdir(input_dir)):
+        if is_record_file(filename):
+            yield from extract_texts(os.path.join(input_dir, filename))
+
+def load_or_fit_encoder(input_dir):
+    """First pass: fit the TF-IDF encoder over the whole corpus, or reuse the persisted one"""
+    if not REFIT_ENCODER and os.path.exists(SPARSE_ENCODER_PATH):
+        print(f"Using sparse encoder from {SPARSE_ENCODER_PATH}")
+        return SparseEncoder.load(SPARSE_ENCODER_PATH)
+    
+    encoder = SparseEncoder(use_hashing=USE_HASHING).fit(iter_corpus_texts(input_dir))
+    encoder.save(SPARSE_ENCODER_PATH)
+    print(f"Sparse encoder fitted over {encoder.n_documents} texts and saved to {SPARSE_ENCODER_PATH}")
+    if REFIT_ENCODER:
+        print("Encoder refitted: run vector/multiple.py to re-upsert the stored points before hybrid search resumes")
+    return encoder
+
+def process_file(file_path, encoder):
+    all_texts = extract_texts(file_path)
+    processed_data = [{'original_content': text} for text in all_texts]
     
     try:
-        embeddings = generate_embeddings(all_texts)
+        embeddings = generate_embeddings(all_texts, encoder)
     except Exception as e:
         embeddings = [f"Embedding generation failed: {str(e)}"] * len(all_texts)
     
     for i, processed_item in enumerate(processed_data):
         text = processed_item['original_content']
         processed_item['entities'] = perform_ner(text)
-        processed_item['topics'] = topics
-        processed_item['embedding'] = embeddings[i] if isinstance(embeddings[i], list) else str(embeddings[i])
+        processed_item['sparse_embedding'] = embeddings[i] if isinstance(embeddings[i], dict) else str(embeddings[i])
     
     return processed_data
 
+def assign_corpus_topics(processed_files):
+    """Fit topics once over every item of every file and attach them per item"""
+    items = [item for _, processed_data in processed_files for item in processed_data]
+    try:
+        assignments = CorpusTopicModel().fit_assign([item['original_content'] for item in items])
+    except Exception as e:
+        assignments = [{'topics': [f"Topic modeling failed: {str(e)}"]}] * len(items)
+
+    for item, fields in zip(items, assignments):
+        item.update(fields)
+
 def main():
     input_dir = os.path.join('data', 'raw', 'llama')
     output_dir = os.path.join('data', 'processed')
     os.makedirs(output_dir, exist_ok=True)
 
+    encoder = load_or_fit_encoder(input_dir)
+
+    # Second pass: transform each file in the shared vector space
+    processed_files = []
     for filename in os.listdir(input_dir):
-        if filename.endswith('.json'):
+        if is_record_file(filename):
             input_path = os.path.join(input_dir, filename)
-            output_path = os.path.join(output_dir, f"processed_{filename}")
-            
-            processed_data = process_file(input_path)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(processed_data, f, ensure_ascii=False, indent=4)
-            
-            print(f"Processed data saved to {output_path}")
+            output_path = os.path.join(output_dir, processed_filename(filename))
+            processed_files.append((output_path, process_file(input_path, encoder)))
+
+    assign_corpus_topics(processed_files)
+
+    for output_path, processed_data in processed_files:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(processed_data, f, ensure_ascii=False, indent=4)
+        
+        print(f"Processed data saved to {output_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""Precompute answers to frequent questions for the FAQ store.
+
+Questions come from config/faq.yaml (FAQ_PATH) and optionally from a query
+log (--questions-log, one query per line or JSON lines with a "query"
+field), of which the --top most frequent are taken. Each question runs
+through the same retrieval and prompt as a chat query; the answer is
+generated at background priority and stored with the question embedding and
+the ids and content hashes of its source points.
+
+Entries whose sources are unchanged are kept, so re-running after an
+ingestion only regenerates the answers it affected.
+
+    python vector/build_faq.py
+    python vector/build_faq.py --questions-log data/queries.log --top 50 --prune
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+from collections import Counter
+from typing import List
+
+import yaml
+
+# Repo root for the ingestion package, app/ for the services (imported the way the app does)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in (os.path.join(project_root, 'app'), project_root):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+from core.config import settings
+from core.singleflight import normalize_query
+from services.faq_store import faq_point_id
+from services.generation_scheduler import GenerationRejected, Priority
+from services.ollama_service import OllamaService, GenerationFailed
+from services.qdrant_service import QdrantService
+from services.query_service import QueryProcessor
+
+logger = logging.getLogger(__name__)
+
+def load_curated(path: str) -> List[str]:
+    if not os.path.exists(path):
+        logger.warning(f"No curated questions at {path}")
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [str(q) for q in (yaml.safe_load(f) or {}).get('questions', [])]
+
+def load_frequent(path: str, top: int) -> List[str]:
+    """The most frequent questions of a query log, counted by normalised form"""
+    counts, phrasing = Counter(), {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            query = json.loads(line).get('query', '') if line.startswith('{') else line
+            key = normalize_query(query)
+            if key:
+                counts[key] += 1
+                phrasing.setdefault(key, query)
+    return [phrasing[key] for key, _ in counts.most_common(top)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers to frequent questions")
+    parser.add_argument('--questions', default=settings.FAQ_PATH, help="curated questions (YAML)")
+    parser.add_argument('--questions-log', help="query log to take frequent questions from")
+    parser.add_argument('--top', type=int, default=50, help="frequent questions to take from the log")
+    parser.add_argument('--force', action='store_true', help="regenerate answers whose sources are unchanged")
+    parser.add_argument('--prune', action='store_true', help="delete entries for questions no longer listed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    questions = load_curated(args.questions)
+    if args.questions_log:
+        questions += load_frequent(args.questions_log, args.top)
+    # One entry per normalised question
+    questions = list({faq_point_id(q): q for q in questions}.values())
+    if not questions:
+        print("No questions to precompute. Exiting.")
+        return
+
+    qdrant = QdrantService(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    ollama = OllamaService(base_url=settings.OLLAMA_API_URL)
+    processor = QueryProcessor()
+    # Answers are built from retrieval, not from the store being rebuilt
+    processor.faq_enabled = False
+    faq = qdrant.faq
+
+    counts = Counter()
+    for question in questions:
+        if faq.client.collection_exists(faq.collection_name):
+            entry = faq.get(question)
+            if entry and not entry.get('stale') and not args.force and faq.is_current(entry):
+                counts['unchanged'] += 1
+                continue
+
+        response, prompt = processor.prepare_response(question, qdrant, ollama)
+        if prompt is None or not response.get('is_from_knowledge_base'):
+            # Canned intents need no precomputing; general answers have no sources to invalidate them by
+            print(f"Skipping (not answered from the knowledge base): {question}")
+            counts['skipped'] += 1
+            continue
+
+        embedding = ollama.get_embedding(question)
+        try:
+            answer = ollama.generate_response(prompt, priority=Priority.BACKGROUND, system=processor.system_prompt)
+        except (GenerationRejected, GenerationFailed) as e:
+            answer = None
+            logger.warning(f"Generation failed: {str(e)}")
+        if not embedding or not answer:
+            print(f"Failed to generate an answer for: {question}")
+            counts['failed'] += 1
+            continue
+
+        faq.ensure_collection(len(embedding))
+        faq.upsert(question, embedding, answer, response['metadata']['context']['source_ids'],
+                   response['search_results'], model=ollama.generation_model)
+        print(f"Stored answer for: {question}")
+        counts['generated'] += 1
+
+    if args.prune and faq.client.collection_exists(faq.collection_name):
+        listed = {faq_point_id(q) for q in questions}
+        removed = [entry['id'] for entry in faq.entries() if entry['id'] not in listed]
+        faq.delete(removed)
+        counts['pruned'] = len(removed)
+
+    print(", ".join(f"{name}: {count}" for name, count in counts.items()) or "Nothing to do.")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,35 @@
 import os
+import sys
 import json
+import uuid
 import requests
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.exceptions import UnexpectedResponse
 
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from ingestion.sparse import SparseEncoder, DEFAULT_ENCODER_PATH
+from ingestion.checkpoint import CheckpointJournal, content_fingerprint
+
+SPARSE_VECTOR_NAME = "text-sparse"
+# Corpus-level topic fields written by the processors' topic stage; every refit rewrites them
+TOPIC_FIELDS = ('topics', 'dominant_topic', 'topic_distribution')
+
 # Step 1: Set up Qdrant client
 client = QdrantClient("localhost", port=6333)
 
 # Step 2: Load and prepare your processed data
 def load_processed_data(directory):
     data = []
-    for filename in os.listdir(directory):
+    for filename in sorted(os.listdir(directory)):
         if filename.endswith('.json'):
             try:
                 with open(os.path.join(directory, filename), 'r') as file:
-                    data.append(json.load(file))
+                    data.append((filename, json.load(file)))
             except json.JSONDecodeError:
                 print(f"Error: Invalid JSON in file {filename}")
             except Exception as e:
@@ -41,7 +55,16 @@ def create_embedding(text):
         print(f"Error creating embedding: {str(e)}")
         return None
 
-# Step 4: Create collection and insert data into Qdrant
+# Step 4: Load the sparse encoder shared with query time, fitting it on this corpus if missing
+if os.path.exists(DEFAULT_ENCODER_PATH):
+    sparse_encoder = SparseEncoder.load(DEFAULT_ENCODER_PATH)
+    print(f"Loaded sparse encoder from {DEFAULT_ENCODER_PATH}")
+else:
+    sparse_encoder = SparseEncoder().fit(item.get('original_content', '') for _, item in processed_data)
+    sparse_encoder.save(DEFAULT_ENCODER_PATH)
+    print(f"Fitted sparse encoder and saved it to {DEFAULT_ENCODER_PATH}")
+
+# Step 5: Create collection and insert data into Qdrant
 collection_name = "knowledge_base"
 
 # Attempt to create the collection directly
@@ -49,6 +72,7 @@ try:
     client.create_collection(
         collection_name=collection_name,
         vectors_config=models.VectorParams(size=768, distance=models.Distance.COSINE),
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams()},
     )
     print(f"Collection '{collection_name}' created successfully.")
 except UnexpectedResponse as e:
@@ -58,8 +82,42 @@ except UnexpectedResponse as e:
         print(f"Error creating collection: {str(e)}")
         exit(1)
 
-# Insert data
-for i, item in enumerate(processed_data):
+# Collections created before hybrid search have no sparse vector slot
+sparse_vectors_config = client.get_collection(collection_name).config.params.sparse_vectors or {}
+hybrid_enabled = SPARSE_VECTOR_NAME in sparse_vectors_config
+if not hybrid_enabled:
+    print(f"Collection '{collection_name}' has no sparse vectors; recreate it to enable hybrid search.")
+
+# Insert data, skipping points already upserted by an earlier (possibly interrupted) run
+journal = CheckpointJournal(os.path.join('data', 'processed', '.checkpoint.jsonl'))
+pending_points = []
+for filename, item in processed_data:
+    # Stable ids so a resumed run overwrites rather than duplicates points
+    point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, filename))
+    # Topics are kept out of the point fingerprint so a topic refit does not re-upsert the corpus
+    content = {key: value for key, value in item.items() if key not in TOPIC_FIELDS}
+    fingerprint = content_fingerprint({'item': content, 'sparse_encoder': sparse_encoder.version, 'hybrid': hybrid_enabled})
+    topic_fields = {key: item[key] for key in TOPIC_FIELDS if key in item}
+    pending_points.append((filename, item, point_id, fingerprint, topic_fields))
+
+# Journaled points only count if they are still in the collection (it may have been recreated)
+journaled_ids = [point_id for _, _, point_id, fingerprint, _ in pending_points
+                 if journal.is_done('qdrant_upsert', point_id, fingerprint)]
+existing_ids = {
+    str(point.id) for point in client.retrieve(collection_name=collection_name, ids=journaled_ids)
+} if journaled_ids else set()
+
+skipped = 0
+topic_updates = []
+for filename, item, point_id, fingerprint, topic_fields in pending_points:
+    if point_id in existing_ids:
+        skipped += 1
+        # Unchanged points only get their topic fields rewritten, and only if those changed
+        topic_fingerprint = content_fingerprint(topic_fields)
+        if topic_fields and not journal.is_done('qdrant_topics', point_id, topic_fingerprint):
+            topic_updates.append((point_id, topic_fields, topic_fingerprint))
+        continue
+
     try:
         if 'embedding' in item and isinstance(item['embedding'], list):
             embedding = item['embedding']
@@ -67,29 +125,61 @@ for i, item in enumerate(processed_data):
             embedding = create_embedding(item['original_content'])
         
         if embedding is None:
-            print(f"Failed to create embedding for item {i}. Skipping.")
+            print(f"Failed to create embedding for {filename}. Skipping.")
             continue
         
+        payload = {
+            'original_content': item['original_content'],
+            'entities': item['entities'],
+            'sentiment': item['sentiment'],
+            'summary': item['summary'],
+            'keywords': item['keywords']
+        }
+        payload.update(topic_fields)
+
+        vector = {'': embedding}
+        sparse_vector = sparse_encoder.encode(item['original_content']) if hybrid_enabled else {'indices': []}
+        if sparse_vector['indices']:
+            vector[SPARSE_VECTOR_NAME] = models.SparseVector(**sparse_vector)
+            payload['sparse_encoder_version'] = sparse_encoder.version
+
         point = models.PointStruct(
-            id=i,
-            vector=embedding,
-            payload={
-                'original_content': item['original_content'],
-                'entities': item['entities'],
-                'sentiment': item['sentiment'],
-                'summary': item['summary'],
-                'keywords': item['keywords']
-            }
+            id=point_id,
+            vector=vector,
+            payload=payload
         )
         
         client.upsert(collection_name=collection_name, points=[point])
-        print(f"Inserted item {i} into the knowledge base.")
+        journal.mark_done('qdrant_upsert', point_id, fingerprint)
+        journal.mark_done('qdrant_topics', point_id, content_fingerprint(topic_fields))
+        print(f"Inserted {filename} into the knowledge base.")
+    except Exception as e:
+        print(f"Error processing {filename}: {str(e)}")
+
+# Topic refits only touch the payload, so they are applied in batches without re-upserting
+for start in range(0, len(topic_updates), 256):
+    batch = topic_updates[start:start + 256]
+    try:
+        client.batch_update_points(
+            collection_name=collection_name,
+            update_operations=[
+                models.SetPayloadOperation(set_payload=models.SetPayload(payload=fields, points=[point_id]))
+                for point_id, fields, _ in batch
+            ]
+        )
+        for point_id, _, topic_fingerprint in batch:
+            journal.mark_done('qdrant_topics', point_id, topic_fingerprint)
     except Exception as e:
-        print(f"Error processing item {i}: {str(e)}")
+        print(f"Error updating topics: {str(e)}")
+if topic_updates:
+    print(f"Updated topics of {len(topic_updates)} unchanged items.")
+journal.close()
 
+if skipped:
+    print(f"Skipped {skipped} items already in the knowledge base.")
 print("All data inserted successfully into the knowledge base.")
 
-# Step 5: Set up querying capabilities
+# Step 6: Set up querying capabilities
 def query_knowledge_base(query_text, top_k=5):
     query_vector = create_embedding(query_text)
     if query_vector is None: